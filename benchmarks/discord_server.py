@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""A local stand-in for Discord's REST API and gateway, so that the bot can be
+benchmarked end to end without a real Discord server.
+
+The server holds a single guild with synthetic members and a few text
+channels. It only implements the requests that the bot makes while managing
+messages and reactions; every other request is answered with 404 (and still
+recorded). Every request is recorded with its route, rate-limit bucket, status
+and latency. Latency and per-bucket rate limits can be simulated.
+
+The bot finds the gateway through the REST API, so pointing discord.py's REST
+base URL at the server (by setting `discord_api_base` in data/config.json, or
+discord.http.Route.BASE directly) is enough to redirect both. To run the
+server on its own:
+
+    python3 -m benchmarks.discord_server [--port N] [--latency MS]
+"""
+
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web, WSMsgType
+
+
+API_VERSION = 7
+
+_snowflakes = itertools.count(800_000_000_000_000_000)
+
+
+def snowflake() -> str:
+    return str(next(_snowflakes))
+
+
+def timestamp() -> str:
+    return datetime.utcnow().isoformat() + '+00:00'
+
+
+def _json_response(data, *, status: int = 200, headers: Optional[dict] = None) -> web.Response:
+    # discord.py only decodes responses whose content type is exactly
+    # "application/json", without a charset.
+    return web.Response(
+        body=json.dumps(data).encode('utf-8'),
+        status=status,
+        headers=dict(headers or {}, **{'Content-Type': 'application/json'}),
+    )
+
+
+class RequestRecord(NamedTuple):
+    method: str
+    route: str
+    bucket: str
+    status: int
+    latency: float
+    time: float
+
+
+def summarize(records: List[RequestRecord]) -> str:
+    """Return a human-readable summary of some requests, with the number of
+    requests to each route.
+    """
+    if not records:
+        return "no requests"
+    latencies = sorted(r.latency for r in records)
+    rate_limited = sum(r.status == 429 for r in records)
+    lines = [
+        f"{len(records)} requests ({rate_limited} rate limited); latency "
+        f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+    ]
+    for (method, route), count in sorted(Counter((r.method, r.route) for r in records).items()):
+        lines.append(f"  {count:>6}  {method:<6} {route}")
+    return '\n'.join(lines)
+
+
+class FakeDiscordServer:
+    """A local Discord REST API and gateway.
+
+    Attributes:
+    - records -- list of RequestRecord for every REST request received
+    - guild_id -- string
+    - channels -- dict mapping channel names to IDs (as strings)
+    - members -- list of user objects (as JSON-compatible dicts), not
+      including the bot
+    - bot_user -- user object for the bot
+    - latency -- number of seconds to wait before answering each request
+    - jitter -- maximum number of extra seconds to wait, chosen uniformly at
+      random for each request
+    - rate_limit -- None, or tuple (limit, period); each bucket then allows
+      `limit` requests every `period` seconds and answers any more with 429
+    - rate_limit_headers -- bool; whether to tell clients about rate limits
+      before they are exceeded (as Discord does), so that well-behaved clients
+      never receive a 429
+    """
+
+    def __init__(self, *,
+                 members: int = 40,
+                 channels: Tuple[str, ...] = ('general', 'proposals', 'rules', 'logs'),
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 rate_limit: Optional[Tuple[int, float]] = None,
+                 rate_limit_headers: bool = True,
+                 host: str = '127.0.0.1',
+                 port: int = 0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_limit_headers = rate_limit_headers
+        self.records: List[RequestRecord] = []
+        self.bot_user = self._user(snowflake(), "Quobot", bot=True)
+        self.members = [self._user(snowflake(), f"Player {i}") for i in range(1, members + 1)]
+        self.guild_id = snowflake()
+        self.channels = {name: snowflake() for name in channels}
+        # Map from message ID to message object
+        self.messages: Dict[str, dict] = {}
+        # Map from bucket to list [remaining, reset_time]
+        self._buckets: Dict[str, list] = {}
+        self._sockets = set()
+        self._sequence = 0
+        self._runner = None
+
+    @staticmethod
+    def _user(id: str, name: str, *, bot: bool = False) -> dict:
+        return {
+            'id': id,
+            'username': name,
+            'discriminator': f'{int(id) % 10000:04}',
+            'avatar': None,
+            'bot': bot,
+        }
+
+    @property
+    def api_base(self) -> str:
+        """Return the URL to use as discord.http.Route.BASE."""
+        return f'http://{self.host}:{self.port}/api/v{API_VERSION}'
+
+    def mark(self) -> int:
+        """Return a marker for use with records_since()."""
+        return len(self.records)
+
+    def records_since(self, mark: int) -> List[RequestRecord]:
+        return self.records[mark:]
+
+    async def start(self) -> None:
+        app = web.Application(middlewares=[self._middleware])
+        api = r'/api/v{version:\d+}'
+        app.add_routes([
+            web.get('/gateway', self._gateway),
+            web.get(api + '/gateway', self._get_gateway),
+            web.get(api + '/gateway/bot', self._get_gateway),
+            web.get(api + '/users/@me', self._get_current_user),
+            web.get(api + '/oauth2/applications/@me', self._get_application),
+            web.post(api + '/channels/{channel_id}/typing', self._no_content),
+            web.post(api + '/channels/{channel_id}/messages', self._send_message),
+            web.post(api + '/channels/{channel_id}/messages/bulk_delete', self._bulk_delete),
+            web.get(api + '/channels/{channel_id}/messages/{message_id}', self._get_message),
+            web.patch(api + '/channels/{channel_id}/messages/{message_id}', self._edit_message),
+            web.delete(api + '/channels/{channel_id}/messages/{message_id}', self._delete_message),
+            web.delete(api + '/channels/{channel_id}/messages/{message_id}/reactions', self._clear_reactions),
+            web.put(api + '/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/{user}',
+                    self._add_reaction),
+            web.delete(api + '/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/{user}',
+                       self._remove_reaction),
+        ])
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self) -> None:
+        for ws in list(self._sockets):
+            await ws.close()
+        await self._runner.cleanup()
+
+    ########################################
+    # REST
+    ########################################
+
+    def _check_rate_limit(self, bucket: str) -> Tuple[Optional[web.Response], dict]:
+        """Count a request against its bucket, and return a tuple (response,
+        headers) where `response` is a 429 response if the request is rate
+        limited and None otherwise.
+        """
+        if not self.rate_limit:
+            return None, {}
+        limit, period = self.rate_limit
+        now = time.time()
+        state = self._buckets.get(bucket)
+        if state is None or now >= state[1]:
+            state = self._buckets[bucket] = [limit, now + period]
+        headers = {
+            'X-RateLimit-Limit': str(limit),
+            'X-RateLimit-Remaining': str(max(0, state[0] - 1)),
+            'X-RateLimit-Reset': f'{state[1]:.3f}',
+            'X-RateLimit-Reset-After': f'{state[1] - now:.3f}',
+            'X-RateLimit-Bucket': hashlib.sha1(bucket.encode()).hexdigest()[:16],
+        }
+        if not self.rate_limit_headers:
+            headers = {}
+        if state[0] <= 0:
+            # discord.py treats a 429 without a Via header as a Cloudflare ban.
+            headers['Via'] = '1.1 google'
+            return _json_response({
+                'message': "You are being rate limited.",
+                'retry_after': int((state[1] - now) * 1000) + 1,
+                'global': False,
+            }, status=429, headers=headers), headers
+        state[0] -= 1
+        return None, headers
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        start = time.perf_counter()
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource else request.path
+        if route.startswith('/api/'):
+            route = route.split('}', 1)[-1]
+        channel_id = request.match_info.get('channel_id', '')
+        bucket = f'{request.method} {route} {channel_id}'.strip()
+        response, headers = self._check_rate_limit(bucket)
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if response is None:
+            try:
+                response = await handler(request)
+            except web.HTTPException as exc:
+                response = exc
+        if route != '/gateway':
+            response.headers.update(headers)
+            self.records.append(RequestRecord(
+                request.method, route, bucket, response.status, time.perf_counter() - start, time.time(),
+            ))
+        return response
+
+    @staticmethod
+    def _not_found(message: str, code: int) -> web.Response:
+        return _json_response({'message': message, 'code': code}, status=404)
+
+    async def _no_content(self, request):
+        return web.Response(status=204)
+
+    async def _get_gateway(self, request):
+        return _json_response({'url': f'ws://{self.host}:{self.port}/gateway'})
+
+    async def _get_current_user(self, request):
+        return _json_response(self.bot_user)
+
+    async def _get_application(self, request):
+        return _json_response({
+            'id': self.bot_user['id'],
+            'name': self.bot_user['username'],
+            'icon': None,
+            'description': "",
+            'rpc_origins': None,
+            'bot_public': False,
+            'bot_require_code_grant': False,
+            'owner': self.members[0] if self.members else self.bot_user,
+            'summary': "",
+            'verify_key': "",
+        })
+
+    def _message_data(self, message: dict) -> dict:
+        counts = Counter(emoji for emoji, _ in message['reactions'])
+        return dict(message, reactions=[
+            {'emoji': {'id': None, 'name': emoji}, 'count': count,
+             'me': (emoji, self.bot_user['id']) in message['reactions']}
+            for emoji, count in counts.items()
+        ])
+
+    def _find_message(self, request) -> dict:
+        message = self.messages.get(request.match_info['message_id'])
+        if message is None or message['channel_id'] != request.match_info['channel_id']:
+            raise web.HTTPNotFound(
+                body=json.dumps({'message': "Unknown Message", 'code': 10008}).encode('utf-8'),
+                headers={'Content-Type': 'application/json'},
+            )
+        return message
+
+    async def _send_message(self, request):
+        channel_id = request.match_info['channel_id']
+        if channel_id not in self.channels.values():
+            return self._not_found("Unknown Channel", 10003)
+        payload = await request.json()
+        message = {
+            'id': snowflake(),
+            'channel_id': channel_id,
+            'guild_id': self.guild_id,
+            'author': self.bot_user,
+            'content': payload.get('content') or '',
+            'timestamp': timestamp(),
+            'edited_timestamp': None,
+            'tts': False,
+            'mention_everyone': False,
+            'mentions': [],
+            'mention_roles': [],
+            'attachments': [],
+            'embeds': [payload['embed']] if payload.get('embed') else [],
+            'pinned': False,
+            'type': 0,
+            'reactions': [],
+        }
+        self.messages[message['id']] = message
+        return _json_response(self._message_data(message))
+
+    async def _get_message(self, request):
+        return _json_response(self._message_data(self._find_message(request)))
+
+    async def _edit_message(self, request):
+        message = self._find_message(request)
+        payload = await request.json()
+        if 'content' in payload:
+            message['content'] = payload['content'] or ''
+        if 'embed' in payload:
+            message['embeds'] = [payload['embed']] if payload['embed'] else []
+        message['edited_timestamp'] = timestamp()
+        return _json_response(self._message_data(message))
+
+    async def _delete_message(self, request):
+        del self.messages[self._find_message(request)['id']]
+        return web.Response(status=204)
+
+    async def _bulk_delete(self, request):
+        payload = await request.json()
+        for message_id in payload.get('messages', []):
+            self.messages.pop(str(message_id), None)
+        return web.Response(status=204)
+
+    async def _add_reaction(self, request):
+        message = self._find_message(request)
+        user = request.match_info['user']
+        if user == '@me':
+            user = self.bot_user['id']
+        reaction = (request.match_info['emoji'], user)
+        if reaction not in message['reactions']:
+            message['reactions'].append(reaction)
+        return web.Response(status=204)
+
+    async def _remove_reaction(self, request):
+        message = self._find_message(request)
+        user = request.match_info['user']
+        if user == '@me':
+            user = self.bot_user['id']
+        reaction = (request.match_info['emoji'], user)
+        if reaction in message['reactions']:
+            message['reactions'].remove(reaction)
+        return web.Response(status=204)
+
+    async def _clear_reactions(self, request):
+        self._find_message(request)['reactions'].clear()
+        return web.Response(status=204)
+
+    ########################################
+    # GATEWAY
+    ########################################
+
+    async def _gateway(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        try:
+            await ws.send_json({'op': 10, 'd': {'heartbeat_interval': 41250}})
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                if payload['op'] == 1:
+                    # Heartbeat
+                    await ws.send_json({'op': 11})
+                elif payload['op'] == 2:
+                    # Identify
+                    await self._send_event(ws, 'READY', {
+                        'v': API_VERSION,
+                        'user': self.bot_user,
+                        'guilds': [{'id': self.guild_id, 'unavailable': True}],
+                        'session_id': snowflake(),
+                        'private_channels': [],
+                        'relationships': [],
+                        'application': {'id': self.bot_user['id'], 'flags': 0},
+                    })
+                    await self._send_event(ws, 'GUILD_CREATE', self._guild_data())
+        finally:
+            self._sockets.discard(ws)
+        return ws
+
+    def _member_data(self, user: dict) -> dict:
+        return {'user': user, 'roles': [], 'joined_at': timestamp(), 'deaf': False, 'mute': False}
+
+    def _guild_data(self) -> dict:
+        members = [self.bot_user] + self.members
+        return {
+            'id': self.guild_id,
+            'name': "Benchmark",
+            'owner_id': self.bot_user['id'],
+            'member_count': len(members),
+            'large': False,
+            'members': [self._member_data(user) for user in members],
+            'channels': [
+                {'id': channel_id, 'type': 0, 'name': name, 'position': i, 'permission_overwrites': []}
+                for i, (name, channel_id) in enumerate(self.channels.items())
+            ],
+            'roles': [{'id': self.guild_id, 'name': '@everyone', 'permissions': '104324673', 'position': 0}],
+        }
+
+    async def _send_event(self, ws, event: str, data: dict) -> None:
+        self._sequence += 1
+        await ws.send_json({'op': 0, 's': self._sequence, 't': event, 'd': data})
+
+    async def dispatch(self, event: str, data: dict) -> None:
+        """Send a gateway event to every connected client."""
+        for ws in list(self._sockets):
+            await self._send_event(ws, event, data)
+
+    async def add_reaction(self, user: dict, channel_id: str, message_id: str, emoji: str) -> None:
+        """React to a message as a member and send the corresponding gateway
+        event.
+        """
+        message = self.messages.get(message_id)
+        if message is not None and (emoji, user['id']) not in message['reactions']:
+            message['reactions'].append((emoji, user['id']))
+        await self.dispatch('MESSAGE_REACTION_ADD', {
+            'user_id': user['id'],
+            'channel_id': channel_id,
+            'message_id': message_id,
+            'guild_id': self.guild_id,
+            'emoji': {'id': None, 'name': emoji},
+            'member': self._member_data(user),
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--members', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0, help="milliseconds")
+    parser.add_argument('--jitter', type=float, default=0, help="milliseconds")
+    parser.add_argument('--rate-limit', type=int, metavar='N', help="requests per bucket per --rate-period")
+    parser.add_argument('--rate-period', type=float, default=5, help="seconds")
+    parser.add_argument('--hide-rate-limits', action='store_true',
+                        help="don't send rate limit headers, so that clients receive 429s")
+    args = parser.parse_args()
+
+    server = FakeDiscordServer(
+        members=args.members,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        rate_limit=args.rate_limit and (args.rate_limit, args.rate_period),
+        rate_limit_headers=not args.hide_rate_limits,
+        host=args.host,
+        port=args.port,
+    )
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(server.start())
+    print(f"Set \"discord_api_base\": \"{server.api_base}\" in data/config.json")
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(summarize(server.records))
+        loop.run_until_complete(server.stop())
+
+
+if __name__ == '__main__':
+    main()
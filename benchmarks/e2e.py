@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Benchmark proposal commands end to end against a local Discord stand-in
+(see benchmarks.discord_server), counting the REST requests each one makes.
+
+A real discord.py bot with the proposals cog connects to the stand-in, and
+the game's repository is a local git repository in a temporary directory,
+so nothing touches the network. Run from the repository root:
+
+    python3 -m benchmarks.e2e [--latency MS] [--rate-limit N] [--voters N]
+
+Benchmarks:
+- submit -- ProposalManager.add_proposal()
+- refresh -- ProposalManager.refresh_proposal() on every open proposal
+- repost -- ProposalManager.repost_proposal() on the last few proposals
+- vote storm -- many members react to open proposals at once through the
+  gateway, as handled by the proposals cog
+"""
+
+from asyncio.subprocess import DEVNULL
+from os import makedirs, path
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import tempfile
+import time
+
+from discord.ext import commands
+import discord
+
+import utils
+import nomic
+import repository
+from constants import emoji
+
+from .discord_server import FakeDiscordServer, summarize
+
+
+async def init_repo(repo_path: str) -> None:
+    """Create a local git repository to stand in for a game's branch."""
+    makedirs(path.join(repo_path, 'logs'))
+    for command in (
+        ['git', 'init', '-q'],
+        ['git', 'config', '--local', 'user.email', 'benchmark@example.com'],
+        ['git', 'config', '--local', 'user.name', 'Benchmark'],
+        ['git', 'commit', '-q', '--allow-empty', '-m', "Initial commit"],
+    ):
+        proc = await asyncio.create_subprocess_exec(*command, cwd=repo_path, stdout=DEVNULL, stderr=DEVNULL)
+        if await proc.wait():
+            raise RuntimeError(f"{' '.join(command)!r} failed")
+
+
+async def measure(server: FakeDiscordServer, label: str, coro) -> None:
+    mark = server.mark()
+    start = time.perf_counter()
+    await coro
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed * 1000:.1f} ms")
+    print(summarize(server.records_since(mark)))
+    print()
+
+
+async def wait_for_votes(game, count: int, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while sum(len(list(p.votes.ids())) for p in game.open_proposals) < count:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Timed out waiting for votes")
+        await asyncio.sleep(0.005)
+    # Votes are recorded before the message is refreshed; wait for the last
+    # vote to be completely handled.
+    async with game:
+        pass
+
+
+async def run(args) -> None:
+    rng = random.Random(args.seed)
+    server = FakeDiscordServer(
+        members=max(args.voters, 1),
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        rate_limit=args.rate_limit and (args.rate_limit, args.rate_period),
+        rate_limit_headers=not args.hide_rate_limits,
+    )
+    await server.start()
+    discord.http.Route.BASE = server.api_base
+
+    bot = commands.Bot(
+        command_prefix='!',
+        intents=discord.Intents(guilds=True, members=True, messages=True, reactions=True),
+        # The stand-in sends the only guild immediately.
+        guild_ready_timeout=0.05,
+    )
+    bot.load_extension('cogs.proposals')
+    bot_task = asyncio.ensure_future(bot.start('benchmark-token'))
+    try:
+        await asyncio.wait_for(bot.wait_until_ready(), 10)
+        guild = bot.get_guild(int(server.guild_id))
+        game = nomic.Game(guild)
+        await init_repo(game.repo.path)
+        players = [guild.get_member(int(user['id'])) for user in server.members]
+        async with game:
+            game.load()
+            game.proposals_channel = guild.get_channel(int(server.channels['proposals']))
+            for _ in range(args.proposals):
+                await game.add_proposal(author=rng.choice(players), content="Lorem ipsum dolor sit amet")
+            game.ready = True
+        print(f"{len(players)} members, {args.proposals} proposals, latency {args.latency} ms, "
+              f"rate limit {f'{args.rate_limit}/{args.rate_period}s' if args.rate_limit else 'none'}")
+        print()
+
+        async def submit():
+            async with game:
+                await game.add_proposal(author=players[0], content="Lorem ipsum dolor sit amet")
+
+        async def refresh():
+            async with game:
+                await game.refresh_proposal(*game.open_proposals)
+
+        async def repost():
+            async with game:
+                await game.repost_proposal(game.get_proposal(game.proposal_count - args.repost + 1))
+
+        async def vote_storm():
+            open_proposals = list(game.open_proposals)
+            before = sum(len(list(p.votes.ids())) for p in open_proposals)
+            voters = [user for user in server.members]
+            rng.shuffle(voters)
+            votes = [(user, rng.choice(open_proposals)) for user in voters[:args.voters]]
+            for user, proposal in votes:
+                await server.add_reaction(
+                    user, server.channels['proposals'], str(proposal.message_id),
+                    rng.choice((emoji.VOTE_FOR, emoji.VOTE_AGAINST)),
+                )
+            await wait_for_votes(game, before + len(votes), args.timeout)
+
+        await measure(server, "submit", submit())
+        await measure(server, f"refresh x{len(list(game.open_proposals))}", refresh())
+        await measure(server, f"repost x{args.repost}", repost())
+        await measure(server, f"vote storm x{args.voters}", vote_storm())
+    finally:
+        await utils.fileio.flush()
+        await bot.close()
+        bot_task.cancel()
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proposals', type=int, default=10)
+    parser.add_argument('--voters', type=int, default=20, help="members who vote in the vote storm")
+    parser.add_argument('--repost', type=int, default=3, help="proposals reposted in the repost benchmark")
+    parser.add_argument('--latency', type=float, default=0, help="simulated REST latency, in milliseconds")
+    parser.add_argument('--jitter', type=float, default=0, help="maximum extra latency, in milliseconds")
+    parser.add_argument('--rate-limit', type=int, metavar='N', help="requests allowed per bucket per --rate-period")
+    parser.add_argument('--rate-period', type=float, default=5, help="seconds")
+    parser.add_argument('--hide-rate-limits', action='store_true',
+                        help="don't send rate limit headers, so that the bot receives 429s")
+    parser.add_argument('--timeout', type=float, default=300, help="seconds to wait for the vote storm")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    args.repost = max(1, min(args.repost, args.proposals))
+
+    utils.l.setLevel(logging.ERROR)
+    logging.getLogger('git').setLevel(logging.ERROR)
+    repository.REPOS_DIR = tempfile.mkdtemp(prefix='nomic-benchmark-')
+    try:
+        asyncio.get_event_loop().run_until_complete(run(args))
+    finally:
+        shutil.rmtree(repository.REPOS_DIR)
+
+
+if __name__ == '__main__':
+    main()
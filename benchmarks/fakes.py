@@ -0,0 +1,180 @@
+"""In-memory stand-ins for the Discord objects that a Game uses, so that games
+can be loaded and modified without a connection to Discord.
+
+The guild, its members and its text channels are subclasses of the real
+discord.py classes (so isinstance() checks pass), but they never touch the
+network. Every call that would normally be a REST request is counted in
+FakeGuild.api_calls instead.
+"""
+
+from collections import Counter
+from typing import List, Optional
+import itertools
+
+import discord
+
+
+# Discord snowflakes are 64-bit integers; these only need to be unique.
+_snowflakes = itertools.count(700_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    return next(_snowflakes)
+
+
+class FakeResponse:
+    """Just enough of an aiohttp response for discord.HTTPException."""
+
+    def __init__(self, status: int, reason: str):
+        self.status = status
+        self.reason = reason
+
+
+class FakeUser:
+
+    __slots__ = ('id', 'name', 'discriminator', 'bot')
+
+    def __init__(self, id: int, name: str, *, bot: bool = False):
+        self.id = id
+        self.name = name
+        self.discriminator = f'{id % 10000:04}'
+        self.bot = bot
+
+    @property
+    def avatar_url(self) -> str:
+        return f'https://cdn.discordapp.com/embed/avatars/{self.id % 5}.png'
+
+    def __hash__(self):
+        return self.id >> 22
+
+
+class FakeState:
+
+    def __init__(self, user: FakeUser):
+        self.user = user
+        self.self_id = user.id
+
+
+class FakeMember(discord.Member):
+
+    def __init__(self, guild: 'FakeGuild', user: FakeUser):
+        self.guild = guild
+        self._user = user
+        self._state = guild._state
+        self._roles = []
+        self.nick = None
+        self.activities = ()
+        self.joined_at = None
+        self.premium_since = None
+        self.pending = False
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} id={self.id} name={self.name!r}>'
+
+
+class FakeMessage:
+
+    def __init__(self, channel: 'FakeTextChannel', content: Optional[str], embed: Optional[discord.Embed]):
+        self.id = snowflake()
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = channel.guild.me
+        self.content = content
+        self.embeds = [embed] if embed else []
+        self.reactions: List[str] = []
+
+    async def edit(self, *, content=None, embed=None):
+        self.channel.guild.api_calls['edit_message'] += 1
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+
+    async def delete(self):
+        self.channel.guild.api_calls['delete_message'] += 1
+        self.channel._delete(self)
+
+    async def add_reaction(self, emoji):
+        self.channel.guild.api_calls['add_reaction'] += 1
+        if emoji not in self.reactions:
+            self.reactions.append(emoji)
+
+    async def clear_reactions(self):
+        self.channel.guild.api_calls['clear_reactions'] += 1
+        self.reactions.clear()
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} id={self.id}>'
+
+
+class FakeTextChannel(discord.TextChannel):
+
+    def __init__(self, guild: 'FakeGuild', id: int, name: str):
+        self.guild = guild
+        self.id = id
+        self.name = name
+        self._state = guild._state
+        self.position = len(guild._channels)
+        self.category_id = None
+        self.messages = {}
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} id={self.id} name={self.name!r}>'
+
+    def _delete(self, message: FakeMessage):
+        if self.messages.pop(message.id, None) is None:
+            raise discord.NotFound(FakeResponse(404, "Not Found"), "Unknown Message")
+
+    async def send(self, content=None, *, embed=None, **kwargs):
+        self.guild.api_calls['send_message'] += 1
+        m = FakeMessage(self, content, embed)
+        self.messages[m.id] = m
+        return m
+
+    async def fetch_message(self, id):
+        self.guild.api_calls['get_message'] += 1
+        try:
+            return self.messages[id]
+        except KeyError:
+            raise discord.NotFound(FakeResponse(404, "Not Found"), "Unknown Message")
+
+    async def delete_messages(self, messages):
+        self.guild.api_calls['delete_messages'] += 1
+        for m in messages:
+            self._delete(m)
+
+
+class FakeGuild(discord.Guild):
+    """A guild containing only members and text channels.
+
+    Attributes:
+    - api_calls -- Counter of the number of times each kind of REST request
+      would have been made
+    """
+
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+        self.owner_id = None
+        self.unavailable = False
+        self._members = {}
+        self._channels = {}
+        self._roles = {}
+        self._state = FakeState(FakeUser(snowflake(), "Bot", bot=True))
+        self._add_member(self._state.user)
+        self.api_calls = Counter()
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} id={self.id} name={self.name!r}>'
+
+    def _add_member(self, user: FakeUser) -> FakeMember:
+        member = self._members[user.id] = FakeMember(self, user)
+        return member
+
+    def add_member(self, name: str) -> FakeMember:
+        return self._add_member(FakeUser(snowflake(), name))
+
+    def add_text_channel(self, name: str) -> FakeTextChannel:
+        channel = FakeTextChannel(self, snowflake(), name)
+        self._channels[channel.id] = channel
+        return channel
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Time the hot paths of a large synthetic game, using a fake in-memory
+Discord guild (see benchmarks.fakes) so that nothing touches the network.
+
+Run from the repository root:
+
+    python3 -m benchmarks.game [--proposals N] [--rules N] [--repeat N]
+
+Game data is written to a temporary directory, which is deleted afterwards.
+For each benchmark, this prints the best and median time per run (and per
+operation, for benchmarks that perform several), the peak memory traced and
+the net number of memory blocks allocated during one run, and the number of
+Discord API calls that one run would have made.
+"""
+
+from typing import Awaitable, Callable
+import argparse
+import asyncio
+import gc
+import logging
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import utils
+import database
+import repository
+import nomic
+from nomic import Proposal, ProposalStatus, Quantity, Rule
+
+from .fakes import FakeGuild
+
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua player proposal vote "
+    "rule point score win turn"
+).split()
+
+
+def text(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+async def populate(game, guild: FakeGuild, args, rng: random.Random) -> None:
+    """Fill an empty game with synthetic players, rules, proposals and
+    quantities, and post every rule and proposal to the fake channels.
+    """
+    game.proposals_channel = guild.add_text_channel('proposals')
+    game.rules_channel = guild.add_text_channel('rules')
+    players = [guild.add_member(f'Player {i}') for i in range(1, args.players + 1)]
+    for player in players:
+        game.player_activity[player] = utils.now()
+
+    # Rules are grouped into sections of ten, with links to earlier rules.
+    section = game.root_rule
+    for i in range(1, args.rules + 1):
+        paragraphs = [text(rng, 40) for _ in range(3)]
+        if i > 1:
+            paragraphs.append(f"See also [%rule-{rng.randint(1, i - 1)}].")
+        parent = game.root_rule if i % 10 == 1 else section
+        rule = Rule(
+            game=game,
+            tag=f'rule-{i}',
+            title=text(rng, 3).capitalize(),
+            content='\n\n'.join(paragraphs),
+            parent_tag=parent.tag,
+        )
+        game.rules[rule.tag] = rule
+        parent.child_tags.append(rule.tag)
+        if parent is game.root_rule:
+            section = rule
+        game.index_rule(rule)
+    game.invalidate_rules()
+
+    for n in range(1, args.proposals + 1):
+        if n > args.proposals - args.open:
+            status = ProposalStatus.VOTING
+        else:
+            status = rng.choice((ProposalStatus.PASSED, ProposalStatus.FAILED))
+        voters = rng.sample(players, min(args.votes, len(players)))
+        proposal = Proposal(
+            game=game,
+            n=n,
+            author=rng.choice(players),
+            content=text(rng, 80),
+            status=status,
+            votes={player: rng.choice((-1, 1)) for player in voters},
+        )
+        game._live_proposals[n] = proposal
+        game.index_proposal(proposal)
+    game.proposal_count = args.proposals
+    game.invalidate_votes()
+
+    for i in range(1, args.quantities + 1):
+        game.quantities[f'quantity-{i}'] = Quantity(
+            game=game,
+            name=f'quantity-{i}',
+            players={player: rng.randint(0, 100) for player in players},
+        )
+
+    await game.repost_rule(*game.rules.values())
+    if args.proposals:
+        await game.repost_proposal(game.get_proposal(1))
+
+
+def forget_databases(game) -> None:
+    """Drop cached DB objects for a game, so that the next load reads every
+    file from disk.
+    """
+    for name in list(database._DATABASES):
+        if name.startswith(game.repo.path) or name == game.get_search_db().name:
+            del database._DATABASES[name]
+
+
+async def run_benchmark(game, guild: FakeGuild, label: str, ops: int, repeat: int,
+                        func: Callable[[], Awaitable[None]]) -> None:
+    times = []
+    for _ in range(repeat):
+        async with game:
+            start = time.perf_counter()
+            await func()
+            times.append(time.perf_counter() - start)
+
+    # Measure allocations in a separate run, since tracing slows everything
+    # down considerably.
+    api_calls_before = sum(guild.api_calls.values())
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    async with game:
+        await func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks_before
+    api_calls = sum(guild.api_calls.values()) - api_calls_before
+
+    best, median = min(times), statistics.median(times)
+    per_op = f"{best / ops * 1000:>9.3f} ms/op" if ops > 1 else ' ' * 15
+    print(f"{label:<24} {best * 1000:>9.1f} ms  {median * 1000:>9.1f} ms  {per_op}  "
+          f"{peak / 1024:>9.1f} KiB  {blocks:>+8} blocks  {api_calls:>6} API calls")
+
+
+async def run(args) -> None:
+    rng = random.Random(args.seed)
+    guild = FakeGuild(100_000, "Benchmark")
+    game = nomic.Game(guild)
+    async with game:
+        game.load()
+        await populate(game, guild, args, rng)
+        game.save()
+    await utils.fileio.flush()
+    print(f"{args.players} players, {game.proposal_count} proposals "
+          f"({args.open} open), {len(game.rules) - 1} rules, {len(game.quantities)} quantities")
+    print(f"{'':<24} {'best':>12}  {'median':>12}  {'best':>15}  {'peak':>13}  {'net':>15}")
+
+    open_proposals = list(game.open_proposals)
+    rules = [game.rules[tag] for tag in sorted(game.rules)]
+
+    async def load():
+        forget_databases(game)
+        game.load()
+
+    async def save():
+        # Files are written in the background; this only measures the time
+        # that the event loop is blocked.
+        game.save()
+
+    async def save_and_write():
+        game.save()
+        await utils.fileio.flush()
+
+    async def vote():
+        for _ in range(args.vote_ops):
+            proposal = rng.choice(open_proposals)
+            player = rng.choice(list(game.player_activity))
+            await proposal.vote_for(player)
+
+    async def refresh_proposals():
+        await game.refresh_proposal(*open_proposals)
+
+    async def refresh_rules():
+        await game.refresh_rule(*rules)
+
+    async def render_proposals():
+        for proposal in game.iter_proposals():
+            proposal._render_embed()
+            proposal._render_markdown()
+
+    async def render_rules():
+        game.invalidate_rules()
+        game.toc_chunks
+        for rule in rules:
+            rule.embeds
+            rule.markdown
+
+    async def repost_proposals():
+        await game.repost_proposal(game.get_proposal(max(1, game.proposal_count - args.repost + 1)))
+
+    async def repost_rule():
+        await game.repost_rule(rules[-1])
+
+    benchmarks = [
+        ("load", 1, load),
+        ("save", 1, save),
+        ("save and write", 1, save_and_write),
+        (f"vote x{args.vote_ops}", args.vote_ops, vote),
+        (f"refresh proposals x{len(open_proposals)}", len(open_proposals), refresh_proposals),
+        (f"refresh rules x{len(rules)}", len(rules), refresh_rules),
+        (f"render proposals x{game.proposal_count}", game.proposal_count, render_proposals),
+        (f"render rules x{len(rules)}", len(rules), render_rules),
+        (f"repost proposals x{args.repost}", args.repost, repost_proposals),
+        ("repost rule", 1, repost_rule),
+    ]
+    for label, ops, func in benchmarks:
+        if args.only and not any(label.startswith(name) for name in args.only):
+            continue
+        await run_benchmark(game, guild, label, ops, args.repeat, func)
+        await utils.fileio.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=40)
+    parser.add_argument('--proposals', type=int, default=1000)
+    parser.add_argument('--open', type=int, default=10, help="number of proposals open for voting")
+    parser.add_argument('--votes', type=int, default=10, help="votes per proposal")
+    parser.add_argument('--rules', type=int, default=200)
+    parser.add_argument('--quantities', type=int, default=20)
+    parser.add_argument('--vote-ops', type=int, default=20, help="votes cast in the vote benchmark")
+    parser.add_argument('--repost', type=int, default=5, help="proposals reposted in the repost benchmark")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', help="only run benchmarks whose names start with these")
+    args = parser.parse_args()
+    args.open = min(args.open, args.proposals)
+
+    # Hide messages about missing data files in the new game.
+    utils.l.setLevel(logging.ERROR)
+    repository.REPOS_DIR = tempfile.mkdtemp(prefix='nomic-benchmark-')
+    try:
+        asyncio.get_event_loop().run_until_complete(run(args))
+    finally:
+        shutil.rmtree(repository.REPOS_DIR)
+
+
+if __name__ == '__main__':
+    main()
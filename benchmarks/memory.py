@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Measure the memory used by game records for a large synthetic game.
+
+Run from the repository root:
+
+    python3 -m benchmarks.memory [--proposals N]
+"""
+
+import argparse
+import random
+import sys
+import tracemalloc
+
+from nomic.proposal import Proposal
+from nomic.quantity import Quantity
+from nomic.rule import Rule
+
+
+class FakeMember:
+    def __init__(self, id):
+        self.id = id
+
+
+class FakeGame:
+    """Just enough of a game for records to be instantiated."""
+
+    def __init__(self, member_count):
+        self.members = {i: FakeMember(i) for i in range(1, member_count + 1)}
+
+    def get_member(self, user_id):
+        return self.members.get(getattr(user_id, 'id', user_id))
+
+
+def deep_instance_size(obj) -> int:
+    """Return the size of an object and its instance dictionary, if any."""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def measure(label, count, make):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [make(i) for i in range(1, count + 1)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    # Subtract the list holding the objects.
+    total -= sys.getsizeof(objects)
+    print(f"{label:<10} {count:>7} objects  {total / 1024:>10.1f} KiB total  "
+          f"{total / count:>8.1f} B/object  "
+          f"{deep_instance_size(objects[0]):>5} B instance (excluding fields)")
+    return objects
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proposals', type=int, default=10_000)
+    parser.add_argument('--rules', type=int, default=500)
+    parser.add_argument('--quantities', type=int, default=50)
+    parser.add_argument('--players', type=int, default=40)
+    parser.add_argument('--votes', type=int, default=10, help="votes per proposal")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    game = FakeGame(args.players)
+    player_ids = list(game.members)
+    votes = [
+        {str(player_id): rng.choice((-1, 0, 1)) for player_id in rng.sample(player_ids, args.votes)}
+        for _ in range(args.proposals)
+    ]
+    balances = [
+        {str(player_id): rng.randint(1, 100) for player_id in player_ids}
+        for _ in range(args.quantities)
+    ]
+
+    measure("Proposal", args.proposals, lambda i: Proposal(
+        game=game,
+        n=i,
+        author=rng.choice(player_ids),
+        content="Lorem ipsum",
+        status='passed',
+        message_id=10 ** 17 + i,
+        votes=votes[i - 1],
+        timestamp=1_600_000_000 + i,
+    ))
+    measure("Rule", args.rules, lambda i: Rule(
+        game=game,
+        tag=f'rule-{i}',
+        title="Lorem ipsum",
+        content="Lorem ipsum",
+        parent_tag='root',
+    ))
+    measure("Quantity", args.quantities, lambda i: Quantity(
+        game=game,
+        name=f'quantity-{i}',
+        players=balances[i - 1],
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Measure repository throughput (commit, push and pull cycles) for a game
+with a fake Discord guild, using a local bare repository in place of GitHub.
+
+Run from the repository root:
+
+    python3 -m benchmarks.repo [--cycles N] [--players N]
+
+Everything is done in a temporary directory, which is deleted afterwards.
+"""
+
+from asyncio.subprocess import PIPE
+from os import mkdir, path
+from typing import Dict, List
+import argparse
+import asyncio
+import logging
+import shutil
+import statistics
+import tempfile
+import time
+
+import utils
+import nomic
+import repository
+from constants import info
+
+from .fakes import FakeGuild
+
+
+GIT_IDENTITY = ['-c', 'user.name=Benchmark', '-c', 'user.email=benchmark@example.com']
+
+
+async def git(*args: str, cwd: str) -> str:
+    proc = await asyncio.create_subprocess_exec('git', *args, cwd=cwd, stdout=PIPE, stderr=PIPE)
+    stdout, stderr = await proc.communicate()
+    if proc.returncode:
+        raise RuntimeError(f"git {' '.join(args)!r} failed: {stderr.decode().strip()}")
+    return stdout.decode()
+
+
+async def make_remote(directory: str) -> str:
+    """Create a bare repository with an empty `master` branch, and return its
+    path.
+    """
+    remote = path.join(directory, 'remote.git')
+    seed = path.join(directory, 'seed')
+    await git('init', '-q', '--bare', remote, cwd=directory)
+    await git('init', '-q', seed, cwd=directory)
+    await git(*GIT_IDENTITY, 'commit', '-q', '--allow-empty', '-m', "Initial commit", cwd=seed)
+    await git('push', '-q', remote, 'HEAD:refs/heads/master', cwd=seed)
+    return remote
+
+
+class Timings:
+
+    def __init__(self):
+        self.times: Dict[str, List[float]] = {}
+
+    def add(self, label: str, seconds: float) -> None:
+        self.times.setdefault(label, []).append(seconds)
+
+    def print(self) -> None:
+        print(f"{'':<16} {'count':>6} {'mean':>10} {'median':>10} {'max':>10} {'per second':>11}")
+        for label, times in self.times.items():
+            mean = statistics.mean(times)
+            print(f"{label:<16} {len(times):>6} {mean * 1000:>7.1f} ms {statistics.median(times) * 1000:>7.1f} ms "
+                  f"{max(times) * 1000:>7.1f} ms {1 / mean:>11.1f}")
+
+
+async def run(args, directory: str) -> None:
+    repository.REPO_LINK = await make_remote(directory)
+    guild = FakeGuild(100_000, "Benchmark")
+    players = [guild.add_member(f'Player {i}') for i in range(1, args.players + 1)]
+    game = nomic.Game(guild)
+    timings = Timings()
+
+    start = time.perf_counter()
+    await game.setup(asyncio.get_event_loop())
+    timings.add("setup", time.perf_counter() - start)
+
+    # Another clone of the game's branch, which pushes changes for the game's
+    # clone to pull
+    other = path.join(directory, 'other')
+    await git('clone', '-q', '-b', game.repo.name, repository.REPO_LINK, other, cwd=directory)
+
+    for i in range(args.cycles):
+        async with game:
+            for player in players:
+                game.player_activity[player] = utils.now() + i
+            start = time.perf_counter()
+            game.save()
+            timings.add("save", time.perf_counter() - start)
+
+            start = time.perf_counter()
+            clean = await game.repo.is_clean()
+            timings.add("status", time.perf_counter() - start)
+            if not clean:
+                await game.update_readme()
+                start = time.perf_counter()
+                await game.commit_all()
+                timings.add("commit", time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await game.push()
+            timings.add("push", time.perf_counter() - start)
+
+    for i in range(args.cycles):
+        await git('pull', '-q', cwd=other)
+        with open(path.join(other, 'notes.md'), 'a') as f:
+            f.write(f"Note {i}\n")
+        await git('add', 'notes.md', cwd=other)
+        await git(*GIT_IDENTITY, 'commit', '-q', '-m', f"Note {i}", cwd=other)
+        await git('push', '-q', cwd=other)
+        async with game:
+            start = time.perf_counter()
+            await game.repo.pull()
+            timings.add("pull", time.perf_counter() - start)
+
+    print(f"{args.cycles} cycles, {args.players} players")
+    timings.print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--players', type=int, default=40)
+    args = parser.parse_args()
+
+    utils.l.setLevel(logging.ERROR)
+    logging.getLogger('git').setLevel(logging.ERROR)
+    info.GITHUB_EMAIL = info.GITHUB_EMAIL or 'benchmark@example.com'
+    directory = tempfile.mkdtemp(prefix='nomic-benchmark-')
+    repository.REPOS_DIR = path.join(directory, 'repos')
+    mkdir(repository.REPOS_DIR)
+    try:
+        asyncio.get_event_loop().run_until_complete(run(args, directory))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
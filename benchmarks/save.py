@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Measure how long it takes to serialize the data files of a large synthetic
+game, with the standard library and with database.dumps() (which uses orjson
+if it is installed).
+
+Run from the repository root:
+
+    python3 -m benchmarks.save [--proposals N] [--repeat N]
+"""
+
+import argparse
+import json
+import random
+import timeit
+
+import utils  # noqa: F401 (must be imported before database)
+import database
+from nomic.proposal import Proposal
+from nomic.quantity import Quantity
+from nomic.rule import Rule
+
+from .memory import FakeGame
+
+
+def make_data(args) -> dict:
+    rng = random.Random(0)
+    game = FakeGame(args.players)
+    player_ids = list(game.members)
+    words = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+
+    def text(n):
+        return ' '.join(rng.choice(words) for _ in range(n))
+
+    proposals = [
+        Proposal(
+            game=game,
+            n=i,
+            author=rng.choice(player_ids),
+            content=text(80),
+            status='passed',
+            message_id=10 ** 17 + i,
+            votes={str(p): rng.choice((-1, 0, 1)) for p in rng.sample(player_ids, args.votes)},
+            timestamp=1_600_000_000 + i,
+        ).export()
+        for i in range(1, args.proposals + 1)
+    ]
+    rules = {
+        f'rule-{i}': Rule(
+            game=game,
+            tag=f'rule-{i}',
+            title=text(4),
+            content=text(120),
+            parent_tag='root',
+        ).export()
+        for i in range(1, args.rules + 1)
+    }
+    quantities = {
+        f'quantity-{i}': Quantity(
+            game=game,
+            name=f'quantity-{i}',
+            players={str(p): rng.randint(1, 100) for p in player_ids},
+        ).export()
+        for i in range(1, args.quantities + 1)
+    }
+    return {'proposals': proposals, 'rules': rules, 'quantities': quantities}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proposals', type=int, default=10_000)
+    parser.add_argument('--rules', type=int, default=500)
+    parser.add_argument('--quantities', type=int, default=50)
+    parser.add_argument('--players', type=int, default=40)
+    parser.add_argument('--votes', type=int, default=10, help="votes per proposal")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_data(args)
+    expected = json.dumps(data, indent='\t')
+    if database.dumps(data) != expected:
+        raise SystemExit("database.dumps() output differs from json.dumps()")
+    print(f"Serializing {len(expected) / 1024:.1f} KiB of JSON "
+          f"(orjson {'available' if database.orjson else 'not installed'})")
+
+    for label, dumps in [
+        ("json.dumps", lambda: json.dumps(data, indent='\t')),
+        ("database.dumps", lambda: database.dumps(data)),
+    ]:
+        best = min(timeit.repeat(dumps, number=1, repeat=args.repeat))
+        print(f"{label:<16} {best * 1000:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
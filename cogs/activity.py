@@ -48,11 +48,17 @@ class PlayerActivity(commands.Cog):
         # Sort users, putting users that have never been seen at the bottom.
         diff_if_never_seen = max(diffs.values()) + 1
         users.sort(key=lambda u: diffs.get(u, diff_if_never_seen))
-        active_count = 0
-        inactive_count = 0
-        active_text = ''
-        inactive_text = ''
-        for u in users:
+        # Group active players before inactive players.
+        active = {u: game.is_active(u) for u in users}
+        users.sort(key=lambda u: not active[u])
+        active_count = sum(active.values())
+        inactive_count = len(users) - active_count
+        headings = {
+            True: "Active players" + (f" ({active_count})" if active_count else ""),
+            False: "Inactive players" + (f" ({inactive_count})" if inactive_count else ""),
+        }
+
+        def format_user(u):
             if u not in diffs:
                 last_seen_text = "never"
             else:
@@ -61,31 +67,14 @@ class PlayerActivity(commands.Cog):
                     last_seen_text = "very recently"
                 else:
                     last_seen_text = f"about {utils.format_hours(hours)} ago"
-            line = f"{u.mention} was last seen **{last_seen_text}**.\n"
-            if game.is_active(u):
-                active_count += 1
-                active_text += line
-            else:
-                inactive_count += 1
-                inactive_text += line
-        active_count = f" ({active_count})" if active_count else ""
-        inactive_count = f" ({inactive_count})" if inactive_count else ""
-        embed = discord.Embed(
-            color=colors.INFO,
-        )
-        if active_text:
-            embed.add_field(
-                name=f"Active players{active_count}",
-                value=active_text,
-                inline=False,
-            )
-        if inactive_text:
-            embed.add_field(
-                name=f"Inactive players{inactive_count}",
-                value=inactive_text,
-                inline=False,
-            )
-        await utils.discord.send_split_embed(ctx, embed)
+            return f"{u.mention} was last seen **{last_seen_text}**."
+
+        await utils.discord.Paginator(utils.discord.PageSource(
+            users,
+            format_user,
+            heading=lambda u: headings[active[u]],
+            per_page=12,
+        )).start(ctx)
 
     @commands.group('activity', invoke_without_command=True)
     async def activity(self, ctx):
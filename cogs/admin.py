@@ -1,11 +1,15 @@
+from datetime import datetime
 from discord.ext import commands
+from os import path
 from subprocess import PIPE
 import asyncio
 import discord
+import time
 
 from . import get_extensions
 from constants import colors, strings
 from utils import l
+import nomic
 import utils
 
 
@@ -125,6 +129,181 @@ class Admin(commands.Cog):
         await m.edit(embed=embed)
         await utils.discord.invoke_command(ctx, 'reload *')
 
+    @commands.group(invoke_without_command=True)
+    async def perf(self, ctx, count: int = 10):
+        """Show latency of the slowest commands since the bot started.
+
+        Commands are ranked by their 95th percentile latency. Below each command is the time per invocation spent in each instrumented section (waiting for and holding the game lock, saving, git and Discord requests), for invocations that entered it. Sections can overlap.
+
+        Use `perf locks` to see where game locks are held, `perf profile` to profile the bot, `perf slow` to see callbacks that blocked the event loop, and `perf reset` to start over.
+        """
+        # Keep the embed well within the total length limit.
+        names = utils.perf.slowest_commands(min(count, 15))
+        embed = discord.Embed(
+            color=colors.INFO,
+            title="Command latency",
+            description=f"Since {datetime.utcfromtimestamp(utils.perf.started).strftime(utils.TIME_FORMAT)}",
+        )
+        if not names:
+            embed.description += "\n\nNo commands have been run."
+        for name in names:
+            stats = utils.perf.commands[name]
+            lines = [utils.perf.format_histogram(stats.total)]
+            for section_name, histogram in sorted(stats.sections.items(), key=lambda item: -item[1].total):
+                lines.append(
+                    f"{section_name}: mean {utils.perf.format_seconds(histogram.mean)}, "
+                    f"p95 {utils.perf.format_seconds(histogram.percentile(95))} "
+                    f"({histogram.count}/{stats.total.count})"
+                )
+            embed.add_field(
+                name=f"`{ctx.prefix}{name}` ({utils.human_count(stats.total.count, 'run', 'runs')})",
+                value='\n'.join(lines),
+                inline=False,
+            )
+        if utils.perf.sections:
+            embed.add_field(
+                name="All sections",
+                value='\n'.join(
+                    f"{section_name} ({histogram.count}): {utils.perf.format_histogram(histogram)}"
+                    for section_name, histogram in sorted(utils.perf.sections.items())
+                ),
+                inline=False,
+            )
+        await ctx.send(embed=embed)
+
+    @perf.command('locks')
+    async def perf_locks(self, ctx, count: int = 10):
+        """Show which game locks are held, and where locks are held longest.
+
+        Sites where game locks are acquired are ranked by total time held.
+        """
+        now = time.perf_counter()
+        embed = discord.Embed(
+            color=colors.INFO,
+            title="Game locks",
+            description='\n'.join(
+                f"{lock.name}: {'read' if hold.shared else 'held'} for "
+                f"**{utils.perf.format_seconds(now - hold.acquired_at)}** at `{hold.site}`"
+                for lock in nomic.lock.held_locks()
+                for hold in lock.holds()
+            ) or "No game locks are held.",
+        )
+        hold_times = nomic.lock.hold_times
+        sites = sorted(hold_times, key=lambda site: hold_times[site].total, reverse=True)[:min(count, 15)]
+        for site in sites:
+            histogram = hold_times[site]
+            embed.add_field(
+                name=f"`{site}` ({utils.human_count(histogram.count, 'hold', 'holds')}, "
+                     f"{utils.perf.format_seconds(histogram.total)} total)",
+                value=utils.perf.format_histogram(histogram),
+                inline=False,
+            )
+        await ctx.send(embed=embed)
+
+    @perf.command('profile')
+    async def perf_profile(self, ctx, amount: int = 30, unit: str = 'seconds', mode: str = 'cprofile', count: int = 10):
+        """Profile the bot for some number of seconds or commands.
+
+        The unit can be `seconds` or `commands`; the mode can be `cprofile` (records every function call, but slows down the bot) or `sample` (samples the stack every few milliseconds). Profiles last at most 10 minutes.
+
+        The profile is saved in `data/profiles/` and attached, and the functions with the most cumulative time are listed (leaving out the event loop itself).
+
+        Example usage:
+        ```
+        !perf profile 20 commands sample
+        ```
+        """
+        if amount < 1:
+            raise commands.UserInputError("Amount must be positive")
+        if unit in ('s', 'sec', 'secs', 'second', 'seconds'):
+            kwargs = {'seconds': amount}
+            what = utils.human_count(amount, 'second', 'seconds')
+        elif unit in ('c', 'cmd', 'cmds', 'command', 'commands'):
+            kwargs = {'commands': amount}
+            what = utils.human_count(amount, 'command', 'commands')
+        else:
+            raise commands.UserInputError(f"Unknown unit {unit!r}; use `seconds` or `commands`")
+        if mode not in utils.profiling.PROFILERS:
+            raise commands.UserInputError(f"Unknown mode {mode!r}; use " + utils.human_list(
+                f"`{name}`" for name in utils.profiling.PROFILERS
+            ))
+        if utils.profiling.current is not None:
+            raise commands.UserInputError("A profile is already being recorded")
+        m = await ctx.send(embed=discord.Embed(
+            color=colors.INFO,
+            title=f"Profiling for {what}\N{HORIZONTAL ELLIPSIS}",
+            description=f"Mode: `{mode}`",
+        ))
+        profiler = await utils.profiling.profile(mode, **kwargs)
+        # Dumping a large profile can take a while, so do it in the I/O
+        # thread pool.
+        filepath = await utils.fileio.run(utils.profiling.PROFILES_DIR, profiler.write)
+        lines = [
+            f"`{function.name}`: **{utils.perf.format_seconds(function.cumulative)}** cumulative, "
+            f"{utils.perf.format_seconds(function.own)} own"
+            + (f", {function.calls} calls" if function.calls is not None else "")
+            for function in profiler.top(min(count, 20))
+        ]
+        description = f"Profiled for {utils.perf.format_seconds(profiler.duration)} with `{mode}`."
+        if isinstance(profiler, utils.profiling.SamplingProfiler):
+            description += f" {utils.human_count(profiler.samples, 'sample', 'samples')}, {profiler.idle} in the event loop itself."
+        description += f" Saved to `{path.relpath(filepath)}`."
+        await m.edit(embed=discord.Embed(
+            color=colors.SUCCESS,
+            title=f"Profiled for {what}",
+            description=description,
+        ))
+        await utils.discord.send_split_embed(ctx, discord.Embed(
+            color=colors.INFO,
+            title="Functions by cumulative time",
+            description='\n'.join(lines) or strings.EMPTY_LIST,
+        ))
+        if path.getsize(filepath) < utils.discord.MAX_ATTACHMENT_SIZE:
+            await ctx.send(file=discord.File(filepath))
+
+    @perf.command('slow')
+    async def perf_slow(self, ctx, threshold: str = None):
+        """Show or change the slow callback threshold.
+
+        Any callback that blocks the event loop for longer than the threshold is logged. Without an argument, this lists the most recent ones. To change the threshold, give it in milliseconds, or `off` to stop watching callbacks.
+        """
+        if threshold is not None:
+            if threshold.lower() == 'off':
+                utils.profiling.watch_loop(None)
+            else:
+                try:
+                    milliseconds = float(threshold)
+                except ValueError:
+                    raise commands.UserInputError("Threshold must be a number of milliseconds or `off`")
+                if milliseconds <= 0:
+                    raise commands.UserInputError("Threshold must be positive")
+                utils.profiling.watch_loop(milliseconds / 1000)
+        if utils.profiling.threshold is None:
+            title = "Not watching for slow callbacks"
+        else:
+            title = f"Slow callback threshold: {utils.perf.format_seconds(utils.profiling.threshold)}"
+        lines = [
+            f"{datetime.utcfromtimestamp(callback.timestamp).strftime(utils.TIME_FORMAT)}: "
+            f"**{utils.perf.format_seconds(callback.seconds)}** in {callback.description}"
+            for callback in reversed(utils.profiling.slow_callbacks)
+        ]
+        await utils.discord.send_split_embed(ctx, discord.Embed(
+            color=colors.INFO,
+            title=title,
+            description='\n'.join(lines) or "No slow callbacks recorded.",
+        ))
+
+    @perf.command('reset')
+    async def perf_reset(self, ctx):
+        """Forget all command latency, game lock and slow callback measurements."""
+        utils.perf.reset()
+        nomic.lock.reset()
+        utils.profiling.slow_callbacks.clear()
+        await ctx.send(embed=discord.Embed(
+            color=colors.SUCCESS,
+            title="Reset command latency measurements",
+        ))
+
     @commands.command(aliases=['r'])
     async def reload(self, ctx, *, extensions: str = '*'):
         """Reload an extension.
@@ -38,7 +38,7 @@ class GitHub(commands.Cog):
             for game in self.games:
                 if game.flags.auto_upload:
                     async with game:
-                        await asyncio.shield(game.upload_all())
+                        await asyncio.shield(game.spawn_locked(game.upload_all()))
         else:
             self.upload_task_ready = True
         now = datetime.now()
@@ -85,39 +85,44 @@ class GitHub(commands.Cog):
         This happens at regular intervals automatically.
         """
         async with nomic.Game(ctx) as game:
-            if await game.repo.is_ahead() or not await game.repo.is_clean():
+            uploaded = await game.repo.is_ahead() or not await game.repo.is_clean()
+            if uploaded:
                 await game.upload_all()
-                await ctx.send(embed=discord.Embed(
-                    color=colors.SUCCESS,
-                    title="Committed and pushed latest game data to remote",
-                ))
-            else:
-                await ctx.send(embed=discord.Embed(
-                    color=colors.ERROR,
-                    title="There is nothing to commit or push.",
-                ))
+        if uploaded:
+            await ctx.send(embed=discord.Embed(
+                color=colors.SUCCESS,
+                title="Committed and pushed latest game data to remote",
+            ))
+        else:
+            await ctx.send(embed=discord.Embed(
+                color=colors.ERROR,
+                title="There is nothing to commit or push.",
+            ))
 
     @github.command(name='push')
     @commands.check(nomic.Game.is_ready)
     async def github_push(self, ctx):
         """Push data to the remote branch."""
         async with nomic.Game(ctx) as game:
-            if await game.repo.is_ahead():
-                await ctx.send(embed=discord.Embed(
-                    color=colors.SUCCESS,
-                    title="Pushed latest game data to remote",
-                ))
-            else:
-                await ctx.send(embed=discord.Embed(
-                    color=colors.ERROR,
-                    title="There is nothing to push.",
-                ))
+            pushed = await game.repo.is_ahead()
+            if pushed:
+                await game.push()
+        if pushed:
+            await ctx.send(embed=discord.Embed(
+                color=colors.SUCCESS,
+                title="Pushed latest game data to remote",
+            ))
+        else:
+            await ctx.send(embed=discord.Embed(
+                color=colors.ERROR,
+                title="There is nothing to push.",
+            ))
 
     @github.command(name='status', aliases=['st'])
     @commands.check(nomic.Game.is_ready)
     async def github_status(self, ctx):
         """Display the output of `git status`."""
-        async with nomic.Game(ctx) as game:
+        async with nomic.Game(ctx).reading() as game:
             output = '\n'.join(await game.repo.get_status(porcelain=False))
         await ctx.send(embed=discord.Embed(
             color=colors.INFO,
@@ -30,10 +30,28 @@ class Proposals(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.resolution_task = bot.loop.create_task(
+            nomic.resolution.scheduler.run(self._resolve_due_proposal, now=utils.now)
+        )
+
+    def cog_unload(self):
+        self.resolution_task.cancel()
 
     async def cog_check(self, ctx):
         return await nomic.Game.is_ready(ctx)
 
+    async def _resolve_due_proposal(self, deadline: int, guild_id: int, n: int):
+        guild = self.bot.get_guild(guild_id)
+        if not guild:
+            return
+        game = nomic.Game(guild)
+        if not game.ready:
+            return
+        async with game:
+            proposal = game.get_proposal(n)
+            if proposal:
+                await game.resolve_proposal(proposal, deadline)
+
     @commands.group('proposals', aliases=['p', 'pr', 'prop', 'proposal'], invoke_without_command=True)
     async def proposals(self, ctx):
         """Manage proposals."""
@@ -103,7 +121,7 @@ class Proposals(commands.Cog):
             ))
             return
         message_iter = game.proposals_channel.history(limit=limit or None)
-        proposal_message_ids = set(p.message_id for p in game.proposals)
+        proposal_message_ids = game.proposal_message_ids
         unwanted_messages = message_iter.filter(lambda m: m.id not in proposal_message_ids)
         await utils.discord.safe_bulk_delete(await unwanted_messages.flatten())
         if ctx.channel == game.proposals_channel:
@@ -220,6 +238,9 @@ class Proposals(commands.Cog):
         if not (await utils.discord.is_admin(ctx) or ctx.author == proposal.author):
             raise commands.UserInputError("You cannot edit someone else's proposal")
         game = nomic.Game(ctx)
+        # Votes may change while waiting for the new content and confirmation,
+        # but the content and status must not.
+        version, old_content, old_status = proposal.version, proposal.content, proposal.status
         if ctx.message.attachments:
             new_content = (await ctx.message.attachments[0].read()).decode().strip()
         else:
@@ -253,9 +274,11 @@ class Proposals(commands.Cog):
             description=new_content,
         )
         if response == 'y':
-            async with game:
-                await proposal.set_content(new_content)
-                await game.log_proposal_change_content(ctx.author, proposal)
+            async with utils.discord.CancelOnError(m, title_format=f"Edit to {proposal} {{}}", description=new_content):
+                async with game:
+                    game.check_proposal(proposal, version, content=old_content, status=old_status)
+                    await proposal.set_content(new_content)
+                    await game.log_proposal_change_content(ctx.author, proposal)
         if ctx.channel.id == game.proposals_channel.id:
             await m.delete()
         else:
@@ -355,40 +378,40 @@ class Proposals(commands.Cog):
             return
         game = nomic.Game(ctx)
         if game.proposals_channel and payload.channel_id == game.proposals_channel.id:
-            for proposal in game.proposals:
-                if proposal.message_id == payload.message_id:
-                    if payload.emoji.name in emoji.VOTES:
-                        vote_func = {
-                            emoji.VOTE_FOR: proposal.vote_for,
-                            emoji.VOTE_AGAINST: proposal.vote_against,
-                            emoji.VOTE_ABSTAIN: proposal.vote_abstain_or_remove,
-                        }[payload.emoji.name]
-                        async with game:
-                            old_amount = proposal.votes.get(member)
-                            await vote_func(member)
-                            new_amount = proposal.votes.get(member)
-                            await game.log_proposal_vote(
-                                member, proposal, member,
-                                old_amount, new_amount,
-                            )
-                            game.record_activity(member)
-                    elif payload.emoji.name in (emoji.PASS, emoji.FAIL, emoji.DELETE, emoji.REOPEN, 'pass', 'fail', 'delete', 'reopen'):
-                        new_status = {
-                            emoji.PASS: nomic.ProposalStatus.PASSED,
-                            emoji.FAIL: nomic.ProposalStatus.FAILED,
-                            emoji.DELETE: nomic.ProposalStatus.DELETED,
-                            emoji.REOPEN: nomic.ProposalStatus.VOTING,
-                            'pass': nomic.ProposalStatus.PASSED,
-                            'fail': nomic.ProposalStatus.FAILED,
-                            'delete': nomic.ProposalStatus.DELETED,
-                            'reopen': nomic.ProposalStatus.VOTING,
-                        }[payload.emoji.name]
-                        async with game:
-                            await proposal.set_status(new_status)
-                            await game.log_proposal_change_status(member, proposal)
-                            game.record_activity(member)
-                    else:
-                        await ctx.message.remove_reaction(payload.emoji, member)
+            proposal = game.get_proposal_by_message(payload.message_id)
+            if proposal:
+                if payload.emoji.name in emoji.VOTES:
+                    vote_func = {
+                        emoji.VOTE_FOR: proposal.vote_for,
+                        emoji.VOTE_AGAINST: proposal.vote_against,
+                        emoji.VOTE_ABSTAIN: proposal.vote_abstain_or_remove,
+                    }[payload.emoji.name]
+                    async with game:
+                        old_amount = proposal.votes.get(member)
+                        await vote_func(member)
+                        new_amount = proposal.votes.get(member)
+                        await game.log_proposal_vote(
+                            member, proposal, member,
+                            old_amount, new_amount,
+                        )
+                        game.record_activity(member)
+                elif payload.emoji.name in (emoji.PASS, emoji.FAIL, emoji.DELETE, emoji.REOPEN, 'pass', 'fail', 'delete', 'reopen'):
+                    new_status = {
+                        emoji.PASS: nomic.ProposalStatus.PASSED,
+                        emoji.FAIL: nomic.ProposalStatus.FAILED,
+                        emoji.DELETE: nomic.ProposalStatus.DELETED,
+                        emoji.REOPEN: nomic.ProposalStatus.VOTING,
+                        'pass': nomic.ProposalStatus.PASSED,
+                        'fail': nomic.ProposalStatus.FAILED,
+                        'delete': nomic.ProposalStatus.DELETED,
+                        'reopen': nomic.ProposalStatus.VOTING,
+                    }[payload.emoji.name]
+                    async with game:
+                        await proposal.set_status(new_status)
+                        await game.log_proposal_change_status(member, proposal)
+                        game.record_activity(member)
+                else:
+                    await ctx.message.remove_reaction(payload.emoji, member)
 
     ########################################
     # MODIFYING PROPOSAL STATUS
@@ -479,6 +502,75 @@ class Proposals(commands.Cog):
             raise
         await self._clean_channel(ctx)
 
+    ########################################
+    # AUTOMATIC RESOLUTION
+    ########################################
+
+    RESOLUTION_SETTINGS = {
+        'auto': 'auto_resolve',
+        'period': 'voting_period',
+        'quorum': 'quorum',
+        'majority': 'majority',
+    }
+
+    @proposals.command('resolution', aliases=['autoresolve', 'deadline'])
+    async def resolution_settings(self, ctx, setting: str = None, value: str = None):
+        """View or change automatic proposal resolution settings.
+
+        When automatic resolution is enabled, each proposal is passed or failed
+        once its voting period (counted from submission) has elapsed.
+
+        Settings:
+        - `auto` -- `on` or `off`
+        - `period` -- voting period in hours
+        - `quorum` -- fraction of active players who must vote (e.g. `0.5`)
+        - `majority` -- fraction of for/against votes that must be exceeded by
+          votes for (e.g. `0.5` for a simple majority)
+
+        Example usage:
+        ```
+        !proposals resolution period 72
+        ```
+        """
+        game = nomic.Game(ctx)
+        if setting is None:
+            flags = game.flags
+            description = f"Automatic resolution is **{'on' if flags.auto_resolve else 'off'}**.\n"
+            description += f"Voting period: **{utils.format_hours(flags.voting_period)}**\n"
+            description += f"Quorum: **{flags.quorum:.0%}** of active players\n"
+            description += f"Majority: more than **{flags.majority:.0%}** of votes for or against"
+            await ctx.send(embed=discord.Embed(
+                color=colors.INFO,
+                title="Proposal resolution",
+                description=description,
+            ))
+            return
+        if not await utils.discord.is_admin(ctx):
+            raise commands.UserInputError("You must be an admin to change proposal resolution settings")
+        setting = setting.lower()
+        if setting not in self.RESOLUTION_SETTINGS or value is None:
+            raise commands.UserInputError(f"Specify one of {utils.human_list(f'`{s}`' for s in self.RESOLUTION_SETTINGS)} and a new value")
+        try:
+            if setting == 'auto':
+                if value.lower() not in ('on', 'off'):
+                    raise ValueError
+                new_value = value.lower() == 'on'
+            elif setting == 'period':
+                new_value = int(value)
+                if new_value < 1:
+                    raise ValueError
+            else:
+                new_value = float(value)
+                if not 0 <= new_value <= 1:
+                    raise ValueError
+        except ValueError:
+            raise commands.UserInputError(f"Invalid value {value!r} for `{setting}`")
+        async with game:
+            setattr(game.flags, self.RESOLUTION_SETTINGS[setting], new_value)
+            game.schedule_all_deadlines()
+            game.save()
+        await ctx.message.add_reaction(emoji.SUCCESS)
+
     ########################################
     # MISCELLANEOUS COMMANDS
     ########################################
@@ -492,7 +584,7 @@ class Proposals(commands.Cog):
         if not (await utils.discord.is_admin(ctx) or ctx.author == proposal.author):
             raise commands.UserInputError("You cannot permanently delete someone else's proposal")
         game = nomic.Game(ctx)
-        if proposal.n != len(game.proposals):
+        if proposal.n != game.proposal_count:
             raise commands.UserInputError("Can only permanently delete most recent proposal")
         m, response = await utils.discord.get_confirm_embed(
             ctx,
@@ -508,37 +600,106 @@ class Proposals(commands.Cog):
                 await game.log_proposal_permadel(ctx.author, proposal)
         await self._clean_channel(ctx)
 
-    @proposals.command('info', aliases=['age', 'i', 'stat', 'stats'])
+    @proposals.command('info', aliases=['age', 'i'])
     async def proposal_info(self, ctx, *proposals: ProposalConverter):
         game = nomic.Game(ctx)
         proposals = sorted(set(proposals))
         if not proposals:
             title = "Pending proposals"
-            for proposal in game.proposals:
-                if proposal.status == nomic.ProposalStatus.VOTING:
-                    proposals.append(proposal)
+            proposals = list(game.open_proposals)
         else:
             title = "Proposals"
         if not proposals:
             raise commands.UserInputError("There are no open proposals; please specify at least one proposal")
-        description = ''
-        for proposal in proposals:
+        now = utils.now()
+
+        def format_proposal(proposal):
             age = utils.format_time_interval(
                 proposal.timestamp,
-                utils.now(),
+                now,
                 include_seconds=False,
             )
-            description += f"**[#{proposal.n}]({proposal.discord_link})**"
-            description += f" \N{EN DASH} **{age}**"
-            description += f" \N{EN DASH} **{proposal.votes_for}** for; **{proposal.votes_against}** against"
+            line = f"**[#{proposal.n}]({proposal.discord_link})**"
+            line += f" \N{EN DASH} **{age}**"
+            line += f" \N{EN DASH} **{proposal.votes_for}** for; **{proposal.votes_against}** against"
             if proposal.votes_abstain:
-                description += f"; **{proposal.votes_abstain}** abstain"
-            description += "\n"
-        await utils.discord.send_split_embed(ctx, discord.Embed(
-            color=colors.INFO,
+                line += f"; **{proposal.votes_abstain}** abstain"
+            return line
+
+        await utils.discord.Paginator(utils.discord.PageSource(
+            proposals,
+            format_proposal,
             title=title,
-            description=description,
-        ))
+        )).start(ctx)
+
+    @proposals.command('stats', aliases=['analytics', 'stat'])
+    async def proposal_stats(self, ctx, top: int = 5):
+        """Show voting statistics across all proposals.
+
+        top -- Number of entries to show in each ranking
+        """
+        game = nomic.Game(ctx)
+        analytics = game.vote_analytics
+        closed = sum(closed for _, closed in analytics.pass_rates.values())
+        passed = sum(passed for passed, _ in analytics.pass_rates.values())
+        overview = f"**{len(analytics.proposal_numbers)}** proposals; **{passed}** passed and **{closed - passed}** failed"
+        if closed:
+            overview += f" ({passed / closed:.0%} pass rate)"
+        overview += "\n"
+        if analytics.average_turnout is not None:
+            overview += f"Average turnout: **{analytics.average_turnout:.0%}** of {utils.human_count(len(analytics.player_ids), 'voter', 'voters')}\n"
+        if analytics.average_time_to_pass is not None:
+            overview += f"Average time to pass: **{utils.format_time_interval(int(analytics.average_time_to_pass), include_seconds=False)}**\n"
+        embed = discord.Embed(
+            color=colors.INFO,
+            title="Proposal statistics",
+            description=overview,
+        )
+
+        def mention(user_id):
+            member = game.get_member(user_id)
+            return member.mention if member else "an unknown user"
+
+        author_lines = [
+            f"{mention(author_id)} \N{EN DASH} **{passed / closed:.0%}** ({passed}/{closed})"
+            for author_id, (passed, closed) in sorted(
+                analytics.pass_rates.items(),
+                key=lambda item: (-item[1][0] / item[1][1], -item[1][1]),
+            )
+        ]
+        embed.add_field(
+            name="Pass rate by author",
+            value="\n".join(author_lines[:top]) or strings.EMPTY_LIST,
+            inline=False,
+        )
+        ranking = analytics.agreement_ranking(min_shared=3)
+        for name, pairs in (("Most agreement", ranking[:top]),
+                            ("Least agreement", ranking[::-1][:top])):
+            embed.add_field(
+                name=name,
+                value="\n".join(
+                    f"{mention(a)} & {mention(b)} \N{EN DASH} **{fraction:.0%}** of {shared}"
+                    for (a, b), fraction, shared in pairs
+                ) or strings.EMPTY_LIST,
+                inline=False,
+            )
+        await utils.discord.send_split_embed(ctx, embed)
+
+    @proposals.command('search', aliases=['find'], rest_is_raw=True)
+    async def search_proposals(self, ctx, *, query: str):
+        """Search proposals for one or more words."""
+        query = query.strip()
+        if not query:
+            await invoke_command_help(ctx)
+            return
+        game = nomic.Game(ctx)
+        await utils.discord.Paginator(utils.discord.PageSource(
+            game.search_proposals(query),
+            lambda result: f"**[#{result[0].n}]({result[0].discord_link})** \N{EN DASH} {result[1]}",
+            title=f"Proposals matching {query!r}",
+            per_page=8,
+            empty="No matching proposals",
+        )).start(ctx)
 
     @proposals.command('download', aliases=['dl'])
     async def download_proposal(self, ctx, *proposals: ProposalConverter):
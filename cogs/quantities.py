@@ -1,5 +1,7 @@
+from datetime import datetime
 from discord.ext import commands
-from typing import Iterable, Union
+from typing import Dict, Iterable, List, Union
+import csv
 import discord
 import re
 
@@ -17,6 +19,49 @@ class QuantityConverter(commands.Converter):
         raise commands.UserInputError(f"No quantity named {argument!r}")
 
 
+class TimestampConverter(commands.Converter):
+    """Convert a UTC date (`YYYY-MM-DD`) or date and time (`YYYY-MM-DDTHH:MM`) to
+    a timestamp. A date on its own means the end of that day.
+    """
+
+    async def convert(self, ctx, argument):
+        for fmt, offset in (('%Y-%m-%d', 24 * 3600 - 1), ('%Y-%m-%dT%H:%M', 59)):
+            try:
+                return int(datetime.strptime(argument, fmt).timestamp()) + offset
+            except ValueError:
+                pass
+        raise commands.UserInputError(f"Invalid date {argument!r}; use `YYYY-MM-DD` or `YYYY-MM-DDTHH:MM` (UTC)")
+
+
+class PlayerGroupConverter(commands.Converter):
+    """Convert an argument to a list of players.
+
+    Accepts a single member, `active` for all active players, or a proposal
+    number with an optional suffix: `%12` for everyone who voted on proposal 12,
+    `%12+` for everyone who voted for it, and `%12-` for everyone who voted
+    against it.
+    """
+
+    async def convert(self, ctx, argument):
+        game = nomic.Game(ctx)
+        if argument.lower() == 'active':
+            return list(filter(game.is_active, game.player_activity))
+        if argument.startswith('%'):
+            vote_type = argument[-1] if argument[-1] in '+-' else None
+            try:
+                proposal = game.get_proposal(int(argument[1:].rstrip('+-')))
+            except ValueError:
+                proposal = None
+            if not proposal:
+                raise commands.UserInputError(f"Unable to fetch proposal {argument!r}")
+            return [
+                player for player, amount in proposal.votes.items()
+                if not (vote_type == '+' and amount <= 0)
+                and not (vote_type == '-' and amount >= 0)
+            ]
+        return [await utils.discord.MeOrMemberConverter().convert(ctx, argument)]
+
+
 class Quantities(commands.Cog):
     """Commands pertaining to quantities/currencies and transactions."""
 
@@ -63,27 +108,78 @@ class Quantities(commands.Cog):
     async def quantity_info(self, ctx, *quantities: QuantityConverter()):
         """List each player's values for a given quantity"""
         game = nomic.Game(ctx)
-        embed = discord.Embed(color=colors.INFO)
         if not quantities:
             quantities = game.quantities.values()
         quantity_names = sorted(set(q.name for q in quantities))
         quantities = [game.get_quantity(name) for name in quantity_names]
-        if len(quantities) > 1:
-            embed.title = "Quantities"
+        # Each item is a tuple (quantity, line). Lines are formatted now, since
+        # values may change while the pages are being viewed.
+        items = []
         for quantity in quantities:
-            value = ''
-            for member, amount in quantity.players.sorted_items():
-                value += f"{member.mention} has **{amount}**\n"
-            if value:
-                value += f"(all other players have {quantity.default_value})"
-            else:
-                value = f"(all players have {quantity.default_value})"
-            embed.add_field(
-                name=quantity.name.capitalize(),
-                value=value,
-                inline=False,
+            items += (
+                (quantity, f"{member.mention} has **{quantity.players[member]}**")
+                for member in quantity.players.sorted_keys()
             )
-        await utils.discord.send_split_embed(ctx, embed)
+            if quantity.players:
+                items.append((quantity, f"(all other players have {quantity.default_value})"))
+            else:
+                items.append((quantity, f"(all players have {quantity.default_value})"))
+
+        await utils.discord.Paginator(utils.discord.PageSource(
+            items,
+            lambda item: item[1],
+            title="Quantities" if len(quantities) > 1 else None,
+            heading=lambda item: item[0].name.capitalize(),
+        )).start(ctx)
+
+    @quantities.command('history', aliases=['hist', 'ledger'])
+    async def quantity_history(self, ctx,
+                               quantity: QuantityConverter(),
+                               user: utils.discord.MeOrMemberConverter() = None,
+                               until: TimestampConverter() = None):
+        """List a player's most recent transactions for a quantity.
+
+        If a date is supplied (`YYYY-MM-DD` or `YYYY-MM-DDTHH:MM`, in UTC), list
+        the transactions up to that point instead.
+        """
+        game = nomic.Game(ctx)
+        user = user or ctx.author
+        description = ''
+        for entry, balance in await game.get_ledger(quantity).history(user.id, until=until):
+            timestamp = datetime.fromtimestamp(entry.timestamp).strftime('%Y-%m-%d %H:%M')
+            agent = game.get_member(entry.agent_id)
+            description += f"`{timestamp}` **{'+' if entry.delta >= 0 else '-'}{abs(entry.delta)}** (now **{balance}**)"
+            if agent:
+                description += f" by {agent.mention}"
+            description += "\n"
+        await ctx.send(embed=discord.Embed(
+            color=colors.INFO,
+            title=f"History of {quantity.name} for {utils.discord.fake_mention(user)}",
+            description=description or strings.EMPTY_LIST,
+        ))
+
+    @quantities.command('balance', aliases=['asof', 'at'])
+    async def quantity_balance(self, ctx,
+                               quantity: QuantityConverter(),
+                               user: utils.discord.MeOrMemberConverter(),
+                               when: TimestampConverter()):
+        """Look up a player's value for a quantity at a point in time.
+
+        The time must be a date (`YYYY-MM-DD`, meaning the end of that day) or a
+        date and time (`YYYY-MM-DDTHH:MM`), in UTC.
+        """
+        game = nomic.Game(ctx)
+        balance = await game.get_ledger(quantity).balance_at(user.id, when)
+        timestamp = datetime.fromtimestamp(when).strftime('%Y-%m-%d %H:%M')
+        if balance is None:
+            description = f"The ledger for {quantity} does not go back to {timestamp}."
+        else:
+            description = f"{user.mention} had **{balance}** at {timestamp}."
+        await ctx.send(embed=discord.Embed(
+            color=colors.INFO,
+            title=f"Balance of {quantity.name}",
+            description=description,
+        ))
 
     @quantities.command('new', aliases=['add', 'create'])
     async def add_quantity(self, ctx, quantity_name: str, *aliases: str):
@@ -121,9 +217,11 @@ class Quantities(commands.Cog):
             description="Are you sure? This cannot be undone.",
         )
         if response == 'y':
-            async with game:
-                game.remove_quantity(quantity)
-                await game.log_quantity_remove(ctx.author, quantity)
+            async with utils.discord.CancelOnError(m, title_format=f"Deletion of quantity {quantity.name!r} {{}}"):
+                async with game:
+                    game.check_quantity(quantity)
+                    game.remove_quantity(quantity)
+                    await game.log_quantity_remove(ctx.author, quantity)
         await m.edit(embed=discord.Embed(
             color=colors.YESNO[response],
             title=f"Deletion of quantity {quantity.name!r} {strings.YESNO[response]}",
@@ -135,15 +233,18 @@ class Quantities(commands.Cog):
         game = nomic.Game(ctx)
         new_name = new_name.lower()
         self._check_quantity_names(game, new_name, quantity)
+        version = quantity.version
+        old_name = quantity.name
         m, response = await utils.discord.get_confirm_embed(
             ctx,
-            title=f"Rename quantity {quantity.name!r} to {new_name!r}?",
+            title=f"Rename quantity {old_name!r} to {new_name!r}?",
         )
         if response == 'y':
-            async with game:
-                old_name = quantity.name
-                quantity.rename(new_name)
-                await game.log_quantity_rename(ctx.author, old_name, new_name)
+            async with utils.discord.CancelOnError(m, title_format=f"Renaming of quantity {old_name!r} {{}}"):
+                async with game:
+                    game.check_quantity(quantity, version, name=old_name)
+                    quantity.rename(new_name)
+                    await game.log_quantity_rename(ctx.author, old_name, new_name)
         await m.edit(embed=discord.Embed(
             color=colors.YESNO[response],
             title=f"Renaming of quantity {quantity.name!r} {strings.YESNO[response]}",
@@ -167,15 +268,18 @@ class Quantities(commands.Cog):
         if int(new_default) == new_default:
             new_default = int(new_default)
         old_default = quantity.default_value
+        version = quantity.version
         m, response = await utils.discord.get_confirm_embed(
             ctx,
             title=f"Change default value of {quantity} from {old_default} to {new_default}?",
             description=f"Any players with {old_default} of {quantity} will now have {new_default}.",
         )
         if response == 'y':
-            async with nomic.Game(ctx) as game:
-                quantity.set_default(new_default)
-                await game.log_quantity_change_default_value(ctx.author, quantity, old_default, new_default)
+            async with utils.discord.CancelOnError(m, title_format="Default value change {}"):
+                async with nomic.Game(ctx) as game:
+                    game.check_quantity(quantity, version, default_value=old_default)
+                    quantity.set_default(new_default)
+                    await game.log_quantity_change_default_value(ctx.author, quantity, old_default, new_default)
             await m.edit(embed=discord.Embed(
                 color=colors.CONFIRM,
                 title=f"Default value of {quantity} changed to {new_default}",
@@ -250,7 +354,8 @@ class Quantities(commands.Cog):
                        *, reason: str = ''):
         game = nomic.Game(ctx)
         positive = amount >= 0
-        old_amount = quantity.get(user)
+        view = quantity.view([user])
+        old_amount = view.values[user]
         new_amount = old_amount + amount
         description = f"**{'+' if positive else '-'}{abs(amount)} {quantity.name}**"
         description += f" {'to' if positive else 'from'} {user.mention}"
@@ -261,19 +366,164 @@ class Quantities(commands.Cog):
             description=ask_description,
         )
         if response == 'y':
-            async with game:
-                # Compute new amount again, in case the amount has changed since
-                # the beginning of this function's execution.
-                new_amount = quantity.get(user) + amount
-                quantity.set(user, new_amount)
-                await game.log_quantity_set_value(ctx.author, quantity, user, old_amount, new_amount)
-                description += f" (now **{new_amount}**)"
+            async with utils.discord.CancelOnError(m, title_format="Transaction {}", description=description):
+                async with game:
+                    # The amount may have changed while waiting for
+                    # confirmation, in which case this raises ConflictError.
+                    (_, old_amount, new_amount), = game.transact_quantity(quantity, {user: amount}, ctx.author, based_on=view)
+                    await game.log_quantity_set_value(ctx.author, quantity, user, old_amount, new_amount)
+            description += f" (now **{new_amount}**)"
         await m.edit(embed=discord.Embed(
             color=colors.YESNO[response],
             title=f"Transaction {strings.YESNO[response]}",
             description=description
         ))
 
+    ########################################
+    # BULK TRANSACTION COMMANDS
+    ########################################
+
+    @quantities.command('giveall', aliases=['+all', 'bulkgive'])
+    async def transact_give_all(self, ctx,
+                                amount: Union[int, float],
+                                quantity: QuantityConverter(),
+                                *players: PlayerGroupConverter()):
+        """Increase the value of a quantity for several players at once.
+
+        Each player can be a user, `active` for all active players, `%12` for
+        everyone who voted on proposal 12, `%12+` for everyone who voted for it,
+        or `%12-` for everyone who voted against it.
+
+        Example usage:
+        ```
+        !quantities giveall 5 points %12+
+        ```
+        """
+        await self._transact_players(ctx, amount, quantity, players)
+
+    @quantities.command('takeall', aliases=['-all', 'bulktake'])
+    async def transact_take_all(self, ctx,
+                                amount: Union[int, float],
+                                quantity: QuantityConverter(),
+                                *players: PlayerGroupConverter()):
+        """Decrease the value of a quantity for several players at once.
+
+        See `quantities giveall` for how to specify players.
+        """
+        await self._transact_players(ctx, -abs(amount), quantity, players)
+
+    @quantities.command('multiply', aliases=['*', 'mul', 'scale'])
+    async def transact_multiply(self, ctx,
+                                factor: float,
+                                quantity: QuantityConverter()):
+        """Multiply the value of a quantity for every player.
+
+        Players who have the default value are not affected.
+        """
+        deltas = {
+            player: round(value * factor, 6) - value
+            for player, value in quantity.players.items()
+        }
+        await self.bulk_transact(
+            ctx, quantity, deltas,
+            summary=f"Multiply {quantity} by **{factor}**",
+        )
+
+    @quantities.command('import', aliases=['bulk', 'csv'])
+    async def transact_import(self, ctx, quantity: QuantityConverter()):
+        """Apply changes to a quantity from an attached CSV file.
+
+        Each line of the file must contain a user (mention, ID, or name) and an
+        amount to add to that user's value, separated by a comma. Negative
+        amounts are subtracted.
+        """
+        if not ctx.message.attachments:
+            raise commands.UserInputError("Attach a CSV file of users and amounts")
+        try:
+            content = (await ctx.message.attachments[0].read()).decode()
+        except UnicodeDecodeError:
+            raise commands.UserInputError("The CSV file must be UTF-8 encoded")
+        deltas = {}
+        for line_number, row in enumerate(csv.reader(content.splitlines()), 1):
+            if not row or not ''.join(row).strip():
+                continue
+            try:
+                user, amount = (cell.strip() for cell in row)
+                amount = float(amount)
+            except ValueError:
+                raise commands.UserInputError(f"Line {line_number} of the CSV file must contain a user and an amount")
+            if int(amount) == amount:
+                amount = int(amount)
+            try:
+                user = await utils.discord.MeOrMemberConverter().convert(ctx, user)
+            except commands.BadArgument:
+                raise commands.UserInputError(f"Unable to find user {user!r} on line {line_number} of the CSV file")
+            deltas[user] = deltas.get(user, 0) + amount
+        await self.bulk_transact(
+            ctx, quantity, deltas,
+            summary=f"Apply changes to {quantity} from `{ctx.message.attachments[0].filename}`",
+        )
+
+    async def _transact_players(self, ctx,
+                                amount: Union[int, float],
+                                quantity: nomic.Quantity,
+                                player_groups: List[List[discord.Member]]):
+        players = set(player for group in player_groups for player in group)
+        if not players:
+            raise commands.UserInputError("No players specified")
+        positive = amount >= 0
+        await self.bulk_transact(
+            ctx, quantity, {player: amount for player in players},
+            summary=f"**{'+' if positive else '-'}{abs(amount)} {quantity.name}** {'to' if positive else 'from'} {utils.human_count(len(players), 'player', 'players')}",
+        )
+
+    async def bulk_transact(self, ctx,
+                            quantity: nomic.Quantity,
+                            deltas: Dict[discord.Member, Union[int, float]],
+                            *, summary: str):
+        """Apply changes to a quantity for many players with a single
+        confirmation, lock acquisition, save, and log entry.
+
+        `deltas` maps players to the amount to add to their value. If any of
+        those players' values change while waiting for confirmation, nothing is
+        done and the conflict is reported instead.
+        """
+        game = nomic.Game(ctx)
+        if not any(deltas.values()):
+            raise commands.UserInputError("This transaction would not change anything")
+        view = quantity.view(deltas)
+        preview = self._describe_bulk_changes(
+            (player, old_value, old_value + deltas[player])
+            for player, old_value in view.values.items()
+        )
+        m, response = await utils.discord.get_confirm_embed(
+            ctx,
+            title="Authorize bulk transaction?",
+            description=f"{summary}\n\n{preview}",
+        )
+        description = summary
+        if response == 'y':
+            async with utils.discord.CancelOnError(m, title_format="Bulk transaction {}", description=summary):
+                async with game:
+                    changes = game.transact_quantity(quantity, deltas, ctx.author, based_on=view)
+                    await game.log_quantity_bulk_set_value(ctx.author, quantity, changes)
+            description += "\n\n" + self._describe_bulk_changes(changes)
+        await m.edit(embed=discord.Embed(
+            color=colors.YESNO[response],
+            title=f"Bulk transaction {strings.YESNO[response]}",
+            description=description,
+        ))
+
+    def _describe_bulk_changes(self, changes, max_lines: int = 20) -> str:
+        lines = [
+            f"{player.mention}: {old_value} \N{RIGHTWARDS ARROW} **{new_value}**"
+            for player, old_value, new_value in changes
+            if old_value != new_value
+        ]
+        if len(lines) > max_lines:
+            lines = lines[:max_lines] + [f"\N{HORIZONTAL ELLIPSIS} and {len(lines) - max_lines} more"]
+        return "\n".join(lines) or strings.EMPTY_LIST
+
     def _check_quantity_names(self,
                               game: nomic.Game,
                               names: Union[str, Iterable[str]],
@@ -179,7 +179,7 @@ class Rules(commands.Cog):
                 m, response, title_format="Rule creation {}"
             )
             return
-        response, content = await self._rule_edit_wizard(ctx, nomic.Rule(
+        m, response, content = await self._rule_edit_wizard(ctx, nomic.Rule(
             game=game,
             tag=rule_tag,
             title=title,
@@ -187,11 +187,13 @@ class Rules(commands.Cog):
         ), edit=False)
         if response != 'y':
             return
-        async with game:
-            rule = await game.add_rule(
-                *rule_location, tag=rule_tag, title=title, content=content
-            )
-            await game.log_rule_add(ctx.author, rule)
+        async with utils.discord.CancelOnError(m, title_format="New rule {}"):
+            async with game:
+                game.check_rule(rule_location[0])
+                rule = await game.add_rule(
+                    *rule_location, tag=rule_tag, title=title, content=content
+                )
+                await game.log_rule_add(ctx.author, rule)
 
     @rules.command('edit')
     async def edit_rule(self, ctx, rule: RuleConverter):
@@ -200,6 +202,8 @@ class Rules(commands.Cog):
         You can type the entire contents of the rule section, or attach a raw
         file containing its Markdown content.
         """
+        version, old_content = rule.version, rule.content
+        m = None
         if ctx.message.attachments:
             new_content = (await ctx.message.attachments[0].read()).decode().strip()
             await ctx.message.add_reaction(emoji.SUCCESS)
@@ -214,12 +218,14 @@ class Rules(commands.Cog):
                     ))
                 else:
                     await utils.discord.invoke_command(ctx, 'rule download', rule)
-            response, new_content = await self._rule_edit_wizard(ctx, rule, edit=True)
+            m, response, new_content = await self._rule_edit_wizard(ctx, rule, edit=True)
             if response != 'y':
                 return
-        async with nomic.Game(ctx) as game:
-            await game.set_rule_content(rule, new_content)
-            await game.log_rule_change_content(ctx.author, rule)
+        async with utils.discord.CancelOnError(m, title_format="Rule edit {}"):
+            async with nomic.Game(ctx) as game:
+                game.check_rule(rule, version, content=old_content)
+                await game.set_rule_content(rule, new_content)
+                await game.log_rule_change_content(ctx.author, rule)
 
     @rules.command('move', aliases=['mv'], rest_is_raw=True)
     async def move_rule(self, ctx, rule: RuleConverter, *, new_rule_location: RuleLocationConverter):
@@ -233,6 +239,7 @@ class Rules(commands.Cog):
             game.check_move_rule(rule, new_parent)
         except ValueError as e:
             raise commands.UserInputError(str(e))
+        version, old_parent_tag = rule.version, rule.parent_tag
         m, response = await utils.discord.get_confirm_embed(
             ctx, title=f"Move {rule}?",
         )
@@ -241,9 +248,12 @@ class Rules(commands.Cog):
         )
         if response != 'y':
             return
-        async with game:
-            await game.move_rule(rule, new_parent, new_index)
-            await game.log_rule_move(ctx.author, rule)
+        async with utils.discord.CancelOnError(m, title_format="Rule section move {}"):
+            async with game:
+                game.check_rule(rule, version, parent_tag=old_parent_tag)
+                game.check_rule(new_parent)
+                await game.move_rule(rule, new_parent, new_index)
+                await game.log_rule_move(ctx.author, rule)
 
     @rules.command('remove', aliases=['del', 'delete', 'rm'])
     async def remove_rule(self, ctx, rule: RuleConverter):
@@ -258,13 +268,15 @@ class Rules(commands.Cog):
                 m, response, title_format="Rule section removal {}"
             )
             return
+        async with utils.discord.CancelOnError(m, title_format="Rule section removal {}"):
+            async with game:
+                game.check_rule(rule)
+                await game.remove_rule(rule)
+                await game.log_rule_remove(ctx.author, rule)
         await m.edit(embed=discord.Embed(
             color=colors.SUCCESS,
             title=f"{str(rule).capitalize()} deleted",
         ))
-        async with game:
-            await game.remove_rule(rule)
-            await game.log_rule_remove(ctx.author, rule)
 
     @rules.command('retag', aliases=['changetag'])
     async def retag_rule(self, ctx, rule: RuleConverter, new_tag: str):
@@ -282,6 +294,7 @@ class Rules(commands.Cog):
     @rules.command('retitle', aliases=['changetitle', 'rename'], rest_is_raw=True)
     async def retitle_rule(self, ctx, rule: RuleConverter, *, new_title):
         """Change a rule's title."""
+        version, old_title = rule.version, rule.title
         new_title = new_title.strip()
         if not new_title:
             m, response, new_title = await utils.discord.query_content(
@@ -300,13 +313,15 @@ class Rules(commands.Cog):
                 m, response, title_format="Rule title change {}"
             )
             return
+        async with utils.discord.CancelOnError(m, title_format="Rule title change {}"):
+            async with nomic.Game(ctx) as game:
+                game.check_rule(rule, version, title=old_title)
+                await game.set_rule_title(rule, new_title)
+                await game.log_rule_change_title(ctx.author, rule)
         await m.edit(embed=discord.Embed(
             color=colors.SUCCESS,
             title=f"Title of {rule} changed to **{new_title}**",
         ))
-        async with nomic.Game(ctx) as game:
-            await game.set_rule_title(rule, new_title)
-            await game.log_rule_change_title(ctx.author, rule)
 
     async def _rule_edit_wizard(self, ctx, rule: RuleConverter, *, edit: bool):
         m, response, content = await utils.discord.query_content(
@@ -317,7 +332,7 @@ class Rules(commands.Cog):
         await utils.discord.edit_embed_for_response(
             m, response, title_format="Rule edit {}" if edit else "New rule {}"
         )
-        return response, content
+        return m, response, content
 
     ########################################
     # MISCELLANEOUS COMMANDS
@@ -361,6 +376,22 @@ class Rules(commands.Cog):
             description=description,
         ))
 
+    @rules.command('search', aliases=['find'], rest_is_raw=True)
+    async def search_rules(self, ctx, *, query: str):
+        """Search the rules for one or more words."""
+        query = query.strip()
+        if not query:
+            await invoke_command_help(ctx)
+            return
+        game = nomic.Game(ctx)
+        await utils.discord.Paginator(utils.discord.PageSource(
+            game.search_rules(query),
+            lambda result: f"**[{result[0].section_title}]({result[0].discord_link})** \N{EN DASH} {result[1]}",
+            title=f"Rules matching {query!r}",
+            per_page=8,
+            empty="No matching rules",
+        )).start(ctx)
+
     @rules.command('refresh', aliases=['rf'])
     async def refresh_rule(self, ctx, *rules: RuleConverterAllowRoot):
         """Refresh one or more rule messages.
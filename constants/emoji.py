@@ -16,3 +16,6 @@ REVEAL = '\N{EYE}'
 
 SUCCESS = '\N{THUMBS UP SIGN}'
 FAILURE = '\N{THUMBS DOWN SIGN}'
+
+PAGE_PREVIOUS = '\N{BLACK LEFT-POINTING TRIANGLE}'
+PAGE_NEXT = '\N{BLACK RIGHT-POINTING TRIANGLE}'
@@ -7,10 +7,22 @@ DAEMON = CONFIG.get('daemon', False)
 DEV = CONFIG.get('dev', False)
 TOKEN = CONFIG.get('token')
 COMMAND_PREFIX = CONFIG.get('prefix', '!')
+# Base URL of the Discord REST API (e.g. a local stand-in for benchmarking)
+DISCORD_API_BASE = CONFIG.get('discord_api_base')
+# Port on localhost to serve Prometheus metrics on, or None to disable them
+METRICS_PORT = CONFIG.get('metrics_port')
+# Log event loop callbacks that take longer than this many milliseconds, or 0
+# to disable
+SLOW_CALLBACK_MS = CONFIG.get('slow_callback_ms', 250)
 
 GITHUB_EMAIL = CONFIG.get('github_email')
 GITHUB_REPO = CONFIG.get('github_repo')
 GITHUB_REPO_LINK = f'https://github.com/{GITHUB_REPO}'
+# Remote for game data; any URL or path that git accepts (e.g. a local bare
+# repository for testing)
+GIT_REMOTE = CONFIG.get('git_remote') or f'git@github.com:{GITHUB_REPO}'
+# Whether to check that SSH can authenticate to GitHub before setting up games
+CHECK_SSH = CONFIG.get('check_ssh', True)
 
 NAME = "Quobot"
 with open('VERSION') as f:
@@ -1,17 +1,124 @@
 import json
+import math
+import re
 from os import makedirs, path, remove, rename
 from tempfile import mkstemp
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
+import functools
 
-from utils import l
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from utils import fileio, l, metrics
 
 
 DATA_DIR = path.join(path.dirname(path.realpath(__file__)), 'data')
 
+# Characters that the standard library escapes with ensure_ascii=True but
+# orjson writes as-is
+_NON_ASCII = re.compile('[^\x00-\x7e]')
+# Floats that orjson and the standard library format differently: anything
+# with an exponent, and small numbers that the standard library writes with
+# an exponent but orjson does not. (This may also match inside strings, in
+# which case the standard library is used needlessly but harmlessly.) orjson
+# writes exponents as e.g. "1e16" or "1e-7", so search for that and then
+# check whether it is part of a number, which is much faster than searching
+# for every digit.
+_EXPONENT = re.compile(rb'e-?[0-9]')
+_NUMBER_CHARS = frozenset(b'0123456789.-')
+
+# Map the paths of files that are being saved in the background to their new
+# contents, so that loading them in the meantime gets the new data
+_unsaved: Dict[str, str] = {}
+
+
+def _escape_non_ascii(match) -> str:
+    c = ord(match.group())
+    if c > 0xffff:
+        c -= 0x10000
+        return '\\u{:04x}\\u{:04x}'.format(0xd800 | (c >> 10), 0xdc00 | (c & 0x3ff))
+    return '\\u{:04x}'.format(c)
+
+
+def _has_ambiguous_float(s: bytes) -> bool:
+    if b'0.0000' in s:
+        return True
+    for match in _EXPONENT.finditer(s):
+        i = start = match.start()
+        while i > 0 and s[i - 1] in _NUMBER_CHARS:
+            i -= 1
+        # Numbers in orjson's output are either the whole output or follow a
+        # space (after a colon or indentation).
+        if i < start and (i == 0 or s[i - 1:i] == b' '):
+            return True
+    return False
+
+
+def _has_non_finite_float(data) -> bool:
+    # Compare exact types (as orjson does) rather than using isinstance(),
+    # which is noticeably slower over a large game's data.
+    t = type(data)
+    if t is dict:
+        data = data.values()
+    elif t is not list and t is not tuple:
+        return t is float and not math.isfinite(data)
+    for value in data:
+        t = type(value)
+        if t is float:
+            if not math.isfinite(value):
+                return True
+        elif (t is dict or t is list or t is tuple) and _has_non_finite_float(value):
+            return True
+    return False
+
+
+def _orjson_dumps(data) -> Optional[str]:
+    """Serialize data with orjson in the same format as
+    `json.dumps(data, indent='\\t')`, or return None if that isn't possible.
+    """
+    try:
+        s = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # e.g. integers too big for orjson
+        return None
+    if _has_ambiguous_float(s):
+        return None
+    # orjson writes NaN and infinities as null, where the standard library
+    # writes NaN and Infinity.
+    if b'null' in s and _has_non_finite_float(data):
+        return None
+    # orjson always indents with two spaces per level. JSON strings can't
+    # contain literal newlines, so every newline is followed by indentation;
+    # convert it to tabs starting from the deepest level.
+    depth = 1
+    while b'\n' + b'  ' * depth in s:
+        depth += 1
+    for d in range(depth - 1, 0, -1):
+        s = s.replace(b'\n' + b'  ' * d, b'\n' + b'\t' * d)
+    s = s.decode('utf-8')
+    if not s.isascii() or '\x7f' in s:
+        s = _NON_ASCII.sub(_escape_non_ascii, s)
+    return s
+
+
+def dumps(data) -> str:
+    """Serialize data to the canonical on-disk JSON format (tab-indented,
+    ASCII-only), using orjson if it is available.
+    """
+    if orjson is not None:
+        s = _orjson_dumps(data)
+        if s is not None:
+            return s
+    return json.dumps(data, indent='\t')
+
 
 def load_data(filename: str) -> dict:
     fullpath = path.join(DATA_DIR, filename)
+    if fullpath in _unsaved:
+        return json.loads(_unsaved[fullpath])
     try:
         with open(fullpath, 'r', encoding='utf-8') as f:
             data = json.load(f)
@@ -30,16 +137,44 @@ def load_data(filename: str) -> dict:
 
 
 def save_data(filename: str, data: dict) -> None:
+    """Serialize data and write it to a file in the background (see
+    utils.fileio).
+    """
+    fullpath = path.join(DATA_DIR, filename)
+    # Serialize now, since the data may change before it is written. (This
+    # would hold the GIL anyway, so there's little to gain from doing it in
+    # another thread.)
+    try:
+        s = dumps(data)
+    except Exception:
+        l.warning(f"Error saving {path.relpath(filename)!r}")
+        return
+    future = fileio.submit(fullpath, _write_data, filename, fullpath, s, coalesce=True)
+    if future is not None:
+        _unsaved[fullpath] = s
+        future.add_done_callback(functools.partial(_forget_unsaved, fullpath))
+
+
+def _forget_unsaved(fullpath: str, future) -> None:
+    if not future.cancelled() and future.exception() is None and _unsaved.get(fullpath) is future.result():
+        del _unsaved[fullpath]
+
+
+def _write_data(filename: str, fullpath: str, s: str) -> str:
     # Use a temporary file so that the original one doesn't get corrupted in the
     # case of an error.
-    fullpath = path.join(DATA_DIR, filename)
     try:
         if not path.isdir(path.dirname(fullpath)):
             makedirs(path.dirname(fullpath))
-        tempfile, tempfile_path = mkstemp(dir=DATA_DIR)
+        # Create the temporary file in the same directory so that it can be
+        # renamed over the original.
+        tempfile, tempfile_path = mkstemp(dir=path.dirname(fullpath))
         with open(tempfile, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent='\t')
-        rename(tempfile_path, path.join(DATA_DIR, filename))
+            f.write(s)
+        rename(tempfile_path, fullpath)
+        # dumps() escapes non-ASCII characters, so this is also the number of
+        # bytes.
+        metrics.SAVE_BYTES.inc(len(s))
         l.info(f"Saved data file {path.relpath(filename)!r}")
     except Exception:
         l.warning(f"Error saving {path.relpath(filename)!r}")
@@ -48,6 +183,7 @@ def save_data(filename: str, data: dict) -> None:
             remove(tempfile_path)
         except Exception:
             pass
+    return s
 
 
 class DB(dict):
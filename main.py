@@ -27,6 +27,10 @@ else:
 logging.getLogger('discord').setLevel(LOG_LEVEL_API)
 l.setLevel(LOG_LEVEL_BOT)
 
+if info.DISCORD_API_BASE:
+    # The gateway URL is fetched from the REST API, so this redirects both.
+    discord.http.Route.BASE = info.DISCORD_API_BASE
+
 
 class Bot(commands.Bot):
     def __init__(self, **kwargs):
@@ -39,6 +43,10 @@ class Bot(commands.Bot):
         )
         self.app_info = None
         self.cogs_loaded = set()
+        self.metrics_runner = None
+        utils.perf.instrument_http(self.http)
+        if info.SLOW_CALLBACK_MS:
+            utils.profiling.watch_loop(info.SLOW_CALLBACK_MS / 1000)
 
     async def ready_status(self):
         await self.change_presence(
@@ -58,8 +66,16 @@ class Bot(commands.Bot):
         l.info(f"Owner:        {self.app_info.owner}")
         l.info(LOG_SEP)
         await self.load_all_extensions()
+        if info.METRICS_PORT and self.metrics_runner is None:
+            self.metrics_runner = await utils.metrics.start(info.METRICS_PORT)
         await self.ready_status()
 
+    async def close(self):
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await utils.fileio.flush()
+        await super().close()
+
     async def on_resumed(self):
         l.info("Resumed session.")
         await self.ready_status()
@@ -115,6 +131,22 @@ class Bot(commands.Bot):
         else:
             await self.process_commands(message)
 
+    async def invoke(self, ctx):
+        if ctx.command is None:
+            await super().invoke(ctx)
+        else:
+            # Only commands that start while a profile is being recorded count
+            # towards it.
+            profile = utils.profiling.current
+            with utils.perf.command(ctx.command.qualified_name) as invocation:
+                try:
+                    await super().invoke(ctx)
+                finally:
+                    # Record time under the subcommand that actually ran.
+                    invocation.name = ctx.command.qualified_name
+                    if profile is not None:
+                        profile.command_finished()
+
     async def on_command_error(self, exc, *args, **kwargs):
         await utils.error_handling.on_command_error(exc, *args, **kwargs)
 
@@ -1,7 +1,9 @@
 # flake8: noqa
+from .base import ConflictError
 from .game import Game
 from .gameflags import GameFlags
 from .playerdict import PlayerDict
 from .proposal import Proposal, ProposalStatus, VOTE_ALIASES, VOTE_TYPES
 from .quantity import Quantity
 from .rule import Rule
+from . import lock, resolution
@@ -0,0 +1,133 @@
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .votetable import VoteTable
+
+
+class VoteAnalytics:
+    """Statistics computed from a player x proposal vote matrix.
+
+    If NumPy is available, the vote matrix is a NumPy array and pairwise
+    agreement is computed with matrix products; otherwise it is a list of
+    `array.array` rows and agreement is accumulated proposal by proposal.
+
+    Do not instantiate this class directly; use ProposalManager.vote_analytics
+    instead.
+
+    Attributes:
+    - matrix -- vote matrix with a row for each player and a column for each
+      proposal; entries are 1 (for), -1 (against), or 0 (abstain or no vote)
+    - player_ids -- sorted list of IDs of every player who has voted
+    - proposal_numbers -- sorted list of numbers of every proposal
+    - agreements -- dict mapping pairs of player IDs (lowest first) to a tuple
+      (agreed, shared), where `shared` is the number of proposals on which both
+      players voted for or against and `agreed` is the number of those on which
+      they voted the same way
+    - pass_rates -- dict mapping author IDs to a tuple (passed, closed)
+    - turnouts -- dict mapping proposal numbers to the fraction of players who
+      voted on that proposal
+    - time_to_pass -- list of durations (in seconds) between submission and
+      passing, for proposals whose pass time is known
+    """
+
+    def __init__(self, proposals: list, vote_table: VoteTable):
+        self.player_ids = sorted(vote_table.player_id_set)
+        self.proposal_numbers = sorted(p.n for p in proposals)
+        player_index = {player_id: i for i, player_id in enumerate(self.player_ids)}
+        proposal_index = {n: j for j, n in enumerate(self.proposal_numbers)}
+
+        # Build the vote matrix in a single pass over the vote table. Entries
+        # are +1 (for), -1 (against), or 0 (abstain or no vote); a separate
+        # matrix records whether each player voted at all.
+        rows, cols = len(self.player_ids), len(self.proposal_numbers)
+        if numpy is not None:
+            signs = numpy.zeros((rows, cols), dtype=numpy.int8)
+            voted = numpy.zeros((rows, cols), dtype=numpy.int8)
+            if len(vote_table):
+                i = numpy.fromiter((player_index[p] for p in vote_table.player_ids), dtype=numpy.intp)
+                j = numpy.fromiter((proposal_index[n] for n in vote_table.proposal_numbers), dtype=numpy.intp)
+                signs[i, j] = numpy.sign(numpy.frombuffer(vote_table.amounts, dtype=vote_table.amounts.typecode))
+                voted[i, j] = 1
+            self.agreements = self._numpy_agreements(signs)
+            turnout_counts = voted.sum(axis=0).tolist()
+        else:
+            signs = [array('b', bytes(cols)) for _ in range(rows)]
+            turnout_counts = [0] * cols
+            for n, player_id, amount in vote_table:
+                j = proposal_index[n]
+                signs[player_index[player_id]][j] = (amount > 0) - (amount < 0)
+                turnout_counts[j] += 1
+            self.agreements = self._python_agreements(signs, cols)
+        self.matrix = signs
+
+        self.turnouts = {
+            n: (turnout_counts[j] / rows if rows else 0)
+            for n, j in proposal_index.items()
+        }
+
+        self.pass_rates = {}
+        self.time_to_pass = []
+        for proposal in proposals:
+            status = proposal.status.value
+            if status not in ('passed', 'failed'):
+                continue
+            author_id = proposal.author and proposal.author.id
+            passed, closed = self.pass_rates.get(author_id, (0, 0))
+            self.pass_rates[author_id] = (passed + (status == 'passed'), closed + 1)
+            if status == 'passed' and proposal.closed_timestamp is not None:
+                self.time_to_pass.append(proposal.closed_timestamp - proposal.timestamp)
+
+    def _numpy_agreements(self, signs) -> Dict[Tuple[int, int], Tuple[int, int]]:
+        signs = signs.astype(numpy.int32)
+        nonzero = numpy.abs(signs)
+        shared = nonzero @ nonzero.T
+        # For each pair, (same - different) is signs @ signs.T and (same +
+        # different) is shared, so same = (shared + signs @ signs.T) / 2.
+        agreed = (shared + signs @ signs.T) // 2
+        agreements = {}
+        for a, b in zip(*numpy.triu_indices(len(self.player_ids), k=1)):
+            if shared[a, b]:
+                pair = (self.player_ids[a], self.player_ids[b])
+                agreements[pair] = (int(agreed[a, b]), int(shared[a, b]))
+        return agreements
+
+    def _python_agreements(self, signs: List[array], cols: int) -> Dict[Tuple[int, int], Tuple[int, int]]:
+        counts = {}
+        for j in range(cols):
+            column = [(i, row[j]) for i, row in enumerate(signs) if row[j]]
+            for x, (a, sign_a) in enumerate(column):
+                for b, sign_b in column[x + 1:]:
+                    agreed, shared = counts.get((a, b), (0, 0))
+                    counts[a, b] = (agreed + (sign_a == sign_b), shared + 1)
+        return {
+            (self.player_ids[a], self.player_ids[b]): value
+            for (a, b), value in counts.items()
+        }
+
+    @property
+    def average_turnout(self) -> Optional[float]:
+        if self.turnouts:
+            return sum(self.turnouts.values()) / len(self.turnouts)
+
+    @property
+    def average_time_to_pass(self) -> Optional[float]:
+        if self.time_to_pass:
+            return sum(self.time_to_pass) / len(self.time_to_pass)
+
+    def agreement_ranking(self, min_shared: int = 1) -> List[Tuple[Tuple[int, int], float, int]]:
+        """Return a list of tuples (pair, agreement_fraction, shared) for every
+        pair of players who have voted on at least `min_shared` of the same
+        proposals, from most to least agreement.
+        """
+        ranking = [
+            (pair, agreed / shared, shared)
+            for pair, (agreed, shared) in self.agreements.items()
+            if shared >= min_shared
+        ]
+        ranking.sort(key=lambda t: (-t[1], -t[2], t[0]))
+        return ranking
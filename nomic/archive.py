@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from os import makedirs, path
+from typing import Dict, Iterable, List
+import weakref
+
+from database import load_data, save_data
+from utils import fileio
+
+
+# Number of proposals in each archive segment
+SEGMENT_SIZE = 50
+
+
+def segment_of(n: int) -> int:
+    """Return the index of the segment containing proposal `n`."""
+    return (n - 1) // SEGMENT_SIZE
+
+
+def segment_range(k: int) -> range:
+    """Return the range of proposal numbers in segment `k`."""
+    return range(k * SEGMENT_SIZE + 1, (k + 1) * SEGMENT_SIZE + 1)
+
+
+class ProposalArchive:
+    """Immutable segments of closed proposals, each stored in its own file and
+    loaded only when one of its proposals is requested.
+
+    A segment is only archived (sealed) once all SEGMENT_SIZE of its proposals
+    exist and are closed. Each sealed segment is stored as a JSON file of
+    exported proposals alongside a Markdown file of its rendered proposals,
+    so that the full proposals Markdown file can be written without loading
+    any archived proposals. The message IDs of archived proposals are kept in
+    memory so that messages can be matched to proposals without loading them.
+
+    A few recently loaded segments are cached. Archived proposals may still be
+    modified (e.g. reposted); modified segments are rewritten by flush().
+
+    Do not instantiate this class directly; use ProposalManager.archive
+    instead.
+
+    Attributes:
+    - directory -- string; directory containing segment files
+    - message_ids -- dict mapping sealed segment indices to lists of message
+      IDs
+    """
+
+    CACHE_SIZE = 4
+
+    def __init__(self, game, directory: str, message_ids: Dict[int, List[int]]):
+        self.game = game
+        self.directory = directory
+        self.message_ids = message_ids
+        # Map from segment index to list of Proposal, least recently used first
+        self._loaded = OrderedDict()
+        # Map from proposal number to every archived Proposal that is still
+        # referenced anywhere, so that evicting a segment from the cache never
+        # results in two objects for the same proposal.
+        self._alive = weakref.WeakValueDictionary()
+        # Map from proposal number to the mutable state of that proposal as of
+        # when it was last written
+        self._written_state = {}
+        self._markdown = {}
+
+    def __contains__(self, k: int) -> bool:
+        return k in self.message_ids
+
+    def __iter__(self):
+        return iter(sorted(self.message_ids))
+
+    def export(self) -> dict:
+        return {str(k): self.message_ids[k] for k in self}
+
+    def _get_file(self, k: int, ext: str) -> str:
+        r = segment_range(k)
+        return path.join(self.directory, f'{r.start}-{r.stop - 1}.{ext}')
+
+    @staticmethod
+    def _state(proposal) -> tuple:
+        return (proposal.content, proposal.status, proposal.message_id)
+
+    def get_segment(self, k: int) -> list:
+        """Return a list of the Proposals in a sealed segment, loading them if
+        necessary.
+        """
+        if k in self._loaded:
+            self._loaded.move_to_end(k)
+            return self._loaded[k]
+        # Avoid a circular import.
+        from .proposal import Proposal
+        proposals = []
+        for data in load_data(self._get_file(k, 'json')).get('proposals', []):
+            proposal = self._alive.get(data['n'])
+            if proposal is None:
+                proposal = self._alive[data['n']] = Proposal(game=self.game, **data)
+                self._written_state[proposal.n] = self._state(proposal)
+            proposals.append(proposal)
+        self._loaded[k] = proposals
+        while len(self._loaded) > self.CACHE_SIZE:
+            self._loaded.popitem(last=False)
+        return proposals
+
+    def get(self, n: int):
+        """Return an archived Proposal."""
+        k = segment_of(n)
+        return self.get_segment(k)[n - segment_range(k).start]
+
+    def get_markdown(self, k: int) -> str:
+        """Return the rendered Markdown of every proposal in a sealed
+        segment.
+        """
+        if k not in self._markdown:
+            with open(self._get_file(k, 'md'), 'r', encoding='utf-8') as f:
+                self._markdown[k] = f.read()
+        return self._markdown[k]
+
+    def seal(self, k: int, proposals: Iterable) -> None:
+        """Archive a full segment of closed proposals."""
+        proposals = list(proposals)
+        for proposal in proposals:
+            self._alive[proposal.n] = proposal
+        self._write(k, proposals)
+        self._loaded[k] = proposals
+
+    def unseal(self, k: int) -> list:
+        """Remove a segment from the archive and return its proposals."""
+        proposals = self.get_segment(k)
+        del self._loaded[k]
+        del self.message_ids[k]
+        self._markdown.pop(k, None)
+        for proposal in proposals:
+            self._alive.pop(proposal.n, None)
+            self._written_state.pop(proposal.n, None)
+        # The files may still have writes queued, so remove them after those.
+        for ext in ('json', 'md'):
+            fileio.remove(self._get_file(k, ext))
+        return proposals
+
+    def flush(self) -> None:
+        """Rewrite any segments containing archived proposals that have been
+        modified since they were written.
+        """
+        modified = set(
+            segment_of(n) for n, proposal in list(self._alive.items())
+            if self._state(proposal) != self._written_state.get(n)
+        )
+        for k in sorted(modified):
+            if k in self:
+                self._write(k, self.get_segment(k))
+
+    def _write(self, k: int, proposals: list) -> None:
+        makedirs(self.directory, exist_ok=True)
+        save_data(self._get_file(k, 'json'), {'proposals': [p.export() for p in proposals]})
+        markdown = ''.join(p.markdown for p in proposals)
+        fileio.write(self._get_file(k, 'md'), markdown)
+        self._markdown[k] = markdown
+        self.message_ids[k] = [p.message_id for p in proposals]
+        for proposal in proposals:
+            self._written_state[proposal.n] = self._state(proposal)
@@ -1,12 +1,94 @@
 from discord.ext import commands
-from typing import Union
+from enum import Enum
+from typing import List, Union
 import abc
 import asyncio
 import discord
 import functools
-import threading
 
-from utils import l
+from .lock import caller_site, GameLock
+from utils import l, metrics
+
+
+class ConflictError(RuntimeError):
+    """Raised when applying a change that was based on an earlier version of a
+    game object, which has since been changed by something else.
+
+    Attributes:
+    - obj -- the game object
+    - changes -- list of strings describing what changed
+    """
+
+    def __init__(self, obj, changes: List[str]):
+        self.obj = obj
+        self.changes = changes
+        super().__init__(f"{obj} changed in the meantime ({'; '.join(changes)}), so nothing was done")
+
+
+def _describe_change(name: str, old_value, new_value) -> str:
+    if isinstance(old_value, Enum):
+        old_value, new_value = old_value.value, new_value.value
+    if isinstance(old_value, str) and (len(old_value) > 40 or '\n' in old_value):
+        return f"its {name.replace('_', ' ')} was edited"
+    return f"its {name.replace('_', ' ')} changed from {old_value} to {new_value}"
+
+
+class Versioned:
+    """Mixin for game objects with a version number, which is incremented
+    every time the object changes.
+
+    Commands that ask for confirmation before changing an object should not
+    hold the game lock while waiting. Instead, they should note the object's
+    version beforehand, and call check_version() with it once the game is
+    locked.
+
+    Subclasses must have a `version` attribute (and slot, if they use
+    `__slots__`) initialized to 0.
+    """
+
+    __slots__ = ()
+
+    def touch(self) -> None:
+        """Record that this object has changed."""
+        self.version += 1
+
+    def check_version(self, version: int, **expected) -> None:
+        """Raise ConflictError if this object has changed since `version`.
+
+        If keyword arguments are given, only changes to those attributes
+        (compared with the given values) are conflicts.
+        """
+        if self.version == version:
+            return
+        if expected:
+            changes = [
+                _describe_change(name, old_value, getattr(self, name))
+                for name, old_value in expected.items()
+                if getattr(self, name) != old_value
+            ]
+        else:
+            changes = ["it was modified"]
+        if changes:
+            raise ConflictError(self, changes)
+
+
+class GameReader:
+    """Async context manager returned by BaseGame.reading()."""
+
+    __slots__ = ('game',)
+
+    def __init__(self, game: 'BaseGame'):
+        self.game = game
+
+    async def __aenter__(self):
+        lock = self.game.lock
+        if lock.contended(shared=True) and not lock.read_by_current_task():
+            metrics.LOCK_CONTENDED.inc(guild=str(self.game.guild.id), mode='read')
+        await lock.acquire(caller_site(), shared=True)
+        return self.game
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.game.lock.release()
 
 
 @functools.total_ordering
@@ -31,8 +113,8 @@ class BaseGame(abc.ABC):
             raise TypeError(f"Can only get game from guild or guild context, not {arg!r}")
         self.__dict__ = self._games[self.guild.id] = self._games.get(self.guild.id, self.__dict__)
         # self._needs_save = False
-        if not hasattr(self, '_lock'):
-            self._lock = asyncio.Lock()
+        if not hasattr(self, 'lock'):
+            self.lock = GameLock(f"game lock for {self.guild.name}")
 
     def get_member(self, user_id: Union[int, discord.abc.User]) -> discord.Member:
         """Fetch a member of the game's guild from an ID, user, or member."""
@@ -50,8 +132,10 @@ class BaseGame(abc.ABC):
         raise RuntimeError("Use 'async with', not plain 'with'")
 
     async def __aenter__(self):
-        await self._lock.acquire()
-        self._owned_thread_id = threading.get_ident()
+        if self.lock.contended() and not self.lock.read_by_current_task():
+            metrics.LOCK_CONTENDED.inc(guild=str(self.guild.id), mode='write')
+        # The caller of __aenter__() is the `async with` statement.
+        await self.lock.acquire(caller_site())
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
@@ -61,16 +145,32 @@ class BaseGame(abc.ABC):
         #     else:
         #         await self.save()
         #         self._needs_save = False
-        self._owned_thread_id = None
-        self._lock.release()
+        self.lock.release()
 
     # def need_save(self):
     #     self.assert_locked()
     #     self._needs_save = True
 
+    def reading(self) -> 'GameReader':
+        """Return an async context manager that locks the game for reading.
+
+        Any number of tasks can read the game at once, but not while it is
+        locked for writing with `async with game`. Reads that don't await
+        anything are already atomic and don't need this; use it to get a
+        consistent view across awaits (e.g. git subprocesses), and release it
+        before sending anything to Discord.
+        """
+        return GameReader(self)
+
     def assert_locked(self):
-        if not self._owned_thread_id == threading.get_ident():
-            raise RuntimeError("Expected {self} to be locked by current thread, but it isn't")
+        if not self.lock.held_by_current_task():
+            raise RuntimeError(f"Expected the game for {self.guild.name} to be locked by the current task, but it isn't")
+
+    def spawn_locked(self, coro) -> asyncio.Task:
+        """Run a coroutine in a new task that may use the game while the current
+        task holds the lock. See GameLock.spawn().
+        """
+        return self.lock.spawn(coro)
 
     @abc.abstractmethod
     def load(self):
@@ -3,6 +3,10 @@ from .gameflags import GameFlagsManager
 from .proposal import ProposalManager
 from .quantity import QuantityManager
 from .rule import RuleManager
+from .search import SearchManager
+from .base import BaseGame
+from utils import metrics, perf
+import time
 
 
 class Game(
@@ -11,6 +15,7 @@ class Game(
     ProposalManager,
     QuantityManager,
     RuleManager,
+    SearchManager,
 ):
     """A Nomic game, including proposals, rules, etc."""
 
@@ -21,11 +26,34 @@ class Game(
         ProposalManager.load(self)
         QuantityManager.load(self)
         RuleManager.load(self)
+        SearchManager.load(self)
 
     def save(self):
         self.assert_locked()
-        ActivityTracker.save(self)
-        GameFlagsManager.save(self)
-        ProposalManager.save(self)
-        QuantityManager.save(self)
-        RuleManager.save(self)
+        with perf.timed('save'):
+            ActivityTracker.save(self)
+            GameFlagsManager.save(self)
+            ProposalManager.save(self)
+            QuantityManager.save(self)
+            RuleManager.save(self)
+            SearchManager.save(self)
+        if self.unuploaded_since is None:
+            self.unuploaded_since = time.time()
+
+
+@metrics.collector
+def _collect_metrics():
+    metrics.UPLOAD_LAG.clear()
+    metrics.GAME_SIZE.clear()
+    now = time.time()
+    for state in list(BaseGame._games.values()):
+        game = Game(state['guild'])
+        if not game.ready:
+            continue
+        guild = str(game.guild.id)
+        metrics.UPLOAD_LAG.set(now - game.unuploaded_since if game.unuploaded_since else 0, guild=guild)
+        metrics.GAME_SIZE.set(game.proposal_count, guild=guild, kind='proposals')
+        metrics.GAME_SIZE.set(sum(1 for _ in game.open_proposals), guild=guild, kind='open_proposals')
+        metrics.GAME_SIZE.set(len(game.rules) - 1, guild=guild, kind='rules')  # Excluding the root rule
+        metrics.GAME_SIZE.set(len(game.quantities), guild=guild, kind='quantities')
+        metrics.GAME_SIZE.set(len(game.player_activity), guild=guild, kind='players')
@@ -15,6 +15,10 @@ class GameFlags:
     auto_upload: bool = True
     player_activity_cutoff: int = 24
     logs_channel_id: Optional[int] = None
+    auto_resolve: bool = False
+    voting_period: int = 48
+    quorum: float = 0.5
+    majority: float = 0.5
 
     def export(self) -> dict:
         return utils.sort_dict(asdict(self))
@@ -0,0 +1,285 @@
+from bisect import bisect_right
+from os import makedirs, path, rename
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+import io
+import json
+import struct
+
+import utils
+from utils import fileio
+
+
+# Each record is (timestamp, player ID, delta, agent ID).
+RECORD = struct.Struct('<qqdq')
+
+# Maximum number of records between checkpoints. Point-in-time queries replay
+# at most this many records.
+CHECKPOINT_INTERVAL = 256
+
+
+class LedgerEntry(NamedTuple):
+    timestamp: int
+    player_id: int
+    delta: Union[int, float]
+    agent_id: int
+
+
+class Checkpoint(NamedTuple):
+    index: int
+    timestamp: int
+    default_value: Union[int, float]
+    balances: Dict[int, Union[int, float]]
+    # Map player IDs to the index of their last record before this checkpoint,
+    # or None if unknown (in checkpoints written before this was recorded)
+    last_records: Optional[Dict[int, int]] = None
+
+    def get(self, player_id: int) -> Union[int, float]:
+        return self.balances.get(player_id, self.default_value)
+
+
+def _normalize(value: Union[int, float]) -> Union[int, float]:
+    if int(value) == value:
+        return int(value)
+    return value
+
+
+def _append(filepath: str, data: bytes) -> None:
+    makedirs(path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'ab') as f:
+        f.write(data)
+
+
+def _rename(old: str, new: str) -> None:
+    if path.isfile(old):
+        makedirs(path.dirname(new), exist_ok=True)
+        rename(old, new)
+
+
+class QuantityLedger:
+    """An append-only, binary-packed history of changes to one quantity.
+
+    Records are fixed-size and sorted by timestamp, so the record file can be
+    binary searched in place. A snapshot of every player's balance is appended
+    to a separate checkpoint file at most every CHECKPOINT_INTERVAL records, so
+    a point-in-time query seeks to the nearest checkpoint and replays only the
+    records after it. Each checkpoint also records the index of every player's
+    last record before it, so a player's history can skip straight to the
+    checkpoint intervals that contain their records.
+
+    File I/O runs in the utils.fileio thread pool. Every operation on the
+    ledgers in one directory (including renames) is queued on the directory,
+    so they run in order, and the number of records and the checkpoints are
+    kept in memory so that they include appends that haven't been written
+    yet.
+
+    Do not instantiate this class directly; use QuantityManager.get_ledger()
+    instead.
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._length = None
+        self._checkpoints = None
+        self._checkpoint_indices = None
+        # Map player IDs to the index of their last record
+        self._last_records = None
+
+    @property
+    def checkpoint_filepath(self) -> str:
+        return self.filepath + '.checkpoints'
+
+    @property
+    def _queue(self) -> str:
+        # See the class docstring.
+        return path.dirname(self.filepath)
+
+    @property
+    def exists(self) -> bool:
+        return bool(self.checkpoints)
+
+    def __len__(self) -> int:
+        if self._length is None:
+            try:
+                self._length = path.getsize(self.filepath) // RECORD.size
+            except FileNotFoundError:
+                self._length = 0
+        return self._length
+
+    @property
+    def checkpoints(self) -> List[Checkpoint]:
+        if self._checkpoints is None:
+            self._checkpoints = []
+            self._checkpoint_indices = []
+            try:
+                with open(self.checkpoint_filepath, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        data = json.loads(line)
+                        last_records = data.get('last_records')
+                        self._checkpoints.append(Checkpoint(
+                            index=data['index'],
+                            timestamp=data['timestamp'],
+                            default_value=data['default_value'],
+                            balances={int(k): v for k, v in data['balances'].items()},
+                            last_records=last_records and {int(k): v for k, v in last_records.items()},
+                        ))
+                        self._checkpoint_indices.append(data['index'])
+            except FileNotFoundError:
+                pass
+            self._load_last_records()
+        return self._checkpoints
+
+    def _load_last_records(self) -> None:
+        # Start from the last checkpoint that knows, and replay the records
+        # after it (the whole ledger, if it predates last_records).
+        start = 0
+        self._last_records = {}
+        if self._checkpoints and self._checkpoints[-1].last_records is not None:
+            start = self._checkpoints[-1].index
+            self._last_records.update(self._checkpoints[-1].last_records)
+        if start < len(self):
+            with self._open(self.filepath) as f:
+                for i, entry in enumerate(self._read(f, start, len(self)), start):
+                    self._last_records[entry.player_id] = i
+
+    def checkpoint(self, balances: Dict[int, Union[int, float]], default_value: Union[int, float]) -> None:
+        """Record a snapshot of every player's balance after the last record."""
+        checkpoint = Checkpoint(
+            index=len(self),
+            timestamp=utils.now(),
+            default_value=default_value,
+            balances=dict(balances),
+        )
+        # Load existing checkpoints before the file includes this one.
+        checkpoints = self.checkpoints
+        checkpoint = checkpoint._replace(last_records=dict(self._last_records))
+        line = json.dumps({
+            'index': checkpoint.index,
+            'timestamp': checkpoint.timestamp,
+            'default_value': checkpoint.default_value,
+            'balances': utils.sort_dict({str(k): v for k, v in checkpoint.balances.items()}),
+            'last_records': utils.sort_dict({str(k): v for k, v in checkpoint.last_records.items()}),
+        }) + '\n'
+        fileio.submit(self._queue, _append, self.checkpoint_filepath, line.encode('utf-8'))
+        # Readers in the thread pool look up indices in checkpoints, so extend
+        # checkpoints first.
+        checkpoints.append(checkpoint)
+        self._checkpoint_indices.append(checkpoint.index)
+
+    def append(self,
+               entries: Iterable[LedgerEntry],
+               balances: Dict[int, Union[int, float]],
+               default_value: Union[int, float]) -> None:
+        """Append records, checkpointing if enough records have accumulated.
+
+        `balances` and `default_value` must reflect the state of the quantity
+        after all of the new records have been applied.
+        """
+        if not self.exists:
+            raise RuntimeError(f"Ledger {self.filepath!r} must be checkpointed before appending records")
+        entries = list(entries)
+        if not entries:
+            return
+        length = len(self)
+        fileio.submit(self._queue, _append, self.filepath, b''.join(RECORD.pack(*entry) for entry in entries))
+        for i, entry in enumerate(entries, length):
+            self._last_records[entry.player_id] = i
+        self._length = length + len(entries)
+        if len(self) - self.checkpoints[-1].index >= CHECKPOINT_INTERVAL:
+            self.checkpoint(balances, default_value)
+
+    def rename(self, new_filepath: str) -> None:
+        # Load the number of records and the checkpoints from the old files.
+        len(self)
+        self.checkpoints
+        for old, new in ((self.filepath, new_filepath),
+                         (self.checkpoint_filepath, new_filepath + '.checkpoints')):
+            fileio.submit(self._queue, _rename, old, new)
+        self.filepath = new_filepath
+
+    @staticmethod
+    def _open(filepath: str):
+        try:
+            return open(filepath, 'rb')
+        except FileNotFoundError:
+            return io.BytesIO()
+
+    def _read(self, f, start: int, stop: int) -> List[LedgerEntry]:
+        f.seek(start * RECORD.size)
+        data = f.read((stop - start) * RECORD.size)
+        return [LedgerEntry(timestamp, player_id, _normalize(delta), agent_id)
+                for timestamp, player_id, delta, agent_id in RECORD.iter_unpack(data)]
+
+    def _count_until(self, f, timestamp: int, length: int) -> int:
+        """Return the number of records at or before `timestamp`, out of the
+        first `length`.
+        """
+        lo, hi = 0, length
+        while lo < hi:
+            mid = (lo + hi) // 2
+            f.seek(mid * RECORD.size)
+            record_timestamp, = struct.unpack('<q', f.read(8))
+            if record_timestamp <= timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _balance_at_index(self, f, player_id: int, index: int) -> Union[int, float]:
+        checkpoints = self.checkpoints
+        checkpoint = checkpoints[bisect_right(self._checkpoint_indices, index) - 1]
+        balance = checkpoint.get(player_id)
+        for entry in self._read(f, checkpoint.index, index):
+            if entry.player_id == player_id:
+                balance += entry.delta
+        return _normalize(balance)
+
+    async def balance_at(self, player_id: int, timestamp: int) -> Optional[Union[int, float]]:
+        """Return a player's balance at a point in time, or None if the ledger
+        does not go back that far.
+        """
+        if not self.exists or timestamp < self.checkpoints[0].timestamp:
+            return None
+        return await fileio.run(self._queue, self._balance_at, self.filepath, player_id, timestamp, len(self))
+
+    def _balance_at(self, filepath: str, player_id: int, timestamp: int, length: int) -> Union[int, float]:
+        with self._open(filepath) as f:
+            return self._balance_at_index(f, player_id, self._count_until(f, timestamp, length))
+
+    async def history(self,
+                      player_id: int,
+                      *,
+                      until: Optional[int] = None,
+                      limit: int = 10) -> List[Tuple[LedgerEntry, Union[int, float]]]:
+        """Return up to `limit` of a player's most recent records at or before
+        `until` as a list of tuples (entry, new_balance), oldest first.
+        """
+        if not self.exists:
+            return []
+        return await fileio.run(self._queue, self._history, self.filepath, player_id, until, limit, len(self))
+
+    def _history(self,
+                 filepath: str,
+                 player_id: int,
+                 until: Optional[int],
+                 limit: int,
+                 length: int) -> List[Tuple[LedgerEntry, Union[int, float]]]:
+        results = []
+        with self._open(filepath) as f:
+            stop = length if until is None else self._count_until(f, until, length)
+            balance = self._balance_at_index(f, player_id, stop)
+            # Scan backwards through the checkpoint interval containing each of
+            # the player's records, skipping intervals without any.
+            while stop > 0 and len(results) < limit:
+                i = bisect_right(self._checkpoint_indices, stop - 1) - 1
+                checkpoint = self.checkpoints[i]
+                for entry in reversed(self._read(f, checkpoint.index, stop)):
+                    if entry.player_id == player_id:
+                        results.append((entry, balance))
+                        balance = _normalize(balance - entry.delta)
+                        if len(results) >= limit:
+                            break
+                if checkpoint.last_records is None:
+                    stop = checkpoint.index
+                else:
+                    stop = checkpoint.last_records.get(player_id, -1) + 1
+        return results[::-1]
@@ -0,0 +1,232 @@
+from collections import deque
+from os import path
+from typing import Dict, List, Optional, Set
+import asyncio
+import sys
+import time
+import weakref
+
+from utils import l, perf
+
+
+# Warn when a lock is held or waited for longer than this many seconds.
+LONG_HOLD = 1.0
+LONG_WAIT = 5.0
+
+# Map acquisition sites to the time for which locks acquired there were held
+hold_times: Dict[str, perf.Histogram] = {}
+
+# Every GameLock that currently exists
+_locks: Set['GameLock'] = weakref.WeakSet()
+
+
+def caller_site(depth: int = 1) -> str:
+    """Return a description of the source location `depth` frames above the
+    caller, such as 'cogs/proposals.py:120 in submit'.
+    """
+    frame = sys._getframe(depth + 1)
+    filename = frame.f_code.co_filename
+    try:
+        filename = path.relpath(filename)
+    except ValueError:  # Different drive on Windows
+        pass
+    return f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+
+
+def held_locks() -> List['GameLock']:
+    """Return a list of every GameLock that is currently held."""
+    return [lock for lock in _locks if lock.locked()]
+
+
+def reset() -> None:
+    """Forget all hold times."""
+    hold_times.clear()
+
+
+class Hold:
+    """One task's hold on a GameLock, or its place in the queue for one.
+
+    Attributes:
+    - task -- asyncio.Task
+    - site -- where the lock was acquired (see caller_site())
+    - shared -- bool; whether this is a read (shared) or write (exclusive) hold
+    - acquired_at -- time.perf_counter() value when the lock was acquired
+    """
+
+    __slots__ = ('task', 'site', 'shared', 'acquired_at', 'future', 'sections')
+
+    def __init__(self, task: asyncio.Task, site: str, shared: bool):
+        self.task = task
+        self.site = site
+        self.shared = shared
+        self.acquired_at = 0.0
+        self.future: Optional[asyncio.Future] = None
+        # perf.task_sections() when the lock was acquired
+        self.sections = None
+
+
+class GameLock:
+    """A reader/writer lock that records which tasks hold it, where they
+    acquired it, and how long it was waited for and held.
+
+    Any number of tasks can hold the lock for reading at once, or one task can
+    hold it for writing. Writers take priority: once a writer is waiting, new
+    readers wait until every waiting writer has had its turn.
+
+    Attributes:
+    - name -- str, used in log messages
+    - writer -- the Hold of the task holding the lock for writing, or None
+    - readers -- dictionary mapping tasks to their Holds for reading
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.writer: Optional[Hold] = None
+        self.readers: Dict[asyncio.Task, Hold] = {}
+        self._waiters = deque()
+        # Tasks that share ownership with the writer (see spawn())
+        self._helpers = weakref.WeakSet()
+        _locks.add(self)
+
+    def __repr__(self):
+        if self.writer:
+            state = f"held by {self.writer.site}"
+        elif self.readers:
+            state = f"read by {len(self.readers)}"
+        else:
+            state = "unlocked"
+        return f'<{self.__class__.__name__} {self.name!r} {state}>'
+
+    def holds(self) -> List[Hold]:
+        """Return a list of the current Holds on this lock."""
+        return ([self.writer] if self.writer else []) + list(self.readers.values())
+
+    def locked(self) -> bool:
+        """Return whether any task holds the lock, for reading or writing."""
+        return self.writer is not None or bool(self.readers)
+
+    def contended(self, shared: bool = False) -> bool:
+        """Return whether acquiring the lock now would have to wait."""
+        return bool(self._waiters) or not self._available(shared)
+
+    def held_by_current_task(self) -> bool:
+        """Return whether the current task holds the lock for writing (or is
+        helping a task that does; see spawn()).
+        """
+        task = perf.current_task()
+        return task is not None and self.writer is not None and (task is self.writer.task or task in self._helpers)
+
+    def read_by_current_task(self) -> bool:
+        """Return whether the current task holds the lock for reading or
+        writing.
+        """
+        return perf.current_task() in self.readers or self.held_by_current_task()
+
+    def _available(self, shared: bool) -> bool:
+        if shared:
+            return self.writer is None and not any(not h.shared for h in self._waiters)
+        return self.writer is None and not self.readers
+
+    def _grant(self, hold: Hold) -> None:
+        hold.acquired_at = time.perf_counter()
+        if hold.shared:
+            self.readers[hold.task] = hold
+        else:
+            self.writer = hold
+
+    def _wake(self) -> None:
+        """Grant the lock to waiting tasks, if possible: the first waiting
+        writer, or else every waiting reader.
+        """
+        if self.writer is not None:
+            return
+        # Drop tasks that were cancelled while waiting, but haven't resumed to
+        # remove themselves yet.
+        if any(h.future.done() for h in self._waiters):
+            self._waiters = deque(h for h in self._waiters if not h.future.done())
+        writers = [h for h in self._waiters if not h.shared]
+        if writers:
+            if not self.readers:
+                self._waiters.remove(writers[0])
+                self._grant(writers[0])
+                writers[0].future.set_result(None)
+        else:
+            while self._waiters:
+                hold = self._waiters.popleft()
+                self._grant(hold)
+                hold.future.set_result(None)
+
+    async def acquire(self, site: str, *, shared: bool = False) -> None:
+        """Acquire the lock for reading (if `shared` is True) or writing,
+        recording `site` as the place where it was acquired.
+        """
+        if self.read_by_current_task():
+            holder = self.writer if self.held_by_current_task() else self.readers[perf.current_task()]
+            raise RuntimeError(f"{self.name} is already held by the current task (acquired at {holder.site}); this would deadlock")
+        hold = Hold(perf.current_task(), site, shared)
+        start = time.perf_counter()
+        if not self._waiters and self._available(shared):
+            self._grant(hold)
+        else:
+            hold.future = asyncio.get_event_loop().create_future()
+            self._waiters.append(hold)
+            try:
+                with perf.timed('lock wait'):
+                    await hold.future
+            except asyncio.CancelledError:
+                if hold.future.done() and not hold.future.cancelled():
+                    # The lock was granted just before cancellation.
+                    self._release(hold)
+                else:
+                    if hold in self._waiters:
+                        self._waiters.remove(hold)
+                    self._wake()
+                raise
+            waited = hold.acquired_at - start
+            if waited > LONG_WAIT:
+                l.warning(f"Waited {waited:.2f}s for {self.name} at {site}")
+        hold.sections = perf.task_sections()
+
+    def release(self) -> None:
+        """Release the current task's hold on the lock."""
+        task = perf.current_task()
+        if self.writer is not None and task is self.writer.task:
+            self._release(self.writer)
+        elif task in self.readers:
+            self._release(self.readers[task])
+        else:
+            raise RuntimeError(f"{self.name} is not held by the current task")
+
+    def _release(self, hold: Hold) -> None:
+        held = time.perf_counter() - hold.acquired_at
+        perf.record('lock read' if hold.shared else 'lock hold', held)
+        if hold.site not in hold_times:
+            hold_times[hold.site] = perf.Histogram()
+        hold_times[hold.site].add(held)
+        if held > LONG_HOLD and hold.sections is not None:
+            sections = perf.task_sections() - hold.sections
+            del sections['lock hold']
+            del sections['lock read']
+            breakdown = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in sections.most_common())
+            mode = "read" if hold.shared else "held"
+            l.warning(f"{self.name} was {mode} for {held:.2f}s at {hold.site}" + (f" ({breakdown})" if breakdown else ""))
+        if hold.shared:
+            del self.readers[hold.task]
+        else:
+            self.writer = None
+            self._helpers.clear()
+        self._wake()
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Run a coroutine in a new task that shares ownership of this lock with
+        the current task (e.g. to protect it from cancellation with
+        asyncio.shield()).
+
+        The lock must be held for writing by the current task, and the new task
+        must finish before the lock is released.
+        """
+        if not self.held_by_current_task():
+            raise RuntimeError(f"Expected {self.name} to be held by the current task, but it isn't")
+        task = asyncio.ensure_future(coro)
+        self._helpers.add(task)
+        return task
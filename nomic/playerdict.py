@@ -1,11 +1,24 @@
+from collections.abc import MutableMapping
+from typing import Iterator, Tuple
 import discord
 
-from utils import l
 import utils
 
 
-class PlayerDict(dict):
-    """A dict subclass for managing a dictionary of Discord members."""
+class PlayerDict(MutableMapping):
+    """A mapping from Discord members to values, stored by user ID.
+
+    Keys may be given as discord.Members, other discord.abc.Users, or user IDs
+    (as integers or strings); lookups only need the ID, so they never resolve
+    members. Members are resolved only when iterating, and are not cached, so
+    a user who leaves and rejoins the guild resolves to their current member.
+
+    Values for users who are not currently members of the guild (e.g. because
+    they have left) are kept, exported, and counted by `in` and len(), but
+    skipped when iterating; use ids() or id_items() to include them.
+    """
+
+    __slots__ = ('_member_getter', '_values')
 
     def __init__(self, member_getter, member_values=None):
         """Instantiate a PlayerDict.
@@ -18,44 +31,87 @@ class PlayerDict(dict):
         - member_values -- dict mapping discord.abc.Users or user IDs to any
           other value
         """
-        self.get_member = member_getter.get_member
-        if not member_values:
-            member_values = {}
-        for k, v in member_values.items():
-            self[k] = v
-
-    def _to_member(self, m):
-        if isinstance(m, discord.Member):
-            return m
-        if isinstance(m, discord.abc.User):
-            return self.get_member(m.id)
+        # Keep a reference to the getter rather than a bound method, which
+        # would be a separate object for every PlayerDict.
+        self._member_getter = member_getter
+        self._values = {}
+        if member_values:
+            for k, v in member_values.items():
+                self[k] = v
+
+    @staticmethod
+    def _to_id(key) -> int:
+        if isinstance(key, int):
+            return key
+        user_id = getattr(key, 'id', None)
+        if isinstance(user_id, int):
+            return user_id
         try:
-            return self.get_member(int(m))
-        except TypeError:
+            return int(key)
+        except (TypeError, ValueError):
             pass
-        raise TypeError(f"{self.__class__.__name__} can only contain Member objects as keys, not {type(m)}: {m!r}")
+        raise TypeError(f"{PlayerDict.__name__} can only contain users or user IDs as keys, not {type(key)}: {key!r}")
+
+    def _to_member(self, user_id: int):
+        return self._member_getter.get_member(user_id)
 
     def __setitem__(self, key, value):
-        key = self._to_member(key)
-        if key:
-            return super().__setitem__(key, value)
-        else:
-            l.warn(f"PlayerDict is unable to convert {key!r} to member; ignoring key-value pair {(key, value)!r}")
+        self._values[self._to_id(key)] = value
 
     def __getitem__(self, key):
-        return super().__getitem__(self._to_member(key))
+        return self._values[self._to_id(key)]
 
     def __delitem__(self, key):
-        return super().__delitem__(self._to_member(key))
+        del self._values[self._to_id(key)]
 
     def __contains__(self, key):
         try:
-            return super().__contains__(self._to_member(key))
+            return self._to_id(key) in self._values
         except TypeError:
             return False
 
+    def get(self, key, default=None):
+        try:
+            return self._values.get(self._to_id(key), default)
+        except TypeError:
+            return default
+
+    def __iter__(self) -> Iterator[discord.Member]:
+        for user_id in list(self._values):
+            member = self._to_member(user_id)
+            if member is not None:
+                yield member
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def items(self) -> Iterator[Tuple[discord.Member, object]]:
+        for user_id, value in list(self._values.items()):
+            member = self._to_member(user_id)
+            if member is not None:
+                yield member, value
+
+    def values(self) -> Iterator[object]:
+        for _, value in self.items():
+            yield value
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._values!r})"
+
+    def ids(self) -> Iterator[int]:
+        """Iterate over the user IDs of every key, including users who are
+        not currently members.
+        """
+        return iter(self._values)
+
+    def id_items(self) -> Iterator[Tuple[int, object]]:
+        """Iterate over tuples (user_id, value), including users who are not
+        currently members.
+        """
+        return iter(self._values.items())
+
     def export(self):
-        return utils.sort_dict({str(m.id): v for m, v in self.sorted_items()})
+        return {str(user_id): self._values[user_id] for user_id in sorted(self._values)}
 
     def sorted_keys(self):
         return utils.discord.sort_users(self.keys())
@@ -2,13 +2,21 @@ from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Optional, Set
+from os import path
+from typing import Iterator, Optional, Set, Tuple
 import discord
 import functools
+import math
 
+from .analytics import VoteAnalytics
+from .archive import ProposalArchive, segment_of, segment_range
+from .base import ConflictError, Versioned
 from .gameflags import GameFlagsManager
 from .playerdict import PlayerDict
+from .rendercache import RenderCache
 from .repoman import GameRepoManager
+from .resolution import scheduler
+from .votetable import VoteTable
 from constants import colors, emoji, info, strings
 import utils
 
@@ -35,6 +43,7 @@ VOTE_ALIASES = {
 VOTE_TYPES = ('for', 'against', 'abstain')
 
 
+@utils.slotted
 @dataclass
 class _Proposal:
     game: 'ProposalManager' and GameFlagsManager
@@ -45,10 +54,12 @@ class _Proposal:
     message_id: Optional[int] = None
     votes: PlayerDict = None
     timestamp: int = None
+    closed_timestamp: Optional[int] = None
+    reopened_timestamp: Optional[int] = None
 
 
 @functools.total_ordering
-class Proposal(_Proposal):
+class Proposal(_Proposal, Versioned):
     """A dataclass representing a Nomic proposal.
 
     Attributes:
@@ -64,8 +75,17 @@ class Proposal(_Proposal):
     - votes (default {}) -- PlayerDict of ints; positive numbers are votes
       for, negative numbers are votes against, and zero is an abstention
     - timestamp (default now)
+    - closed_timestamp (default None) -- when the proposal was last passed,
+      failed, or deleted
+    - reopened_timestamp (default None) -- when the proposal was last
+      reopened for voting
+
+    Other attributes:
+    - version -- int (see nomic.base.Versioned)
     """
 
+    __slots__ = ('version', '_votes_for', '_votes_against', '_votes_abstain', '_votes_version', '_render_cache', '__weakref__')
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if not isinstance(self.author, discord.Member):
@@ -76,9 +96,28 @@ class Proposal(_Proposal):
         self.status = ProposalStatus(self.status)
         if self.timestamp is None:
             self.timestamp = utils.now()
+        self._votes_for = self._votes_against = self._votes_abstain = 0
+        for _, vote_amount in self.votes.id_items():
+            self._tally(vote_amount, 1)
+        self._votes_version = 0
+        self.version = 0
+        self._render_cache = RenderCache()
+
+    def _tally(self, vote_amount: Optional[int], sign: int):
+        """Add a vote to (sign=1) or remove a vote from (sign=-1) the running
+        vote totals.
+        """
+        if vote_amount is None:
+            return
+        if vote_amount > 0:
+            self._votes_for += sign * vote_amount
+        elif vote_amount < 0:
+            self._votes_against -= sign * vote_amount
+        else:
+            self._votes_abstain += sign
 
     def export(self) -> dict:
-        return OrderedDict(
+        return dict(
             n=self.n,
             author=self.author and self.author.id,
             content=self.content,
@@ -86,6 +125,8 @@ class Proposal(_Proposal):
             message_id=self.message_id,
             votes=self.votes.export(),
             timestamp=self.timestamp,
+            closed_timestamp=self.closed_timestamp,
+            reopened_timestamp=self.reopened_timestamp,
         )
 
     async def set_vote(self, player: discord.Member, new_vote_amount: int):
@@ -98,9 +139,17 @@ class Proposal(_Proposal):
             return False
         if new_vote_amount and abs(new_vote_amount) > 1 and not self.game.flags.allow_vote_multi:
             new_vote_amount //= abs(new_vote_amount)
-        self.votes[player] = new_vote_amount
+        self._tally(self.votes.get(player), -1)
         if new_vote_amount is None:
-            del self.votes[player]
+            if player in self.votes:
+                del self.votes[player]
+        else:
+            self.votes[player] = new_vote_amount
+        self._tally(self.votes.get(player), 1)
+        self._votes_version += 1
+        self.touch()
+        utils.metrics.VOTES.inc(guild=str(self.game.guild.id))
+        self.game.invalidate_votes()
         await self.refresh()
         self.game.save()
         return True
@@ -146,25 +195,48 @@ class Proposal(_Proposal):
 
     @property
     def votes_for(self) -> int:
-        return sum(v for v in self.votes.values() if v > 0)
+        return self._votes_for
 
     @property
     def votes_against(self) -> int:
-        return -sum(v for v in self.votes.values() if v < 0)
+        return self._votes_against
 
     @property
     def votes_abstain(self) -> int:
-        return sum(v == 0 for v in self.votes.values())
+        return self._votes_abstain
 
     async def set_status(self, new_status: ProposalStatus):
         self.game.assert_locked()
+        if new_status == ProposalStatus.VOTING:
+            if self.status != ProposalStatus.VOTING:
+                self.reopened_timestamp = utils.now()
+            self.closed_timestamp = None
+            self.game.unarchive_proposal(self)
+        elif new_status != self.status:
+            self.closed_timestamp = utils.now()
         self.status = new_status
+        self.touch()
+        self.game.invalidate_votes()
+        if new_status == ProposalStatus.VOTING:
+            self.game.schedule_deadline(self)
         await self.refresh()
         self.game.save()
 
+    @property
+    def deadline(self) -> int:
+        """Return the timestamp at which voting on this proposal ends, if
+        proposals are resolved automatically. The voting period starts when the
+        proposal was submitted or, if it has been reopened, when it was last
+        reopened.
+        """
+        start = self.reopened_timestamp or self.timestamp
+        return start + self.game.flags.voting_period * 3600
+
     async def set_content(self, new_content: str):
         self.game.assert_locked()
         self.content = new_content
+        self.touch()
+        self.game.index_proposal(self)
         await self.refresh()
         self.game.save()
 
@@ -192,9 +264,20 @@ class Proposal(_Proposal):
     def github_link(self):
         return f'{info.GITHUB_REPO_LINK}/blob/{self.game.repo.name}/proposals.md#{self.n}'
 
+    @property
+    def _render_key(self) -> tuple:
+        return (self.n, self.content, self.status, self._votes_version, self.author, self.timestamp)
+
     @property
     def embed(self) -> discord.Embed:
-        """Return an embed displaying this proposal."""
+        """Return an embed displaying this proposal.
+
+        The embed is cached until the proposal changes, so it must not be
+        modified.
+        """
+        return self._render_cache.get('embed', self._render_key, self._render_embed)
+
+    def _render_embed(self) -> discord.Embed:
         # Make the title; e.g. "Proposal #10   --    Passed"
         title = f"Proposal #{self.n}"
         if self.status != ProposalStatus.VOTING:
@@ -215,28 +298,27 @@ class Proposal(_Proposal):
             description=self.content,
             timestamp=datetime.fromtimestamp(self.timestamp),
         )
+        # Sort the votes by type in a single pass
+        vote_lines = {vote_type: '' for vote_type in VOTE_TYPES}
+        for player, vote_amount in self.votes.items():
+            if vote_amount > 0:
+                vote_type = 'for'
+            elif vote_amount < 0:
+                vote_type = 'against'
+            else:
+                vote_type = 'abstain'
+            vote_lines[vote_type] += player.mention
+            if abs(vote_amount) > 1:
+                vote_lines[vote_type] += f" ({abs(vote_amount)}x)"
+            vote_lines[vote_type] += "\n"
         # Make an embed field for each type of vote
+        totals = {
+            'for': self.votes_for,
+            'against': self.votes_against,
+            'abstain': self.votes_abstain,
+        }
         for vote_type in VOTE_TYPES:
-            total = 0
-            value = ''
-            # Count the votes and list the users
-            for player, vote_amount in self.votes.items():
-                if vote_type == 'for':
-                    if vote_amount <= 0:
-                        continue
-                elif vote_type == 'against':
-                    if vote_amount >= 0:
-                        continue
-                    vote_amount *= -1
-                elif vote_type == 'abstain':
-                    if vote_amount != 0:
-                        continue
-                    vote_amount = 1
-                value += player.mention
-                if vote_amount > 1:
-                    value += f" ({vote_amount}x)"
-                value += "\n"
-                total += vote_amount
+            total = totals[vote_type]
             name = vote_type.capitalize()
             if total:
                 name += f" ({total})"
@@ -244,7 +326,7 @@ class Proposal(_Proposal):
                 continue
             embed.add_field(
                 name=name,
-                value=value or strings.EMPTY_LIST,
+                value=vote_lines[vote_type] or strings.EMPTY_LIST,
                 inline=True,
             )
         # Set the footer
@@ -253,6 +335,9 @@ class Proposal(_Proposal):
 
     @property
     def markdown(self):
+        return self._render_cache.get('markdown', self._render_key, self._render_markdown)
+
+    def _render_markdown(self) -> str:
         s = f"<a name='{self.n}'/>"
         s += "\n\n"
         s += f"## #{self.n}"
@@ -286,23 +371,154 @@ class ProposalManager(GameRepoManager):
         self.proposals_channel = db.get('channel')
         if self.proposals_channel:
             self.proposals_channel = self.guild.get_channel(self.proposals_channel)
-        self.proposals = []
-        if db.get('proposals'):
-            for proposal in db['proposals']:
-                self.proposals.append(Proposal(game=self, **proposal))
+        self.vote_generation = 0
+        self._vote_table = None
+        self._vote_analytics = None
+        # Only proposals in segments that have not been archived are loaded;
+        # see ProposalArchive.
+        self._live_proposals = OrderedDict()
+        for proposal in db.get('proposals') or []:
+            self._live_proposals[proposal['n']] = Proposal(game=self, **proposal)
+        self.archive = ProposalArchive(
+            self,
+            self.get_file(path.join('data', 'proposal_archive')),
+            {int(k): message_ids for k, message_ids in (db.get('archive') or {}).items()},
+        )
+        self.proposal_count = db.get('count', len(self._live_proposals))
+        self._proposal_message_ids = {}
+        for k in self.archive:
+            for n, message_id in zip(segment_range(k), self.archive.message_ids[k]):
+                self._proposal_message_ids[message_id] = n
+        for proposal in self._live_proposals.values():
+            self._proposal_message_ids[proposal.message_id] = proposal.n
+        self.schedule_all_deadlines()
 
     def save(self):
+        self.archive_closed_proposals()
+        self.archive.flush()
         db = self.get_db('proposals')
-        db.replace(OrderedDict(
+        db.replace(dict(
             channel=self.proposals_channel and self.proposals_channel.id,
-            proposals=[p.export() for p in self.proposals],
+            count=self.proposal_count,
+            proposals=[p.export() for p in self._live_proposals.values()],
+            archive=self.archive.export(),
         ))
         db.save()
-        with open(self.get_file('proposals.md'), 'w') as f:
-            f.write(f"# {self.guild.name} \N{EM DASH} Proposals")
-            f.write('\n\n')
-            for p in self.proposals:
-                f.write(p.markdown)
+        parts = [f"# {self.guild.name} \N{EM DASH} Proposals", '\n\n']
+        for k in range(segment_of(self.proposal_count) + 1):
+            if k in self.archive:
+                parts.append(self.archive.get_markdown(k))
+            else:
+                for n in segment_range(k):
+                    if n in self._live_proposals:
+                        parts.append(self._live_proposals[n].markdown)
+        utils.fileio.write(self.get_file('proposals.md'), ''.join(parts))
+
+    def archive_closed_proposals(self):
+        """Archive every full segment of proposals that are all closed."""
+        for k in range(segment_of(self.proposal_count + 1)):
+            if k in self.archive:
+                continue
+            proposals = [self._live_proposals[n] for n in segment_range(k)]
+            if all(p.status != ProposalStatus.VOTING for p in proposals):
+                self.archive.seal(k, proposals)
+                for p in proposals:
+                    del self._live_proposals[p.n]
+
+    def unarchive_proposal(self, proposal: Proposal):
+        """Move the segment containing an archived proposal back to the live
+        proposals (e.g. because it has been reopened).
+        """
+        k = segment_of(proposal.n)
+        if k in self.archive:
+            for p in self.archive.unseal(k):
+                self._live_proposals[p.n] = p
+            self._live_proposals = OrderedDict(sorted(self._live_proposals.items()))
+
+    def invalidate_votes(self):
+        """Mark vote data derived from proposals as out of date.
+
+        This must be called whenever a vote, proposal status, or the set of
+        proposals changes.
+        """
+        self.vote_generation += 1
+        self._vote_table = None
+        self._vote_analytics = None
+
+    @property
+    def vote_table(self) -> VoteTable:
+        """Return a VoteTable of every vote on every proposal."""
+        if self._vote_table is None:
+            self._vote_table = VoteTable(
+                (proposal.n, player_id, vote_amount)
+                for proposal in self.iter_proposals()
+                for player_id, vote_amount in proposal.votes.id_items()
+            )
+        return self._vote_table
+
+    def schedule_deadline(self, proposal: Proposal):
+        """Schedule a proposal to be resolved automatically at its deadline, if
+        automatic resolution is enabled. If the deadline has already passed
+        (e.g. while the bot was offline), it is resolved as soon as possible.
+        Reopening a proposal starts a new voting period (see
+        Proposal.deadline).
+        """
+        if self.flags.auto_resolve and proposal.status == ProposalStatus.VOTING:
+            # The scheduler runs past deadlines immediately. Keep the original
+            # deadline, which resolve_proposal() uses to detect stale entries.
+            scheduler.schedule(proposal.deadline, self.guild.id, proposal.n)
+
+    def schedule_all_deadlines(self):
+        """Schedule every open proposal to be resolved automatically.
+
+        This must be called whenever automatic resolution settings change.
+        """
+        for proposal in self.open_proposals:
+            self.schedule_deadline(proposal)
+
+    def evaluate_proposal(self, proposal: Proposal) -> Tuple[ProposalStatus, str]:
+        """Decide whether a proposal passes or fails according to the game's
+        quorum and majority settings.
+
+        Return a tuple (new_status, reason).
+        """
+        active_count = sum(map(self.is_active, self.player_activity))
+        quorum = math.ceil(self.flags.quorum * active_count)
+        # Count votes from players who have since left, as the tallies do.
+        voter_count = len(proposal.votes)
+        if voter_count < quorum:
+            return ProposalStatus.FAILED, f"{voter_count} of {quorum} required voters"
+        decisive_votes = proposal.votes_for + proposal.votes_against
+        if decisive_votes and proposal.votes_for / decisive_votes > self.flags.majority:
+            status = ProposalStatus.PASSED
+        else:
+            status = ProposalStatus.FAILED
+        return status, f"{proposal.votes_for} for; {proposal.votes_against} against"
+
+    async def resolve_proposal(self, proposal: Proposal, deadline: int) -> bool:
+        """Pass or fail a proposal whose deadline has passed.
+
+        Return False (and do nothing) if the proposal is no longer open or its
+        deadline has changed since it was scheduled.
+        """
+        self.assert_locked()
+        if not self.flags.auto_resolve:
+            return False
+        if proposal.status != ProposalStatus.VOTING or proposal.deadline != deadline:
+            return False
+        new_status, reason = self.evaluate_proposal(proposal)
+        await proposal.set_status(new_status)
+        await self.log_proposal_auto_resolve(proposal, reason)
+        return True
+
+    @property
+    def vote_analytics(self) -> VoteAnalytics:
+        """Return VoteAnalytics for all proposals, which is cached until the
+        next change to votes or proposals.
+        """
+        if self._vote_analytics is None:
+            self._vote_analytics = VoteAnalytics(list(self.iter_proposals()), self.vote_table)
+        return self._vote_analytics
 
     async def commit_proposals_and_log(self,
                                        agent: discord.Member,
@@ -348,7 +564,7 @@ class ProposalManager(GameRepoManager):
         May throw `TypeError`, `ValueError`, or `discord.Forbidden` exceptions.
         """
         self.assert_locked()
-        proposal_range = range(min(proposals).n, len(self.proposals) + 1)
+        proposal_range = range(min(proposals).n, self.proposal_count + 1)
         proposals = list(map(self.get_proposal, proposal_range))
         proposal_messages = []
         for proposal in proposals:
@@ -362,28 +578,78 @@ class ProposalManager(GameRepoManager):
                 color=colors.TEMPORARY,
                 title=f"Preparing proposal #{proposal.n}\N{HORIZONTAL ELLIPSIS}",
             ))
+            self._proposal_message_ids.pop(proposal.message_id, None)
             proposal.message_id = m.id
+            self._proposal_message_ids[m.id] = proposal.n
         self.save()
         await self.refresh_proposal(*proposals)
 
     def has_proposal(self, n: int) -> bool:
-        return isinstance(n, int) and 1 <= n <= len(self.proposals)
+        return isinstance(n, int) and 1 <= n <= self.proposal_count
 
     def get_proposal(self, n: int) -> Optional[Proposal]:
         if self.has_proposal(n):
-            return self.proposals[n - 1]
+            if n in self._live_proposals:
+                return self._live_proposals[n]
+            return self.archive.get(n)
+
+    def check_proposal(self, proposal: Proposal, version: Optional[int] = None, **expected):
+        """Raise ConflictError if a proposal has been permanently deleted, or if
+        it has changed since `version` (see
+        nomic.base.Versioned.check_version()).
+        """
+        if self.get_proposal(proposal.n) is not proposal:
+            raise ConflictError(proposal, ["it was removed"])
+        if version is not None:
+            proposal.check_version(version, **expected)
+
+    def get_proposal_by_message(self, message_id: int) -> Optional[Proposal]:
+        n = self._proposal_message_ids.get(message_id)
+        return n and self.get_proposal(n)
+
+    @property
+    def proposal_message_ids(self) -> Set[int]:
+        """Return the set of message IDs of every proposal."""
+        return set(self._proposal_message_ids)
+
+    def iter_proposals(self) -> Iterator[Proposal]:
+        """Iterate over every proposal in order, loading archived proposals
+        one segment at a time.
+        """
+        for k in range(segment_of(self.proposal_count) + 1):
+            if k in self.archive:
+                yield from self.archive.get_segment(k)
+            else:
+                for n in segment_range(k):
+                    if n in self._live_proposals:
+                        yield self._live_proposals[n]
+
+    @property
+    def open_proposals(self) -> Iterator[Proposal]:
+        """Iterate over every proposal that is open for voting.
+
+        Open proposals are never archived, so this does not load any archived
+        proposals.
+        """
+        for proposal in list(self._live_proposals.values()):
+            if proposal.status == ProposalStatus.VOTING:
+                yield proposal
 
     async def get_proposal_messages(self) -> Set[discord.Message]:
         messages = set()
-        for proposal in self.proposals:
+        for proposal in self.iter_proposals():
             messages.add(await proposal.fetch_message())
         return messages
 
     async def add_proposal(self, **kwargs):
         self.assert_locked()
-        n = len(self.proposals) + 1
+        n = self.proposal_count + 1
         new_proposal = Proposal(game=self, n=n, **kwargs)
-        self.proposals.append(new_proposal)
+        self._live_proposals[n] = new_proposal
+        self.proposal_count = n
+        self.index_proposal(new_proposal)
+        self.invalidate_votes()
+        self.schedule_deadline(new_proposal)
         # ProposalManager.repost_proposal() calls BaseGame.save() so we
         # don't have to do that here.
         await self.repost_proposal(new_proposal)
@@ -391,9 +657,15 @@ class ProposalManager(GameRepoManager):
 
     async def permadel_proposal(self, proposal: Proposal):
         self.assert_locked()
-        if not proposal.n == len(self.proposals):
+        if not proposal.n == self.proposal_count:
             raise RuntimeError("Cannot delete any proposal other than the last one")
-        del self.proposals[proposal.n - 1]
+        self.unarchive_proposal(proposal)
+        del self._live_proposals[proposal.n]
+        self._proposal_message_ids.pop(proposal.message_id, None)
+        self.proposal_count -= 1
+        self.proposal_index.remove(str(proposal.n))
+        proposal.touch()
+        self.invalidate_votes()
         self.save()
         await (await proposal.fetch_message()).delete()
 
@@ -422,6 +694,14 @@ class ProposalManager(GameRepoManager):
             agent, action, proposal, link_to_commit=True
         )
 
+    async def log_proposal_auto_resolve(self,
+                                        proposal: Proposal,
+                                        reason: str):
+        await self.commit_proposals_and_log(
+            self.guild.me, f"automatically {proposal.status.value}", proposal,
+            post=f" at the end of voting ({reason})", link_to_commit=True
+        )
+
     async def log_proposal_change_content(self,
                                           agent: discord.Member,
                                           proposal: Proposal):
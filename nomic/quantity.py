@@ -1,15 +1,19 @@
-from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import List, Optional, Union
+from datetime import datetime
+from os import path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 import discord
 import functools
 import re
 
+from .base import ConflictError, Versioned
+from .ledger import LedgerEntry, QuantityLedger
 from .playerdict import PlayerDict
 from .repoman import GameRepoManager
 import utils
 
 
+@utils.slotted
 @dataclass
 class _Quantity:
     game: object  # We can't access nomic.game.Game from here.
@@ -19,13 +23,22 @@ class _Quantity:
     default_value: Union[int, float] = 0
 
 
+class QuantityView(NamedTuple):
+    """The values of a quantity for some players at one version of the
+    quantity (see Quantity.view()).
+    """
+    version: int
+    values: Dict[discord.Member, Union[int, float]]
+
+
 @functools.total_ordering
-class Quantity(_Quantity):
+class Quantity(_Quantity, Versioned):
     """A dataclass representing a game quantity, such as points.
 
     Attributes:
     - game
     - name -- string
+    - version -- int (see nomic.base.Versioned)
 
     Optional attributes:
     - aliases (default []) -- list of strings
@@ -33,12 +46,15 @@ class Quantity(_Quantity):
     - default_value (default 0) -- int or float
     """
 
+    __slots__ = ('version',)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.players = PlayerDict(self.game, self.players)
+        self.version = 0
 
     def export(self) -> dict:
-        return OrderedDict(
+        return dict(
             name=self.name,
             aliases=sorted(self.aliases),
             players=self.players.export(),
@@ -62,10 +78,17 @@ class Quantity(_Quantity):
                 del self.players[player]
         else:
             self.players[player] = value
+        self.touch()
 
     def get(self, player: discord.Member):
         return self.players.get(player, self.default_value)
 
+    def view(self, players) -> QuantityView:
+        """Return the current values of this quantity for some players, to be
+        passed to transact_quantity() as `based_on`.
+        """
+        return QuantityView(self.version, {player: self.get(player) for player in players})
+
     def __str__(self):
         return f"quantity **{self.name}**"
 
@@ -86,6 +109,7 @@ class QuantityManager(GameRepoManager):
     def load(self):
         db = self.get_db('quantities')
         self.quantities = {}
+        self._ledgers = {}
         if db:
             for name, quantity in db.items():
                 self.quantities[name] = Quantity(game=self, **quantity)
@@ -113,6 +137,15 @@ class QuantityManager(GameRepoManager):
         self.save()
         return quantity
 
+    def check_quantity(self, quantity: Quantity, version: Optional[int] = None, **expected):
+        """Raise ConflictError if a quantity has been removed, or if it has
+        changed since `version` (see nomic.base.Versioned.check_version()).
+        """
+        if self.quantities.get(quantity.name) is not quantity:
+            raise ConflictError(quantity, ["it was removed or renamed"])
+        if version is not None:
+            quantity.check_version(version, **expected)
+
     def rename_quantity(self, quantity: Quantity, new_name: str):
         self.assert_locked()
         new_name = new_name.lower()
@@ -120,13 +153,25 @@ class QuantityManager(GameRepoManager):
         if new_name in quantity.aliases:
             quantity.aliases.remove(new_name)
         del self.quantities[quantity.name]
+        ledger = self.get_ledger(quantity)
+        del self._ledgers[quantity.name]
         quantity.name = new_name
+        quantity.touch()
         self.quantities[quantity.name] = quantity
+        ledger.rename(self._get_ledger_file(quantity))
+        self._ledgers[quantity.name] = ledger
         self.save()
 
     def remove_quantity(self, quantity: Quantity):
         self.assert_locked()
         del self.quantities[quantity.name]
+        # Keep the ledger, in case the quantity was removed by mistake.
+        timestamp = datetime.utcfromtimestamp(utils.now()).strftime('%Y%m%d-%H%M%S')
+        self.get_ledger(quantity).rename(
+            self.get_file(path.join('data', 'ledgers', 'removed', f'{quantity.name}-{timestamp}.ledger'))
+        )
+        del self._ledgers[quantity.name]
+        quantity.touch()
         self.save()
 
     def set_quantity_aliases(self, quantity: Quantity, new_aliases: List[str]):
@@ -134,14 +179,76 @@ class QuantityManager(GameRepoManager):
         for name in new_aliases:
             self._check_quantity_name(name, ignore=quantity)
         quantity.aliases = sorted(new_aliases)
+        quantity.touch()
         self.save()
 
     def set_quantity_default(self, quantity: Quantity, new_default: float):
         self.assert_locked()
         quantity.default_value = new_default
+        quantity.touch()
         for player, value in quantity.players.sorted_items():
             quantity.set(player, value)
+        # Players with the default value have implicitly changed balance.
+        self._checkpoint_ledger(quantity)
+        self.save()
+
+    def transact_quantity(self,
+                          quantity: Quantity,
+                          deltas: Dict[discord.Member, Union[int, float]],
+                          agent: Optional[discord.Member] = None,
+                          *, based_on: Optional[QuantityView] = None) -> List[Tuple[discord.Member, Union[int, float], Union[int, float]]]:
+        """Add an amount to the value of a quantity for each of several players,
+        recording the changes in the quantity's ledger and saving once at the
+        end.
+
+        If `based_on` is given (see Quantity.view()), raise ConflictError
+        without changing anything if the quantity has been removed, or if the
+        value for any of the players has changed since then.
+
+        Return a list of tuples (player, old_value, new_value) sorted by player.
+        """
+        self.assert_locked()
+        if based_on is not None:
+            self.check_quantity(quantity)
+            if quantity.version != based_on.version:
+                changes = [
+                    f"{utils.discord.fake_mention(player)}: {old_value} \N{RIGHTWARDS ARROW} {quantity.get(player)}"
+                    for player, old_value in based_on.values.items()
+                    if player in deltas and quantity.get(player) != old_value
+                ]
+                if changes:
+                    raise ConflictError(quantity, changes)
+        ledger = self.get_ledger(quantity)
+        if not ledger.exists:
+            self._checkpoint_ledger(quantity)
+        timestamp = utils.now()
+        changes = []
+        entries = []
+        for player in utils.discord.sort_users(deltas):
+            old_value = quantity.get(player)
+            quantity.set(player, old_value + deltas[player])
+            new_value = quantity.get(player)
+            changes.append((player, old_value, new_value))
+            if new_value != old_value:
+                entries.append(LedgerEntry(timestamp, player.id, new_value - old_value, agent and agent.id or 0))
+        ledger.append(entries, self._ledger_balances(quantity), quantity.default_value)
         self.save()
+        return changes
+
+    def get_ledger(self, quantity: Quantity) -> QuantityLedger:
+        """Return the transaction ledger for a quantity."""
+        if quantity.name not in self._ledgers:
+            self._ledgers[quantity.name] = QuantityLedger(self._get_ledger_file(quantity))
+        return self._ledgers[quantity.name]
+
+    def _get_ledger_file(self, quantity: Quantity) -> str:
+        return self.get_file(path.join('data', 'ledgers', f'{quantity.name}.ledger'))
+
+    def _ledger_balances(self, quantity: Quantity) -> Dict[int, Union[int, float]]:
+        return dict(quantity.players.id_items())
+
+    def _checkpoint_ledger(self, quantity: Quantity):
+        self.get_ledger(quantity).checkpoint(self._ledger_balances(quantity), quantity.default_value)
 
     def get_quantity(self, name: str) -> Optional[Quantity]:
         name = name.lower()
@@ -208,3 +315,19 @@ class QuantityManager(GameRepoManager):
             preposition = 'from'
         amount = abs(new_value - old_value)
         await self.log(f"{agent} {verb} **{amount}** of {quantity} {preposition} {player} (was {old_value}; now {new_value})")
+
+    async def log_quantity_bulk_set_value(self,
+                                          agent: discord.Member,
+                                          quantity: Quantity,
+                                          changes: List[Tuple[discord.Member, Union[int, float], Union[int, float]]]):
+        agent = utils.discord.fake_mention(agent)
+        changes = [(player, old_value, new_value)
+                   for player, old_value, new_value in changes
+                   if old_value != new_value]
+        if not changes:
+            return
+        details = utils.human_list(
+            f"{utils.discord.fake_mention(player)} (was {old_value}; now {new_value})"
+            for player, old_value, new_value in changes
+        )
+        await self.log(f"{agent} changed {quantity} for {utils.human_count(len(changes), 'player', 'players')}: {details}")
@@ -0,0 +1,22 @@
+from typing import Any, Callable, Hashable
+
+
+class RenderCache:
+    """A cache of rendered representations of an object (embeds, Markdown,
+    etc.), each keyed on the state it was rendered from.
+
+    A cached render is reused as long as the key passed to get() is equal to
+    the key it was rendered with; otherwise it is rendered again.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, name: str, key: Hashable, render: Callable[[], Any]) -> Any:
+        entry = self._entries.get(name)
+        if entry is None or entry[0] != key:
+            entry = self._entries[name] = (key, render())
+        return entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
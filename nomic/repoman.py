@@ -8,7 +8,19 @@ import discord
 from .base import BaseGame
 from constants import colors, info
 from repository import RepoBranch
-from utils import l
+import repository
+from utils import fileio, l
+
+
+def _read_last_log(filepath: str) -> Tuple[int, int, int]:
+    try:
+        with open(filepath) as f:
+            t = tuple(int(line) for line in f)
+            if len(t) == 3:
+                return t
+    except FileNotFoundError:
+        pass
+    return 0, 0, 0
 
 
 README_TEXT = f"""\
@@ -33,6 +45,9 @@ _Last updated {{last_updated}}_
 class GameRepoManager(BaseGame):
 
     ready = False
+    # Time of the first save since the last push, or None if everything has
+    # been pushed
+    unuploaded_since = None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -41,18 +56,19 @@ class GameRepoManager(BaseGame):
     async def setup(self, loop):
         if not self.ready:
             async with self:
-                # Test SSH connection
-                _, ssh_stderr = await (await asyncio.create_subprocess_exec(
-                    'ssh', '-T', 'git@github.com',
-                    stdout=PIPE, stderr=PIPE,
-                )).communicate()
-                if "success" in ssh_stderr.decode().lower():
-                    l.info("Successfully authenticated to GitHub")
-                else:
-                    l.error("Unable to authenticate to GitHub")
-                    l.error("See README for instructions")
-                    l.error(f"`ssh -T git@github.com` stderr: {ssh_stderr.decode()!r}")
-                    exit(1)
+                if info.CHECK_SSH and repository.REPO_LINK.startswith('git@github.com:'):
+                    # Test SSH connection
+                    _, ssh_stderr = await (await asyncio.create_subprocess_exec(
+                        'ssh', '-T', 'git@github.com',
+                        stdout=PIPE, stderr=PIPE,
+                    )).communicate()
+                    if "success" in ssh_stderr.decode().lower():
+                        l.info("Successfully authenticated to GitHub")
+                    else:
+                        l.error("Unable to authenticate to GitHub")
+                        l.error("See README for instructions")
+                        l.error(f"`ssh -T git@github.com` stderr: {ssh_stderr.decode()!r}")
+                        exit(1)
                 # Initialize repository branch
                 l.info(f"Initializing repository branch for {self.guild.name}")
                 await self.repo.setup()
@@ -103,11 +119,10 @@ class GameRepoManager(BaseGame):
     async def update_readme(self):
         """Update the repository's README.md."""
         self.assert_locked()
-        with open(self.get_file('README.md'), 'w') as f:
-            f.write(README_TEXT.format(
-                game=self,
-                last_updated=datetime.utcnow().strftime('UTC %Y-%m-%d %H:%M')
-            ))
+        fileio.write(self.get_file('README.md'), README_TEXT.format(
+            game=self,
+            last_updated=datetime.utcnow().strftime('UTC %Y-%m-%d %H:%M')
+        ))
 
     async def upload_all(self):
         self.assert_locked()
@@ -115,6 +130,7 @@ class GameRepoManager(BaseGame):
             await self.update_readme()
             await self.commit_all()
         await self.push()
+        self.unuploaded_since = None
 
     async def get_last_log_file(self) -> str:
         """Return the complete path to data/last_log."""
@@ -126,20 +142,13 @@ class GameRepoManager(BaseGame):
         event. If there was no events have been found, return (0, 0, 0).
         """
         self.assert_locked()
-        try:
-            with open(await self.get_last_log_file()) as f:
-                t = tuple(int(line) for line in f)
-                if len(t) == 3:
-                    return t
-        except FileNotFoundError:
-            pass
-        return 0, 0, 0
+        filepath = await self.get_last_log_file()
+        return await fileio.run(filepath, _read_last_log, filepath)
 
     async def update_last_log(self, year, month, day):
         """Update data/last_log."""
         self.assert_locked()
-        with open(await self.get_last_log_file(), 'w') as f:
-            f.write(f'{year}\n{month}\n{day}')
+        fileio.write(await self.get_last_log_file(), f'{year}\n{month}\n{day}')
 
     async def log(self, log_text: str, link_to_commit: bool = False):
         """Add `log_text` to the log.
@@ -163,17 +172,13 @@ class GameRepoManager(BaseGame):
             log_text += f" ([diff]({link}))"
 
         logfile_md = path.join('logs', year_month + '.md')
-        with open(self.get_file(logfile_md), 'a') as f:
-            if new_month:
-                f.write(f"# {timestamp.strftime('%Y-%m')}")
-                f.write("\n")
-            if new_day:
-                f.write("\n")
-                f.write(f"## {timestamp.strftime('%Y-%m-%d')}")
-                f.write("\n\n")
-            f.write(f"* `{timestamp.strftime('%H:%M:%S')}` ")
-            f.write(log_text)
-            f.write("\n")
+        entry = ''
+        if new_month:
+            entry += f"# {timestamp.strftime('%Y-%m')}\n"
+        if new_day:
+            entry += f"\n## {timestamp.strftime('%Y-%m-%d')}\n\n"
+        entry += f"* `{timestamp.strftime('%H:%M:%S')}` {log_text}\n"
+        fileio.write(self.get_file(logfile_md), entry, append=True)
 
         await self.update_last_log(timestamp.year, timestamp.month, timestamp.day)
 
@@ -0,0 +1,74 @@
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+import asyncio
+import heapq
+
+from utils import l
+
+
+class DeadlineScheduler:
+    """A single heap of proposal voting deadlines across all games.
+
+    Rather than polling every proposal, the scheduler sleeps until the earliest
+    deadline (or until an earlier one is scheduled) and then hands every due
+    entry to a callback. Entries are never removed early; the callback must
+    check whether the proposal still needs resolving when its deadline arrives.
+    Scheduling an entry that is already scheduled does nothing.
+
+    Do not instantiate this class directly; use the module-level `scheduler`
+    instead.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, int]] = []
+        self._entries: Set[Tuple[int, int, int]] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, deadline: int, guild_id: int, n: int) -> None:
+        """Schedule proposal `n` in the given guild to be checked at
+        `deadline` (a Unix timestamp, as returned by utils.now()).
+        """
+        entry = (deadline, guild_id, n)
+        if entry in self._entries:
+            return
+        self._entries.add(entry)
+        heapq.heappush(self._heap, entry)
+        if self._wakeup and self._heap[0] == entry:
+            self._wakeup.set()
+
+    def pop_due(self, now: int) -> List[Tuple[int, int, int]]:
+        """Remove and return all entries whose deadline is at or before
+        `now`.
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            self._entries.discard(entry)
+            due.append(entry)
+        return due
+
+    async def run(self, callback: Callable[[int, int, int], Awaitable[None]], *, now: Callable[[], int]) -> None:
+        """Call `await callback(deadline, guild_id, n)` for each entry as its
+        deadline passes. Runs until cancelled.
+        """
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            if self._heap:
+                timeout = max(0, self._heap[0][0] - now())
+            else:
+                timeout = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            for entry in self.pop_due(now()):
+                try:
+                    await callback(*entry)
+                except Exception as exc:
+                    l.error(f"Error resolving proposal #{entry[2]} in guild {entry[1]}: {type(exc).__name__}: {exc}")
+
+
+scheduler = DeadlineScheduler()
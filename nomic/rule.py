@@ -1,17 +1,57 @@
 from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional, List, Set
+from typing import Dict, Iterable, NamedTuple, Optional, List, Set, Union
 import discord
 import functools
 import itertools
 import re
 
+from .base import ConflictError, Versioned
+from .rendercache import RenderCache
 from .repoman import GameRepoManager
 from constants import colors, info
 from utils import l
 import utils
 
 
+LINK_PATTERN = re.compile(r'\[%([a-z0-9\-_]+)\]')
+BULLET_PATTERN = re.compile(r'^([ \t]*)\* ', flags=re.MULTILINE)
+
+
+class LinkToken(NamedTuple):
+    tag: str
+    raw: str
+
+
+def tokenize_links(text: str) -> List[Union[str, LinkToken]]:
+    """Split text into literal strings and LinkTokens for rule tag links (e.g.
+    `[%proposals]`).
+    """
+    tokens = []
+    position = 0
+    for match in LINK_PATTERN.finditer(text):
+        if match.start() > position:
+            tokens.append(text[position:match.start()])
+        tokens.append(LinkToken(match.group(1), match.group()))
+        position = match.end()
+    if position < len(text):
+        tokens.append(text[position:])
+    return tokens
+
+
+def chunk_paragraphs(paragraphs: Iterable[str]) -> List[str]:
+    """Join paragraphs into newline-terminated chunks shorter than 2000
+    characters each, without splitting any paragraph.
+    """
+    chunks = ['']
+    for paragraph in paragraphs:
+        if len(chunks[-1]) + len(paragraph) >= 2000:
+            chunks.append('')
+        chunks[-1] += paragraph + '\n'
+    return chunks
+
+
+@utils.slotted
 @dataclass
 class _Rule:
     game: object  # We can't access nomic.game.Game from here.
@@ -24,7 +64,7 @@ class _Rule:
 
 
 @functools.total_ordering
-class Rule(_Rule):
+class Rule(_Rule, Versioned):
     """A dataclass representing a section or subsection of the game rules.
 
     Attributes:
@@ -38,17 +78,24 @@ class Rule(_Rule):
     - child_tags (default []) -- list of strings
     - message_ids (default []) -- list of discord.Message or IDs (converted to
       list of integer IDs)
+
+    Other attributes:
+    - version -- int (see nomic.base.Versioned)
     """
 
+    __slots__ = ('version', '_render_cache')
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if self.child_tags is None:
             self.child_tags = []
         if self.message_ids is None:
             self.message_ids = []
+        self.version = 0
+        self._render_cache = RenderCache()
 
     def export(self) -> dict:
-        return OrderedDict(
+        return dict(
             tag=self.tag,
             title=self.title,
             content=self.content if self.tag != 'root' else None,
@@ -88,16 +135,11 @@ class Rule(_Rule):
     def depth(self):
         if self.tag == 'root':
             return 0
-        return self.parent.depth + 1
+        return self.section_number.count('.')
 
     @property
     def section_number(self) -> str:
-        parent_rule = self.parent
-        i = parent_rule.child_tags.index(self.tag) + 1
-        if self.parent.tag == 'root':
-            return f"{i}."
-        else:
-            return f"{parent_rule.section_number}{i}."
+        return self.game.section_numbers[self.tag]
 
     @property
     def section_title(self) -> str:
@@ -128,52 +170,89 @@ class Rule(_Rule):
         - format_string -- str; format string taking a keyword argument `rule`
         - content -- str; content in which to replace links
         """
-        def replace_func(match):
-            rule = self.game.get_rule(match.group(1))
-            if rule is None:
-                return match.group()
-            else:
-                return format_string.format(rule=rule)
         if content is None:
             content = self.content
-        return re.sub(r'\[%([a-z0-9\-_]+)\]', replace_func, content)
+        return ''.join(
+            token if isinstance(token, str) else self._format_link(token, format_string)
+            for token in tokenize_links(content)
+        )
 
-    def discord_link_sub(self, paragraph):
-        s = self._link_sub('[**{rule.section_title}**]({rule.discord_link})', paragraph)
-        if len(s) < 2000:
-            return s
-        s = self._link_sub('**{rule.section_title}**', paragraph)
-        if len(s) < 2000:
-            return s
-        s = paragraph
-        if len(s) < 2000:
-            return s
+    def _format_link(self, token: LinkToken, format_string: str) -> str:
+        rule = self.game.get_rule(token.tag)
+        if rule is None:
+            return token.raw
+        return format_string.format(rule=rule)
+
+    def _fit_links(self, tokens: List[Union[str, LinkToken]]) -> str:
+        """Substitute links in a tokenized paragraph using the most detailed
+        format that fits within 2000 characters.
+
+        The lengths of all formats are computed in a single pass, so the
+        paragraph is never re-scanned.
+        """
+        # Each part is a tuple of (linked, bold, plain) renderings.
+        parts = []
+        lengths = [0, 0, 0]
+        for token in tokens:
+            if isinstance(token, str):
+                part = (token, token, token)
+            else:
+                rule = self.game.get_rule(token.tag)
+                if rule is None:
+                    part = (token.raw, token.raw, token.raw)
+                else:
+                    bold = f'**{rule.section_title}**'
+                    part = (f'[{bold}]({rule.discord_link})', bold, token.raw)
+            parts.append(part)
+            for i, s in enumerate(part):
+                lengths[i] += len(s)
+        for i, length in enumerate(lengths):
+            if length < 2000:
+                return ''.join(part[i] for part in parts)
+        s = ''.join(part[2] for part in parts)
         end = " ... <truncated to 2000 chars>"
         return s[:(2000 - len(end))] + end
 
+    def discord_link_sub(self, paragraph):
+        return self._fit_links(tokenize_links(paragraph))
+
     def markdown_link_sub(self, paragraph):
         return self._link_sub('[**{rule.section_title}**](#{rule.tag})', paragraph)
 
+    @property
+    def _discord_paragraphs(self) -> List[List[Union[str, LinkToken]]]:
+        """Return the tokenized paragraphs of this rule's content, with bullet
+        points substituted.
+
+        This is cached until the content changes.
+        """
+        def tokenize():
+            s = BULLET_PATTERN.sub("    \\1\N{BULLET} ", self.content)
+            return [tokenize_links(paragraph) for paragraph in s.splitlines()]
+        return self._render_cache.get('discord_paragraphs', self.content, tokenize)
+
     @property
     def discord_content(self) -> List[str]:
         if self.tag == 'root':
-            s = "\n".join(f"[%{rule.tag}]" for rule in self.descendants)
-            link = f'{info.GITHUB_REPO_LINK}/blob/{self.game.repo.name}/rules.md'
-            s += f"\n\n[View on GitHub]({link})"
-        else:
-            s = self.content
-        s = re.sub(r'^([ \t]*)\* ', "    \\1\N{BULLET} ", s, flags=re.MULTILINE)
-        paragraphs = map(self.discord_link_sub, s.splitlines())
-        # Substitute bullet points
-        chunks = ['']
-        for paragraph in paragraphs:
-            if len(chunks[-1]) + len(paragraph) >= 2000:
-                chunks.append('')
-            chunks[-1] += paragraph + '\n'
-        return chunks
+            return self.game.toc_chunks
+        return chunk_paragraphs(map(self._fit_links, self._discord_paragraphs))
+
+    @property
+    def _render_key(self) -> tuple:
+        # Renders include other rules' titles, section numbers, and message
+        # links, all of which are covered by the game's rules generation.
+        return (self.tag, self.title, self.content, self.game.rules_generation, self.game.rules_channel)
 
     @property
     def embeds(self) -> List[discord.Embed]:
+        """Return a list of embeds displaying this rule section.
+
+        The embeds are cached until the rules change, so they must not be
+        modified.
+        """
+        return self._render_cache.get('embeds', self._render_key, self._render_embeds)
+
+    def _render_embeds(self) -> List[discord.Embed]:
         chunks = self.discord_content
         embeds = []
         for i, chunk in enumerate(chunks):
@@ -189,6 +268,9 @@ class Rule(_Rule):
 
     @property
     def markdown(self):
+        return self._render_cache.get('markdown', self._render_key, self._render_markdown)
+
+    def _render_markdown(self) -> str:
         if self.tag == 'root':
             s = f"## {self.section_title}"
             s += "\n\n"
@@ -245,6 +327,9 @@ class RuleManager(GameRepoManager):
         if self.rules_channel:
             self.rules_channel = self.guild.get_channel(self.rules_channel)
         self.rules = {}
+        self.rules_generation = 0
+        self._rules_render_cache = RenderCache()
+        self._toc_lines = {}
         if db.get('rules'):
             for _, rule_data in db['rules'].items():
                 rule = Rule(game=self, **rule_data)
@@ -258,17 +343,77 @@ class RuleManager(GameRepoManager):
 
     def save(self):
         db = self.get_db('rules')
-        db.replace(OrderedDict(
+        db.replace(dict(
             channel=self.rules_channel and self.rules_channel.id,
             rules=utils.sort_dict({k: r.export() for k, r in self.rules.items()}),
         ))
         db.save()
-        with open(self.get_file('rules.md'), 'w') as f:
-            f.write(f"# {self.guild.name} \N{EM DASH} Rules")
-            f.write('\n\n')
-            f.write(self.root_rule.markdown)
-            for r in self.root_rule.descendants:
-                f.write(r.markdown)
+        parts = [f"# {self.guild.name} \N{EM DASH} Rules", '\n\n', self.root_rule.markdown]
+        parts.extend(r.markdown for r in self.root_rule.descendants)
+        utils.fileio.write(self.get_file('rules.md'), ''.join(parts))
+
+    def invalidate_rules(self):
+        """Mark rendered rules as out of date.
+
+        This must be called whenever a rule's tag, title, position, or messages
+        change, since those appear in other rules' renders. Changes to a rule's
+        content only affect that rule, and are detected automatically.
+        """
+        self.rules_generation += 1
+
+    @property
+    def section_numbers(self) -> Dict[str, str]:
+        """Return an OrderedDict mapping the tag of every rule except the root
+        to its section number (e.g. `1.2.`), in table-of-contents order.
+
+        This is cached until the rules change.
+        """
+        return self._rules_render_cache.get('section_numbers', self.rules_generation, self._number_sections)
+
+    def _number_sections(self) -> Dict[str, str]:
+        # Walk the tree once, keeping a stack of (section number, remaining
+        # children) for each rule on the path from the root.
+        numbers = OrderedDict()
+        stack = [('', iter(enumerate(self.root_rule.child_tags, 1)))]
+        while stack:
+            prefix, children = stack[-1]
+            for i, tag in children:
+                number = numbers[tag] = f'{prefix}{i}.'
+                stack.append((number, iter(enumerate(self.rules[tag].child_tags, 1))))
+                break
+            else:
+                stack.pop()
+        return numbers
+
+    @property
+    def toc_chunks(self) -> List[str]:
+        """Return the table of contents for Discord, split into chunks shorter
+        than 2000 characters.
+
+        Each rule's line is cached until its section number, title, or message
+        link changes, so only the lines for affected rules are rendered again.
+        """
+        key = (self.rules_generation, self.rules_channel, self.repo.name)
+        return self._rules_render_cache.get('toc_chunks', key, self._render_toc)
+
+    def _render_toc(self) -> List[str]:
+        root = self.root_rule
+        lines = {}
+        paragraphs = []
+        for tag, number in self.section_numbers.items():
+            rule = self.rules[tag]
+            key = (number, rule.title, rule.discord_link)
+            entry = self._toc_lines.get(tag)
+            if entry is None or entry[0] != key:
+                entry = (key, root._fit_links([LinkToken(tag, f'[%{tag}]')]))
+            lines[tag] = entry
+            paragraphs.append(entry[1])
+        # Forget lines for rules that no longer exist.
+        self._toc_lines = lines
+        link = f'{info.GITHUB_REPO_LINK}/blob/{self.repo.name}/rules.md'
+        paragraphs.append('')
+        paragraphs.append(f"[View on GitHub]({link})")
+        return chunk_paragraphs(paragraphs)
 
     async def commit_rules_and_log(self,
                                    agent: discord.Member,
@@ -306,7 +451,9 @@ class RuleManager(GameRepoManager):
                 for m in messages[len(embeds):]:
                     await m.delete()
                 for m, embed in zip(messages, embeds):
-                    await m.edit(embed=embed)
+                    # Only edit messages whose contents actually changed.
+                    if not (m.embeds and utils.discord.embeds_equal(m.embeds[0], embed)):
+                        await m.edit(embed=embed)
             except discord.NotFound:
                 await self.repost_rule(rule)
                 return
@@ -339,6 +486,7 @@ class RuleManager(GameRepoManager):
             for embed in rule.embeds:
                 m = await self.rules_channel.send(embed=embed)
                 rule.message_ids.append(m.id)
+        self.invalidate_rules()
         await self.refresh_rule(self.root_rule)
         self.save()
 
@@ -418,6 +566,15 @@ class RuleManager(GameRepoManager):
         if new_parent in rule.descendants:
             raise ValueError("Cannot move rule a child of itself")
 
+    def check_rule(self, rule: Rule, version: Optional[int] = None, **expected):
+        """Raise ConflictError if a rule has been removed, or if it has changed
+        since `version` (see nomic.base.Versioned.check_version()).
+        """
+        if self.rules.get(rule.tag) is not rule:
+            raise ConflictError(rule, ["it was removed"])
+        if version is not None:
+            rule.check_version(version, **expected)
+
     async def add_rule(self, parent: Rule, index: Optional[int], *, tag, **kwargs):
         self.assert_locked()
         self.check_rule_tag_unused(tag)
@@ -425,7 +582,10 @@ class RuleManager(GameRepoManager):
             parent.child_tags.append(tag)
         else:
             parent.child_tags.insert(index, tag)
+        parent.touch()
         self.rules[tag] = rule = Rule(game=self, tag=tag, parent_tag=parent.tag, **kwargs)
+        self.index_rule(rule)
+        self.invalidate_rules()
         self.assert_rules_validity()
         await self.repost_rule(rule)
         self.save()
@@ -440,7 +600,10 @@ class RuleManager(GameRepoManager):
             child.parent_tag = new_tag
         del self.rules[rule.tag]
         self.rules[new_tag] = rule
+        self.rule_index.rename(rule.tag, new_tag)
         rule.tag = new_tag
+        rule.touch()
+        self.invalidate_rules()
         self.assert_rules_validity()
         await self.refresh_rule(rule)
         self.save()
@@ -448,6 +611,9 @@ class RuleManager(GameRepoManager):
     async def set_rule_title(self, rule: Rule, new_title: str):
         self.assert_locked()
         rule.title = new_title
+        rule.touch()
+        self.index_rule(rule)
+        self.invalidate_rules()
         await rule.refresh()
         await self.root_rule.refresh()
         self.save()
@@ -455,6 +621,8 @@ class RuleManager(GameRepoManager):
     async def set_rule_content(self, rule: Rule, new_content: str):
         self.assert_locked()
         rule.content = new_content
+        rule.touch()
+        self.index_rule(rule)
         await self.refresh_rule(rule)
         self.save()
 
@@ -464,8 +632,12 @@ class RuleManager(GameRepoManager):
         if new_index is None:
             new_index = len(new_parent.child_tags)
         rule.parent.child_tags.remove(rule.tag)
+        rule.parent.touch()
         new_parent.child_tags.insert(new_index, rule.tag)
+        new_parent.touch()
         rule.parent_tag = new_parent.tag
+        rule.touch()
+        self.invalidate_rules()
         self.assert_rules_validity()
         await self.repost_rule(rule)
         self.save()
@@ -481,7 +653,11 @@ class RuleManager(GameRepoManager):
         for child in rule.children:
             self.remove_rule(child)
         rule.parent.child_tags.remove(rule.tag)
+        rule.parent.touch()
         del self.rules[rule.tag]
+        rule.touch()
+        self.rule_index.remove(rule.tag)
+        self.invalidate_rules()
         self.assert_rules_validity()
         for m in await rule.fetch_messages():
             await m.delete()
@@ -0,0 +1,279 @@
+from os import path
+from typing import Dict, Iterator, List, NamedTuple, Set, Tuple
+import hashlib
+import math
+import re
+
+from .repoman import GameRepoManager
+from database import DB, get_db
+from utils import fileio
+import repository
+import utils
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*", flags=re.IGNORECASE)
+
+# Number of characters of context on either side of a match in a snippet
+SNIPPET_CONTEXT = 60
+
+
+def tokenize(text: str) -> Iterator[Tuple[str, int]]:
+    """Yield tuples (token, offset) for each word in some text, where each
+    token is lowercase and offset is its starting index in the text.
+    """
+    for match in TOKEN_PATTERN.finditer(text):
+        yield match.group().lower(), match.start()
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class SearchResult(NamedTuple):
+    key: str
+    score: float
+    offsets: List[int]
+
+
+class SearchIndex:
+    """An inverted index mapping each token to the documents that contain it
+    and the offsets at which it appears.
+
+    Documents are identified by string keys (rule tags or proposal numbers).
+    A hash of each document's text is kept alongside the index, so updating a
+    document that has not changed is free and an index loaded from disk only
+    has to re-tokenize documents that changed since it was saved.
+
+    Attributes:
+    - postings -- dict mapping tokens to dicts mapping document keys to lists
+      of offsets
+    - hashes -- dict mapping document keys to hashes of their text
+    - dirty -- bool; whether the index has changed since it was last exported
+    """
+
+    def __init__(self, data: dict = None):
+        self.postings: Dict[str, Dict[str, List[int]]] = {}
+        self.hashes: Dict[str, str] = {}
+        # Map from each document key to the set of tokens it contains, so
+        # that a document can be removed without scanning every posting.
+        self._doc_tokens: Dict[str, Set[str]] = {}
+        self.dirty = False
+        if data:
+            self.hashes.update(data.get('hashes', {}))
+            for token, docs in data.get('postings', {}).items():
+                self.postings[token] = {key: self._decode(offsets) for key, offsets in docs.items()}
+                for key in docs:
+                    self._doc_tokens.setdefault(key, set()).add(token)
+
+    @staticmethod
+    def _encode(offsets: List[int]) -> List[int]:
+        # Offsets are sorted, so store the differences between them instead
+        # for a smaller file.
+        return [b - a for a, b in zip([0] + offsets, offsets)]
+
+    @staticmethod
+    def _decode(deltas: List[int]) -> List[int]:
+        offsets = []
+        total = 0
+        for delta in deltas:
+            total += delta
+            offsets.append(total)
+        return offsets
+
+    def export(self) -> dict:
+        return dict(
+            hashes=utils.sort_dict(self.hashes),
+            postings={
+                token: {key: self._encode(docs[key]) for key in sorted(docs)}
+                for token, docs in sorted(self.postings.items())
+            },
+        )
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.hashes
+
+    def update(self, key: str, text: str) -> None:
+        """Index a document, replacing any previous version of it."""
+        text_hash = _hash_text(text)
+        if self.hashes.get(key) == text_hash:
+            return
+        self.remove(key)
+        doc_postings = {}
+        for token, offset in tokenize(text):
+            doc_postings.setdefault(token, []).append(offset)
+        for token, offsets in doc_postings.items():
+            self.postings.setdefault(token, {})[key] = offsets
+        self._doc_tokens[key] = set(doc_postings)
+        self.hashes[key] = text_hash
+        self.dirty = True
+
+    def remove(self, key: str) -> None:
+        """Remove a document from the index, if it is present."""
+        if key not in self.hashes:
+            return
+        for token in self._doc_tokens.pop(key, ()):
+            docs = self.postings[token]
+            del docs[key]
+            if not docs:
+                del self.postings[token]
+        del self.hashes[key]
+        self.dirty = True
+
+    def rename(self, old_key: str, new_key: str) -> None:
+        """Change the key of a document without re-tokenizing it."""
+        if old_key not in self.hashes:
+            return
+        tokens = self._doc_tokens.pop(old_key, set())
+        for token in tokens:
+            docs = self.postings[token]
+            docs[new_key] = docs.pop(old_key)
+        self._doc_tokens[new_key] = tokens
+        self.hashes[new_key] = self.hashes.pop(old_key)
+        self.dirty = True
+
+    def sync(self, documents: Dict[str, str], *, keep: Set[str] = frozenset()) -> None:
+        """Bring the index up to date with a complete set of documents,
+        re-tokenizing only those that have changed.
+
+        Documents whose keys are in `keep` are left as they are, even if they
+        are not in `documents`.
+        """
+        for key in set(self.hashes) - set(documents) - set(keep):
+            self.remove(key)
+        for key, text in documents.items():
+            self.update(key, text)
+
+    def search(self, query: str) -> List[SearchResult]:
+        """Return a list of documents matching any word in a query, best match
+        first.
+
+        Documents are ranked first by how many distinct query words they
+        contain and then by TF-IDF score.
+        """
+        tokens = set(token for token, _ in tokenize(query))
+        doc_count = len(self.hashes)
+        matched_words: Dict[str, int] = {}
+        scores: Dict[str, float] = {}
+        offsets: Dict[str, List[int]] = {}
+        for token in tokens:
+            docs = self.postings.get(token, {})
+            if not docs:
+                continue
+            idf = math.log(1 + doc_count / len(docs))
+            for key, token_offsets in docs.items():
+                matched_words[key] = matched_words.get(key, 0) + 1
+                scores[key] = scores.get(key, 0) + (1 + math.log(len(token_offsets))) * idf
+                offsets.setdefault(key, []).extend(token_offsets)
+        results = [SearchResult(key, scores[key], sorted(offsets[key])) for key in scores]
+        results.sort(key=lambda r: (-matched_words[r.key], -r.score, r.key))
+        return results
+
+
+def snippet(text: str, result: SearchResult, query: str) -> str:
+    """Return an excerpt of a document's text around its first match, with
+    matching words in bold.
+    """
+    tokens = set(token for token, _ in tokenize(query))
+    start = max(0, result.offsets[0] - SNIPPET_CONTEXT)
+    end = min(len(text), result.offsets[0] + SNIPPET_CONTEXT)
+    excerpt = text[start:end]
+    s = ''
+    position = 0
+    for token, offset in tokenize(excerpt):
+        if token in tokens:
+            s += excerpt[position:offset] + f"**{excerpt[offset:offset + len(token)]}**"
+            position = offset + len(token)
+    s += excerpt[position:]
+    s = ' '.join(s.split())
+    if start > 0:
+        s = "\N{HORIZONTAL ELLIPSIS}" + s
+    if end < len(text):
+        s += "\N{HORIZONTAL ELLIPSIS}"
+    return s
+
+
+class SearchManager(GameRepoManager):
+
+    def get_search_db(self) -> DB:
+        """Return the DB that the search indexes are saved in.
+
+        The indexes are derived from the rules and proposals, so they are kept
+        next to the game's repository rather than committed inside it.
+        """
+        return get_db(path.join(repository.REPOS_DIR, 'search_indexes', self.repo_name))
+
+    def load(self):
+        """Load the search indexes and update them for any rules or proposals
+        that changed since they were saved.
+
+        This must be called after loading rules and proposals.
+        """
+        db = self.get_search_db()
+        # Older versions saved the indexes in the repository. Move them out
+        # (archived proposals can't be re-indexed without loading them), and
+        # the deletion is committed with the next upload.
+        old_filepath = self.get_file(path.join('data', 'search_index.json'))
+        if path.isfile(old_filepath):
+            if not db:
+                db.replace(self.get_db('search_index'))
+                db.save()
+            fileio.remove(old_filepath)
+        self.rule_index = SearchIndex(db.get('rules'))
+        self.proposal_index = SearchIndex(db.get('proposals'))
+        self.rule_index.sync({
+            tag: self.rule_search_text(rule)
+            for tag, rule in self.rules.items() if tag != 'root'
+        })
+        # Archived proposals are only re-indexed when they change, so there
+        # is no need to load them here.
+        self.proposal_index.sync(
+            {str(n): proposal.content for n, proposal in self._live_proposals.items()},
+            keep=set(str(n) for n in range(1, self.proposal_count + 1)),
+        )
+
+    def save(self):
+        if not (self.rule_index.dirty or self.proposal_index.dirty):
+            return
+        db = self.get_search_db()
+        db.replace(dict(
+            rules=self.rule_index.export(),
+            proposals=self.proposal_index.export(),
+        ))
+        db.save()
+        self.rule_index.dirty = False
+        self.proposal_index.dirty = False
+
+    @staticmethod
+    def rule_search_text(rule) -> str:
+        return f"{rule.title}\n{rule.content}"
+
+    def index_rule(self, rule) -> None:
+        self.rule_index.update(rule.tag, self.rule_search_text(rule))
+
+    def index_proposal(self, proposal) -> None:
+        self.proposal_index.update(str(proposal.n), proposal.content)
+
+    def search_rules(self, query: str) -> List[Tuple[object, str]]:
+        """Return a list of tuples (rule, snippet) for rules matching a query,
+        best match first.
+        """
+        results = []
+        for result in self.rule_index.search(query):
+            rule = self.get_rule(result.key, tag_only=True)
+            if rule:
+                results.append((rule, snippet(self.rule_search_text(rule), result, query)))
+        return results
+
+    def search_proposals(self, query: str) -> List[Tuple[object, str]]:
+        """Return a list of tuples (proposal, snippet) for proposals matching a
+        query, best match first.
+        """
+        results = []
+        for result in self.proposal_index.search(query):
+            proposal = self.get_proposal(int(result.key))
+            if proposal:
+                results.append((proposal, snippet(proposal.content, result, query)))
+        return results
@@ -0,0 +1,33 @@
+from array import array
+from typing import Iterable, Iterator, Tuple
+
+
+class VoteTable:
+    """A compact columnar representation of votes across many proposals.
+
+    Votes are stored as three parallel arrays of integers: proposal numbers,
+    voter user IDs, and vote amounts (positive for, negative against, and zero
+    for abstain). Rows are ordered by proposal number.
+
+    Do not instantiate this class directly; use ProposalManager.vote_table
+    instead.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, int, int]] = ()):
+        self.proposal_numbers = array('l')
+        self.player_ids = array('q')
+        self.amounts = array('l')
+        for n, player_id, amount in rows:
+            self.proposal_numbers.append(n)
+            self.player_ids.append(player_id)
+            self.amounts.append(amount)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int]]:
+        return zip(self.proposal_numbers, self.player_ids, self.amounts)
+
+    @property
+    def player_id_set(self):
+        return set(self.player_ids)
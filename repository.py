@@ -1,12 +1,13 @@
 from asyncio.subprocess import PIPE
 from os import path
+from typing import Tuple
 import asyncio
 import logging
 import shutil
 
 from constants import info
 from database import DATA_DIR, DB, get_db
-from utils import l
+from utils import fileio, l, perf
 
 
 git_log = logging.getLogger('git')
@@ -15,7 +16,7 @@ git_log.setLevel(logging.DEBUG)
 
 REPOS_DIR = DATA_DIR
 
-REPO_LINK = f'git@github.com:{info.GITHUB_REPO}'
+REPO_LINK = info.GIT_REMOTE
 
 
 if not info.GITHUB_EMAIL and info.GITHUB_REPO:
@@ -60,21 +61,22 @@ class RepoBranch:
     async def __aenter__(self):
         if self.name == 'master':
             if path.isdir(self.path):
-                self._delete_folder()
+                await self._delete_folder()
             await self._clone()
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
         if self.name == 'master':
-            self._delete_folder()
+            await self._delete_folder()
 
     @property
     def exists(self):
         return path.isdir(self.path)
 
-    def _delete_folder(self):
+    async def _delete_folder(self):
         """Delete this branch's folder (the branch remains in the repo)."""
-        shutil.rmtree(self.path)
+        await fileio.flush(self.path)
+        await fileio.run(self.path, shutil.rmtree, self.path)
 
     def _git_log_output(self, stdout, stderr):
         for line in stdout.decode().splitlines():
@@ -85,26 +87,38 @@ class RepoBranch:
     async def _clone(self):
         """Clone this branch (and only this branch)."""
         git_log.info(f"Cloning {REPO_LINK} (branch {self.name})")
-        subproc = await asyncio.create_subprocess_exec(
-            'git', 'clone', '-b', self.name, '--single-branch', REPO_LINK, self.name,
-            cwd=REPOS_DIR, stdout=PIPE, stderr=PIPE,
-        )
-        self._git_log_output(*await subproc.communicate())
-        if await subproc.wait():
+        with perf.timed('git'):
+            subproc = await asyncio.create_subprocess_exec(
+                'git', 'clone', '-b', self.name, '--single-branch', REPO_LINK, self.name,
+                cwd=REPOS_DIR, stdout=PIPE, stderr=PIPE,
+            )
+            self._git_log_output(*await subproc.communicate())
+        if subproc.returncode:
             _bail_out(f"cloning branch {self.name!r}")
 
-    async def exec(self, *command, log_output=True, **kwargs):
-        """Execute a command in this branch and return the
-        asyncio.subprocess.Process instance.
+    async def _run(self, *command, **kwargs) -> Tuple[asyncio.subprocess.Process, bytes, bytes]:
+        """Execute a command in this branch, wait for it to finish and return a
+        tuple (process, stdout_data, stderr_data).
         """
         git_log.info(f"Executing {command} in repository branch {self.name}")
-        subproc = await asyncio.create_subprocess_exec(
-            *command,
-            cwd=self.path, stdout=PIPE, stderr=PIPE,
-            **kwargs,
-        )
+        # git reads the working tree, so it must see every pending write.
+        await fileio.flush(self.path)
+        with perf.timed('git'):
+            subproc = await asyncio.create_subprocess_exec(
+                *command,
+                cwd=self.path, stdout=PIPE, stderr=PIPE,
+                **kwargs,
+            )
+            stdout, stderr = await subproc.communicate()
+        return subproc, stdout, stderr
+
+    async def exec(self, *command, log_output=True, **kwargs):
+        """Execute a command in this branch, wait for it to finish and return
+        the asyncio.subprocess.Process instance.
+        """
+        subproc, stdout, stderr = await self._run(*command, **kwargs)
         if log_output:
-            self._git_log_output(*await subproc.communicate())
+            self._git_log_output(stdout, stderr)
         return subproc
 
     async def exec_multi(self, *commands, **kwargs):
@@ -114,12 +128,17 @@ class RepoBranch:
             results.append(await (await self.exec(*command, **kwargs)).wait())
         return results
 
-    async def exec_output(self, *command, assert_success=False, **kwargs) -> str:
-        """Execute a command in this branch and return the stdout."""
-        proc = await self.exec(*command, **kwargs, log_output=False)
-        if await proc.wait():
-            self._bail_out(f"executing {' '.join(command)!r}")
-        return tuple(map(bytes.decode, await proc.communicate()))
+    async def exec_output(self, *command, assert_success=False, **kwargs) -> Tuple[str, str]:
+        """Execute a command in this branch and return a tuple (stdout_data,
+        stderr_data).
+
+        If `assert_success` is True, bail out on nonzero return code.
+        """
+        proc, stdout, stderr = await self._run(*command, **kwargs)
+        if proc.returncode and assert_success:
+            self._git_log_output(stdout, stderr)
+            _bail_out(f"executing {' '.join(command)!r}")
+        return stdout.decode(), stderr.decode()
 
     async def pull(self) -> str:
         """Execute `git pull` and return a tuple (stdout_data, stderr_data).
@@ -0,0 +1,47 @@
+import asyncio
+import itertools
+import logging
+import shutil
+import tempfile
+import unittest
+
+import utils
+import repository
+import nomic
+
+from benchmarks.fakes import FakeGuild
+
+
+_guild_ids = itertools.count(200_000)
+
+
+class GameTestCase(unittest.TestCase):
+    """Test case with a fresh event loop and a temporary directory for game
+    repositories.
+    """
+
+    def setUp(self):
+        utils.l.setLevel(logging.ERROR)
+        self.repos_dir = repository.REPOS_DIR
+        repository.REPOS_DIR = tempfile.mkdtemp()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.run_until_complete(utils.fileio.flush())
+        self.loop.close()
+        shutil.rmtree(repository.REPOS_DIR)
+        repository.REPOS_DIR = self.repos_dir
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    async def make_game(self) -> nomic.Game:
+        """Return a new, empty game with a proposals channel and one player."""
+        guild = FakeGuild(next(_guild_ids), "Test")
+        game = nomic.Game(guild)
+        async with game:
+            game.load()
+            game.proposals_channel = guild.add_text_channel('proposals')
+            self.player = guild.add_member("Player")
+        return game
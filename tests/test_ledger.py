@@ -0,0 +1,103 @@
+from os import path
+from unittest import mock
+import asyncio
+import json
+import shutil
+import tempfile
+import unittest
+
+import utils
+from nomic.ledger import CHECKPOINT_INTERVAL, LedgerEntry, QuantityLedger
+
+
+class TestQuantityLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filepath = path.join(self.directory, 'ledger', 'points.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_async(self, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    def test_first_checkpoint_is_recorded_once(self):
+        ledger = QuantityLedger(self.filepath)
+        ledger.checkpoint({1: 5}, 0)
+        self.assertEqual(len(ledger.checkpoints), 1)
+        self.assertEqual(ledger._checkpoint_indices, [0])
+
+    def test_checkpoint_after_reload(self):
+        QuantityLedger(self.filepath).checkpoint({1: 5}, 0)
+        ledger = QuantityLedger(self.filepath)
+        ledger.append([LedgerEntry(100, 1, 2, 1)], {1: 7}, 0)
+        ledger.checkpoint({1: 7}, 0)
+        self.assertEqual(ledger._checkpoint_indices, [0, 1])
+        reloaded = QuantityLedger(self.filepath)
+        self.assertEqual([c.index for c in reloaded.checkpoints], [0, 1])
+
+    def test_reads_include_queued_writes(self):
+        async def test():
+            ledger = QuantityLedger(self.filepath)
+            ledger.checkpoint({}, 0)
+            now = utils.now()
+            ledger.append([LedgerEntry(now, 1, 2, 0), LedgerEntry(now + 60, 1, 3, 0)], {1: 5}, 0)
+            history = await ledger.history(1)
+            self.assertEqual([balance for _, balance in history], [2, 5])
+            self.assertEqual(await ledger.balance_at(1, now), 2)
+            ledger.rename(path.join(self.directory, 'ledger', 'renamed.bin'))
+            self.assertEqual(len(await ledger.history(1)), 2)
+            await utils.fileio.flush()
+            self.assertFalse(path.exists(self.filepath))
+
+        self.run_async(test())
+
+    def fill(self, ledger: QuantityLedger, intervals: int) -> list:
+        """Append `intervals` checkpoint intervals of records for player 2,
+        with one record for player 1 at the start and one at the end, and
+        return the records for player 1.
+        """
+        ledger.checkpoint({}, 0)
+        now = utils.now()
+        sparse = []
+        for i in range(intervals * CHECKPOINT_INTERVAL):
+            player_id = 1 if i in (0, intervals * CHECKPOINT_INTERVAL - 1) else 2
+            entry = LedgerEntry(now + i, player_id, 1, 0)
+            if player_id == 1:
+                sparse.append(entry)
+            ledger.append([entry], {1: len(sparse), 2: i + 1 - len(sparse)}, 0)
+        return sparse
+
+    def test_history_skips_intervals_without_records(self):
+        ledger = QuantityLedger(self.filepath)
+        sparse = self.fill(ledger, 20)
+        with mock.patch.object(QuantityLedger, '_read', autospec=True, side_effect=QuantityLedger._read) as read:
+            history = self.run_async(ledger.history(1))
+        self.assertEqual(history, [(sparse[0], 1), (sparse[1], 2)])
+        # The interval with each record, plus the interval replayed to find
+        # the current balance
+        self.assertLessEqual(read.call_count, 3)
+
+    def test_history_without_last_records(self):
+        ledger = QuantityLedger(self.filepath)
+        sparse = self.fill(ledger, 3)
+        # Remove last_records, as in ledgers written before it existed.
+        with open(ledger.checkpoint_filepath) as f:
+            lines = [json.loads(line) for line in f]
+        with open(ledger.checkpoint_filepath, 'w') as f:
+            for data in lines:
+                del data['last_records']
+                f.write(json.dumps(data) + '\n')
+        ledger = QuantityLedger(self.filepath)
+        history = self.run_async(ledger.history(1))
+        self.assertEqual(history, [(sparse[0], 1), (sparse[1], 2)])
+        self.assertEqual(ledger._last_records, {1: 3 * CHECKPOINT_INTERVAL - 1, 2: 3 * CHECKPOINT_INTERVAL - 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
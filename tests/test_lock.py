@@ -0,0 +1,53 @@
+import asyncio
+import unittest
+
+from nomic.lock import GameLock
+
+
+class TestGameLock(unittest.TestCase):
+
+    def run_async(self, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(asyncio.wait_for(coro, 5))
+        finally:
+            loop.close()
+
+    def test_cancelled_reader_is_skipped(self):
+        async def test():
+            lock = GameLock('test')
+            await lock.acquire('writer')
+            reader = asyncio.ensure_future(lock.acquire('reader', shared=True))
+            await asyncio.sleep(0)
+            reader.cancel()
+            # Release before the cancelled reader gets to run again.
+            lock.release()
+            with self.assertRaises(asyncio.CancelledError):
+                await reader
+            self.assertFalse(lock.locked())
+            await lock.acquire('next writer')
+            self.assertTrue(lock.held_by_current_task())
+            lock.release()
+
+        self.run_async(test())
+
+    def test_cancelled_writer_lets_readers_in(self):
+        async def test():
+            lock = GameLock('test')
+            await lock.acquire('reader', shared=True)
+            writer = asyncio.ensure_future(lock.acquire('writer'))
+            await asyncio.sleep(0)
+            writer.cancel()
+            lock.release()
+            with self.assertRaises(asyncio.CancelledError):
+                await writer
+            await lock.acquire('next reader', shared=True)
+            self.assertTrue(lock.read_by_current_task())
+            lock.release()
+            self.assertFalse(lock.locked())
+
+        self.run_async(test())
+
+
+if __name__ == '__main__':
+    unittest.main()
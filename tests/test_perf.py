@@ -0,0 +1,26 @@
+import asyncio
+import unittest
+
+from utils import perf
+
+
+class TestPerf(unittest.TestCase):
+
+    def test_user_waits_are_left_out_of_command_time(self):
+        async def test():
+            with perf.command('test wait'):
+                with perf.untimed():
+                    await asyncio.sleep(0.2)
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(test())
+        finally:
+            loop.close()
+        stats = perf.commands.pop('test wait')
+        self.assertLess(stats.total.total, 0.1)
+        self.assertGreaterEqual(stats.sections[perf.USER_WAIT].total, 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
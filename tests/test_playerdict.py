@@ -0,0 +1,35 @@
+import unittest
+
+from nomic import PlayerDict
+
+from benchmarks.fakes import FakeGuild, FakeUser
+
+
+class TestPlayerDict(unittest.TestCase):
+
+    def setUp(self):
+        self.guild = FakeGuild(300_000, "Test")
+        self.member = self.guild.add_member("Player")
+
+    def test_rejoined_member_is_resolved(self):
+        players = PlayerDict(self.guild, {self.member: 1})
+        self.assertEqual(list(players), [self.member])
+        self.guild._remove_member(self.member)
+        self.assertEqual(list(players), [])
+        rejoined = self.guild._add_member(FakeUser(self.member.id, "Player"))
+        self.assertEqual(list(players), [rejoined])
+        self.assertIs(next(iter(players)), rejoined)
+
+    def test_departed_members_are_counted(self):
+        players = PlayerDict(self.guild, {self.member: 1, 12345: 2})
+        self.assertIn(12345, players)
+        self.assertEqual(len(players), 2)
+        self.assertEqual(list(players), [self.member])
+
+    def test_export_sorts_ids_numerically(self):
+        players = PlayerDict(self.guild, {100: 'a', 20: 'b', 3: 'c'})
+        self.assertEqual(list(players.export()), ['3', '20', '100'])
+
+
+if __name__ == '__main__':
+    unittest.main()
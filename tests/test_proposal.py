@@ -0,0 +1,78 @@
+from os import path
+import threading
+import unittest
+
+import utils
+from nomic import ProposalStatus
+from nomic.archive import SEGMENT_SIZE
+from nomic.resolution import scheduler
+
+from .helpers import GameTestCase
+
+
+class TestProposalDeadlines(GameTestCase):
+
+    async def make_game(self):
+        game = await super().make_game()
+        async with game:
+            game.flags.auto_resolve = True
+            await game.add_proposal(author=self.player, content="Test")
+        return game
+
+    def scheduled(self, game):
+        return [entry for entry in scheduler._heap if entry[1] == game.guild.id]
+
+    def test_reopened_proposal_gets_a_new_voting_period(self):
+        async def test():
+            game = await self.make_game()
+            proposal = game.get_proposal(1)
+            async with game:
+                await proposal.set_status(ProposalStatus.FAILED)
+                # Submitted long enough ago that the original deadline is over.
+                proposal.timestamp -= (game.flags.voting_period + 1) * 3600
+                await proposal.set_status(ProposalStatus.VOTING)
+            self.assertGreater(proposal.deadline, utils.now())
+            self.assertEqual(scheduler.pop_due(utils.now()), [])
+            self.assertIn((proposal.deadline, game.guild.id, proposal.n), self.scheduled(game))
+
+        self.run_async(test())
+
+    def test_deadlines_are_scheduled_once(self):
+        async def test():
+            game = await self.make_game()
+            proposal = game.get_proposal(1)
+            game.schedule_all_deadlines()
+            game.schedule_all_deadlines()
+            self.assertEqual(self.scheduled(game), [(proposal.deadline, game.guild.id, proposal.n)])
+
+        self.run_async(test())
+
+
+class TestProposalArchive(GameTestCase):
+
+    def test_reopening_removes_segment_files(self):
+        async def test():
+            game = await self.make_game()
+            # Hold up writes to the segment files until after it is reopened.
+            gate = threading.Event()
+            for ext in ('json', 'md'):
+                utils.fileio.submit(game.archive._get_file(0, ext), gate.wait)
+            async with game:
+                for _ in range(SEGMENT_SIZE):
+                    await game.add_proposal(author=self.player, content="Test")
+                first = game.get_proposal(1)
+                for proposal in list(game.open_proposals):
+                    await proposal.set_status(ProposalStatus.PASSED)
+                self.assertIn(0, game.archive)
+                await first.set_status(ProposalStatus.VOTING)
+            gate.set()
+            await utils.fileio.flush()
+            self.assertNotIn(0, game.archive)
+            for ext in ('json', 'md'):
+                self.assertFalse(path.exists(game.archive._get_file(0, ext)))
+
+        self.run_async(test())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+from os import listdir, path
+import unittest
+
+import utils
+
+from .helpers import GameTestCase
+
+
+class TestQuantityManager(GameTestCase):
+
+    def test_removing_quantity_keeps_ledger(self):
+        async def test():
+            game = await self.make_game()
+            async with game:
+                game.add_quantity('points', [])
+                quantity = game.get_quantity('points')
+                game.transact_quantity(quantity, {self.player: 5})
+                game.remove_quantity(quantity)
+            await utils.fileio.flush()
+            removed = game.get_file(path.join('data', 'ledgers', 'removed'))
+            self.assertEqual(len([name for name in listdir(removed) if name.endswith('.ledger')]), 1)
+            self.assertFalse(path.exists(game.get_file(path.join('data', 'ledgers', 'points.ledger'))))
+
+        self.run_async(test())
+
+
+if __name__ == '__main__':
+    unittest.main()
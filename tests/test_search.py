@@ -0,0 +1,54 @@
+from os import makedirs, path
+import json
+import shutil
+import unittest
+
+import database
+import utils
+
+from .helpers import GameTestCase
+
+
+class TestSearchManager(GameTestCase):
+
+    def test_index_is_saved_outside_repository(self):
+        async def test():
+            game = await self.make_game()
+            async with game:
+                await game.add_proposal(author=self.player, content="Test")
+                game.save()
+            await utils.fileio.flush()
+            self.assertTrue(path.isfile(game.get_search_db().filepath))
+            self.assertFalse(game.get_search_db().filepath.startswith(game.repo.path + path.sep))
+            self.assertFalse(path.exists(game.get_file(path.join('data', 'search_index.json'))))
+
+        self.run_async(test())
+
+    def test_index_is_moved_out_of_repository(self):
+        async def test():
+            game = await self.make_game()
+            async with game:
+                await game.add_proposal(author=self.player, content="Test")
+                game.save()
+            await utils.fileio.flush()
+            # Put the index where older versions saved it.
+            old_filepath = game.get_file(path.join('data', 'search_index.json'))
+            makedirs(path.dirname(old_filepath), exist_ok=True)
+            shutil.move(game.get_search_db().filepath, old_filepath)
+            with open(old_filepath, encoding='utf-8') as f:
+                data = json.load(f)
+            for name in list(database._DATABASES):
+                if name.startswith(game.repo.path) or name == game.get_search_db().name:
+                    del database._DATABASES[name]
+            async with game:
+                game.load()
+            await utils.fileio.flush()
+            self.assertFalse(path.exists(old_filepath))
+            with open(game.get_search_db().filepath, encoding='utf-8') as f:
+                self.assertEqual(json.load(f), data)
+
+        self.run_async(test())
+
+
+if __name__ == '__main__':
+    unittest.main()
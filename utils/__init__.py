@@ -1,6 +1,6 @@
-from collections import OrderedDict
 from datetime import datetime
 from typing import Any, Callable, Iterable, List, Union
+import dataclasses
 import logging
 
 from constants import strings
@@ -76,11 +76,29 @@ def human_count(count: Union[int, float],
 
 
 def sort_dict(d: dict, **kwargs):
-    """Return an OrderedDict with the keys in sorted order.
+    """Return a dict with the keys in sorted order.
 
     All extra keyword arguments are passed to sorted().
     """
-    return OrderedDict((k, d[k]) for k in sorted(d, **kwargs))
+    return {k: d[k] for k in sorted(d, **kwargs)}
+
+
+def slotted(cls: type) -> type:
+    """Class decorator that rebuilds a dataclass with `__slots__` for its
+    fields, so that its instances have no per-instance `__dict__`.
+
+    Apply it above `@dataclass`. Subclasses must declare `__slots__` for any
+    attributes of their own (including `__weakref__` if needed), or they will
+    get a `__dict__` anyway.
+    """
+    field_names = tuple(f.name for f in dataclasses.fields(cls))
+    namespace = dict(cls.__dict__)
+    # Class attributes holding default values would conflict with the slots;
+    # the generated __init__() keeps its own references to the defaults.
+    for name in field_names + ('__dict__', '__weakref__'):
+        namespace.pop(name, None)
+    namespace['__slots__'] = field_names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
 
 
 def mutget(d: dict, keys: Union[List, Any], value=None):
@@ -168,4 +186,8 @@ from . import (  # noqa: E402, F401
     commands,
     discord,
     error_handling,
+    fileio,
+    metrics,
+    perf,
+    profiling,
 )
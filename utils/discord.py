@@ -1,9 +1,13 @@
+from collections import OrderedDict
 from discord.ext import commands
-from typing import Callable, List, Tuple
+from typing import Callable, Iterator, List, Optional, Sequence
 import asyncio
+import contextlib
 import discord
+import itertools
 
 from constants import colors, emoji, strings
+from . import perf
 
 
 # https://birdie0.github.io/discord-webhooks-guide/other/field_limits.html
@@ -11,6 +15,7 @@ MAX_EMBEDS = 10
 MAX_EMBED_FIELDS = 25
 MAX_EMBED_VALUE = 1024
 MAX_EMBED_TOTAL = 6000
+MAX_ATTACHMENT_SIZE = 8 * 1024 * 1024
 
 
 def fake_mention(user):
@@ -37,22 +42,105 @@ def embed_happened_footer(past_participle: str, user: discord.abc.User):
     return ret
 
 
-def _split_text(p: str, max_len: int) -> Tuple[str, str]:
-    """Split text given some maximum length.
+def embeds_equal(a: discord.Embed, b: discord.Embed) -> bool:
+    """Return whether two embeds display the same title, description, color,
+    footer, and fields.
+    """
+    def key(embed):
+        return (
+            embed.title,
+            embed.description,
+            embed.colour,
+            embed.footer.text,
+            [(field.name, field.value, field.inline) for field in embed.fields],
+        )
+    return key(a) == key(b)
+
+
+def _iter_split_text(p: str, max_len: int) -> Iterator[str]:
+    """Yield pieces of text shorter than some maximum length.
 
     This function will try to split at paragraph boundaries ('\n\n'), then at
     linebreaks ('\n'), then at spaces (' '), and at a last resort between words.
+    The remainder of the text is never copied; only an offset is advanced.
+    """
+    start, end = 0, len(p)
+    while end - start >= max_len:
+        limit = start + max_len
+        i = p.rfind('\n\n', start, limit)
+        if i <= start:
+            i = p.rfind('\n', start, limit)
+        if i <= start:
+            i = p.rfind(' ', start, limit)
+        if i <= start:
+            i = limit - 1
+        yield p[start:i]
+        start = i
+        while start < end and p[start].isspace():
+            start += 1
+    if start < end:
+        yield p[start:].rstrip() if start else p
+
+
+def iter_split_embed(embed: discord.Embed) -> Iterator[discord.Embed]:
+    """Lazily split an embed as needed in order to avoid hitting Discord's
+    size limits, yielding each embed as soon as it is full.
+
+    Inline fields that are too long will be made non-inline. The yielded
+    embeds have no footer, URL, or timestamp; use split_embed() or
+    send_split_embed() to get those.
+    """
+    color = embed.color
+    current = discord.Embed(color=color, title=embed.title)
+    # Running count of characters in the current embed
+    length = len(embed.title)
+    # Subtract footer and some extra wiggle room
+    max_length = MAX_EMBED_TOTAL - len(embed.footer.text or '') - 10
+    yielded = False
+    for piece in _iter_split_text(embed.description or '', 2048):
+        current.description = piece
+        yield current
+        yielded = True
+        current = discord.Embed(color=color)
+        length = 0
+    for field in embed.fields:
+        name = field.name.strip()
+        value = field.value.strip()
+        if value and len(value) >= MAX_EMBED_VALUE:
+            pieces = _iter_split_text(value, MAX_EMBED_VALUE)
+            inline = False
+        else:
+            pieces = [value]
+            inline = field.inline
+        for i, piece in enumerate(pieces):
+            field_name = name + strings.CONTINUED if i else name
+            field_length = len(field_name) + len(piece)
+            length += field_length
+            too_many_fields = len(current.fields) >= MAX_EMBED_FIELDS
+            too_big_embed = length >= max_length
+            if current.fields and (too_many_fields or too_big_embed):
+                yield current
+                yielded = True
+                current = discord.Embed(color=color)
+                length = field_length
+            current.add_field(name=field_name, value=piece, inline=inline)
+    if current.fields or not yielded:
+        yield current
+
+
+def _set_page_footer(page: discord.Embed, embed: discord.Embed, page_label: Optional[str]) -> None:
+    """Copy the footer, URL, and timestamp of `embed` onto one of its pages,
+    appending a page label (e.g. `2/5`) to the footer if given.
     """
-    if len(p) < max_len:
-        return p, None
-    i = p.rfind('\n\n', 0, max_len)
-    if i == -1:
-        i = p.rfind('\n', 0, max_len)
-    if i == -1:
-        i = p.rfind(' ', 0, max_len)
-    if i == -1:
-        i = max_len - 1
-    return p[:i], p[i:].strip()
+    if page_label is None:
+        footer_text = embed.footer.text
+    elif embed.footer:
+        footer_text = embed.footer.text + f" ({page_label})"
+    else:
+        footer_text = page_label
+    page.set_footer(text=footer_text, icon_url=embed.footer.icon_url)
+    page.url = embed.url
+    page.timestamp = embed.timestamp
 
 
 def split_embed(embed: discord.Embed) -> List[discord.Embed]:
@@ -60,85 +148,46 @@ def split_embed(embed: discord.Embed) -> List[discord.Embed]:
 
     Inline fields that are too long will be made non-inline.
     """
-    description = embed.description
-    empty_embed = discord.Embed(color=embed.color)
-    embeds = [discord.Embed(color=embed.color, title=embed.title)]
-    while description:
-        embeds[-1].description, description = _split_text(description, 2048)
-        embeds.append(empty_embed.copy())
-    length = len(embed.title) + len(embed.description)
-    # TODO test handling of description
-    field_stack = [{
-        'name': field.name.strip(),
-        'value': field.value.strip(),
-        'inline': field.inline,
-        'continued': False,
-    } for field in reversed(embed.fields)]
-    if not field_stack:
-        del embeds[-1]
-    while field_stack:
-        field = field_stack.pop()
-        name = field['name']
-        value = field['value']
-        if value and len(value) >= MAX_EMBED_VALUE:
-            former, latter = _split_text(value, MAX_EMBED_VALUE)
-            # This is a LIFO stack, so push the latter field first.
-            field_stack.append({
-                'name': name,
-                'value': latter,
-                'inline': False,
-                'continued': True,
-            })
-            field_stack.append({
-                'name': name,
-                'value': former,
-                'inline': False,
-                'continued': field['continued']
-            })
-        else:
-            field_length = len(name or '') + len(value or '')
-            length += field_length
-            too_many_fields = len(embeds[-1].fields) >= MAX_EMBED_FIELDS
-            # Subtract footer and some extra wiggle room
-            too_big_embed = length >= MAX_EMBED_TOTAL - len(embed.footer) - 10
-            if too_many_fields or too_big_embed:
-                embeds.append(empty_embed.copy())
-                length = field_length
-            if field['continued']:
-                field['name'] += strings.CONTINUED
-            del field['continued']
-            embeds[-1].add_field(**field)
+    embeds = list(iter_split_embed(embed))
     if len(embeds) == 1:
-        embeds[0].set_footer(text=embed.footer.text, icon_url=embed.footer.icon_url)
-        embeds[0].url = embed.url
-        embeds[0].timestamp = embed.timestamp
+        _set_page_footer(embeds[0], embed, None)
     else:
-        if embed.footer:
-            footer_icon_url = embed.footer.icon_url
-            footer_text = embed.footer.text + f" ({{}}/{len(embeds)})"
-        else:
-            footer_icon_url = embed.footer.icon_url
-            footer_text = f"{{}}/{len(embeds)}"
         for i, new_embed in enumerate(embeds):
-            new_embed.set_footer(
-                text=footer_text.format(i + 1),
-                icon_url=footer_icon_url,
-            )
-            new_embed.url = embed.url
-            new_embed.timestamp = embed.timestamp
+            _set_page_footer(new_embed, embed, f"{i + 1}/{len(embeds)}")
     return embeds
 
 
 async def send_split_embed(ctx: commands.Context, big_embed: discord.Embed, *, typing: bool = True):
-    embeds = split_embed(big_embed)
-    if typing and len(embeds) > 1:
-        async with ctx.typing():
-            for embed in embeds[:-1]:
-                await ctx.send(embed=embed)
-        await ctx.send(embed=embeds[-1])
-    else:
-        for embed in embeds:
-            await ctx.send(embed=embed)
+    """Split an embed and send the pieces in order.
+
+    Splitting is interleaved with sending: while one piece is being sent, the
+    next one is computed. Since the total number of pieces is not known in
+    advance, every piece except the last is labeled with only its own page
+    number (e.g. `2/…`).
+    """
+    pages = iter_split_embed(big_embed)
+    page = next(pages)
+    upcoming = next(pages, None)
+    if upcoming is None:
+        _set_page_footer(page, big_embed, None)
+        await ctx.send(embed=page)
+        return
+    async with contextlib.AsyncExitStack() as stack:
+        if typing:
+            await stack.enter_async_context(ctx.typing())
+        i = 1
+        while page is not None:
+            if upcoming is None:
+                _set_page_footer(page, big_embed, f"{i}/{i}")
+            else:
+                _set_page_footer(page, big_embed, f"{i}/\N{HORIZONTAL ELLIPSIS}")
+            sending = asyncio.ensure_future(ctx.send(embed=page))
+            # Let the request start before computing the next piece.
+            await asyncio.sleep(0)
+            after = next(pages, None)
+            await sending
+            page, upcoming = upcoming, after
+            i += 1
 
 
 async def safe_bulk_delete(messages: List[discord.Message]):
@@ -169,28 +218,29 @@ async def wait_for_response(ctx: commands.Context,
     pending = ()
     try:
         # Wait for either ...
-        done, pending = await asyncio.wait([
-            # ... a message containing, e.g. '!y', ...
-            ctx.bot.wait_for(
-                'message',
-                check=lambda msg: (
-                    msg.channel == ctx.channel
-                    and msg.author == ctx.author
-                    and message_check(msg)
+        with perf.untimed():
+            done, pending = await asyncio.wait([
+                # ... a message containing, e.g. '!y', ...
+                ctx.bot.wait_for(
+                    'message',
+                    check=lambda msg: (
+                        msg.channel == ctx.channel
+                        and msg.author == ctx.author
+                        and message_check(msg)
+                    ),
+                    timeout=timeout,
                 ),
-                timeout=timeout,
-            ),
-            # ... or a reaction.
-            ctx.bot.wait_for(
-                'reaction_add',
-                check=lambda reaction, user: (
-                    reaction.message.id == m.id
-                    and user == ctx.author
-                    and reaction_check(reaction, user)
-                ),
-                timeout=timeout,
-            )
-        ], return_when=asyncio.FIRST_COMPLETED)
+                # ... or a reaction.
+                ctx.bot.wait_for(
+                    'reaction_add',
+                    check=lambda reaction, user: (
+                        reaction.message.id == m.id
+                        and user == ctx.author
+                        and reaction_check(reaction, user)
+                    ),
+                    timeout=timeout,
+                )
+            ], return_when=asyncio.FIRST_COMPLETED)
         result = done.pop().result()
         if isinstance(result, discord.Message):
             return 'message', result
@@ -286,6 +336,128 @@ async def query_content(ctx, *, timeout: int = 30, allow_file: bool = False, cle
             return m, 't', None
 
 
+class PageSource:
+    """An indexed list of items that is rendered into embeds one page at a
+    time.
+
+    Only the items on a requested page are formatted, and the most recently
+    requested pages are cached, so paging back and forth is cheap.
+
+    Arguments:
+    - items -- sequence of items
+    - format_item -- function taking an item and returning one line of text
+    - title -- embed title
+    - heading (optional) -- function taking an item and returning the name of
+      the field it belongs in; consecutive items with the same heading are
+      grouped into one field. If omitted, items are listed in the embed
+      description.
+    - per_page (default 15) -- number of items on each page
+    - empty (default strings.EMPTY_LIST) -- text to display if there are no
+      items
+    """
+
+    CACHE_SIZE = 3
+
+    def __init__(self,
+                 items: Sequence,
+                 format_item: Callable[[object], str],
+                 *,
+                 title: Optional[str] = None,
+                 heading: Optional[Callable[[object], str]] = None,
+                 per_page: int = 15,
+                 empty: str = strings.EMPTY_LIST):
+        self.items = items
+        self.format_item = format_item
+        self.title = title
+        self.heading = heading
+        self.per_page = per_page
+        self.empty = empty
+        self._pages = OrderedDict()
+
+    def __len__(self) -> int:
+        return max(1, -(-len(self.items) // self.per_page))
+
+    def get_page(self, i: int) -> discord.Embed:
+        """Return the embed for page `i` (zero-indexed)."""
+        if i in self._pages:
+            self._pages.move_to_end(i)
+        else:
+            self._pages[i] = self._render_page(i)
+            while len(self._pages) > self.CACHE_SIZE:
+                self._pages.popitem(last=False)
+        return self._pages[i]
+
+    def _render_page(self, i: int) -> discord.Embed:
+        embed = discord.Embed(color=colors.INFO, title=self.title or discord.Embed.Empty)
+        items = self.items[i * self.per_page:(i + 1) * self.per_page]
+        if not items:
+            embed.description = self.empty
+        elif self.heading is None:
+            embed.description = "\n".join(map(self.format_item, items))
+        else:
+            for heading, group in itertools.groupby(items, self.heading):
+                embed.add_field(
+                    name=heading,
+                    value="\n".join(map(self.format_item, group)),
+                    inline=False,
+                )
+        if len(self) > 1:
+            embed.set_footer(text=f"Page {i + 1}/{len(self)}")
+        return embed
+
+
+class Paginator:
+    """A single message displaying a PageSource, with reactions to move between
+    pages.
+
+    Only the invoker of the command can change pages. Neighbouring pages are
+    rendered while waiting for a reaction, so turning the page only has to
+    edit the message.
+    """
+
+    EMOJIS = (emoji.PAGE_PREVIOUS, emoji.PAGE_NEXT)
+
+    def __init__(self, source: PageSource):
+        self.source = source
+        self.page = 0
+
+    async def start(self, ctx: commands.Context, *, timeout: int = 120) -> discord.Message:
+        m = await ctx.send(embed=self.source.get_page(self.page))
+        if len(self.source) <= 1:
+            return m
+        async with TransientMessageReact(m, self.EMOJIS):
+            while True:
+                self._prefetch()
+                try:
+                    with perf.untimed():
+                        reaction, user = await ctx.bot.wait_for(
+                            'reaction_add',
+                            check=lambda reaction, user: (
+                                reaction.message.id == m.id
+                                and user == ctx.author
+                                and reaction.emoji in self.EMOJIS
+                            ),
+                            timeout=timeout,
+                        )
+                except asyncio.TimeoutError:
+                    break
+                step = -1 if reaction.emoji == emoji.PAGE_PREVIOUS else 1
+                self.page = (self.page + step) % len(self.source)
+                await m.edit(embed=self.source.get_page(self.page))
+                try:
+                    await m.remove_reaction(reaction.emoji, user)
+                except (discord.Forbidden, discord.HTTPException):
+                    pass
+        return m
+
+    def _prefetch(self):
+        count = len(self.source)
+        for i in (self.page + 1, self.page - 1):
+            self.source.get_page(i % count)
+        # Keep the current page most recently used.
+        self.source.get_page(self.page)
+
+
 async def edit_embed_for_response(m, response, *, title_format, **kwargs):
     """Edit a message, changing the color and title according to a user response
     (either 'y', 'n', or 't').
@@ -299,6 +471,33 @@ async def edit_embed_for_response(m, response, *, title_format, **kwargs):
     ))
 
 
+class CancelOnError:
+    """An async context manager that, if an exception is raised inside it, edits
+    a confirmation message to show that the action was cancelled (see
+    edit_embed_for_response()) and then lets the exception propagate.
+
+    Use it around the part of a confirmed action that can still fail, such as
+    checking for conflicting changes (see nomic.ConflictError). `m` may be None,
+    in which case nothing is edited.
+    """
+
+    def __init__(self, m: Optional[discord.Message], *, title_format: str, **kwargs):
+        self.m = m
+        self.title_format = title_format
+        self.kwargs = kwargs
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self.m is None or exc_type is None or issubclass(exc_type, asyncio.CancelledError):
+            return
+        try:
+            await edit_embed_for_response(self.m, 'n', title_format=self.title_format, **self.kwargs)
+        except discord.HTTPException:
+            pass
+
+
 async def is_admin(ctx):
     if await ctx.bot.is_owner(ctx.author):
         return True
@@ -7,6 +7,7 @@ from constants import colors, info
 
 
 async def on_command_error(ctx, exc, *args, **kwargs):
+    import nomic  # nomic imports utils, so this can't be at the top
     command_name = ctx.command.qualified_name if ctx.command else "unknown command"
     l.error(f"{str(exc)!r} encountered while executing command {command_name!r} (args: {args}; kwargs: {kwargs})")
     if isinstance(exc, commands.UserInputError):
@@ -41,6 +42,9 @@ async def on_command_error(ctx, exc, *args, **kwargs):
         description = "That command is disabled."
     elif isinstance(exc, commands.CommandOnCooldown):
         description = "That command is on cooldown."
+    elif isinstance(getattr(exc, 'original', None), nomic.ConflictError):
+        description = str(exc.original)
+        description = description[0].upper() + description[1:]
     else:
         description = "Sorry, something went wrong. A team of highly trained monkeys has been dispatched to deal with the situation."
         await log_error(ctx, exc.original, *args, **kwargs)
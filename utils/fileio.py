@@ -0,0 +1,162 @@
+"""Blocking file I/O, run in a dedicated thread pool so that it doesn't stall
+the event loop (and with it, gateway heartbeats and every other guild's
+commands).
+
+Operations on the same file run one at a time, in the order they were
+submitted, so a file is never written by two threads at once and a read
+submitted after a write sees the result of the write. Anything that reads
+files directly, such as git, must first wait for pending operations on them
+with `flush()`.
+
+Operations that replace a file's contents can be coalesced: if the file is
+replaced again before the previous replacement has started, only the newest
+contents are written. This keeps the queue short when a file is saved many
+times in quick succession (e.g. during a flood of votes).
+
+If there is no running event loop (e.g. in scripts), operations run
+immediately on the calling thread instead.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+from typing import Callable, Dict, Optional
+import asyncio
+import functools
+import os
+
+from . import l, perf
+
+
+# Number of threads doing file I/O
+WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+class _Operation:
+    __slots__ = ('func', 'args', 'future', 'coalesce', 'started')
+
+    def __init__(self, func: Callable, args: tuple, future: asyncio.Future, coalesce: bool):
+        self.func = func
+        self.args = args
+        self.future = future
+        self.coalesce = coalesce
+        self.started = False
+
+
+# Map absolute paths to the last operation submitted for that path
+_pending: Dict[str, _Operation] = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='fileio')
+    return _executor
+
+
+def _copy_result(source: asyncio.Future, destination: asyncio.Future) -> None:
+    if source.cancelled():
+        destination.cancel()
+    elif source.exception() is not None:
+        destination.set_exception(source.exception())
+    else:
+        destination.set_result(source.result())
+
+
+def _forget(filepath: str, future: asyncio.Future) -> None:
+    if filepath in _pending and _pending[filepath].future is future:
+        del _pending[filepath]
+    if not future.cancelled() and future.exception() is not None:
+        l.error(f"Error in file operation on {path.relpath(filepath)!r}: {future.exception()!r}")
+
+
+def submit(filepath: str, func: Callable, *args, coalesce: bool = False) -> Optional[asyncio.Future]:
+    """Call `func(*args)` in the I/O thread pool once every operation previously
+    submitted for `filepath` has finished, and return an asyncio.Future of its
+    result.
+
+    If `coalesce` is True and the last operation submitted for `filepath` was
+    the same function, also with `coalesce`, and hasn't started yet, replace
+    its arguments instead and return its future.
+
+    If there is no running event loop, call it immediately and return None.
+    Exceptions are logged, so the future need not be awaited.
+    """
+    # asyncio.get_running_loop() is not available in Python 3.6.
+    loop = asyncio.events._get_running_loop()
+    if loop is None:
+        func(*args)
+        return None
+    filepath = path.abspath(filepath)
+    previous = _pending.get(filepath)
+    if coalesce and previous is not None and previous.coalesce and not previous.started and previous.func is func:
+        previous.args = args
+        return previous.future
+    operation = _Operation(func, args, loop.create_future(), coalesce)
+
+    def start(_=None):
+        operation.started = True
+        loop.run_in_executor(_get_executor(), operation.func, *operation.args).add_done_callback(
+            functools.partial(_copy_result, destination=operation.future)
+        )
+
+    if previous is None:
+        start()
+    else:
+        previous.future.add_done_callback(start)
+    _pending[filepath] = operation
+    operation.future.add_done_callback(functools.partial(_forget, filepath))
+    return operation.future
+
+
+async def run(filepath: str, func: Callable, *args):
+    """Call `func(*args)` in the I/O thread pool once every operation
+    previously submitted for `filepath` has finished, and return its result.
+    """
+    return await submit(filepath, func, *args)
+
+
+def _write(filepath: str, text: str, mode: str) -> None:
+    with open(filepath, mode, encoding='utf-8') as f:
+        f.write(text)
+
+
+def write(filepath: str, text: str, *, append: bool = False) -> Optional[asyncio.Future]:
+    """Write (or append) text to a file in the I/O thread pool, after every
+    operation previously submitted for it. Writes (but not appends) are
+    coalesced. See submit().
+    """
+    if append:
+        return submit(filepath, _write, filepath, text, 'a')
+    return submit(filepath, _write, filepath, text, 'w', coalesce=True)
+
+
+def _remove(filepath: str) -> None:
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
+
+
+def remove(filepath: str) -> Optional[asyncio.Future]:
+    """Remove a file, if it exists, in the I/O thread pool after every
+    operation previously submitted for it. See submit().
+    """
+    return submit(filepath, _remove, filepath)
+
+
+async def flush(directory: Optional[str] = None) -> None:
+    """Wait for every operation submitted so far (on files in `directory`, if
+    given) to finish.
+    """
+    if directory is None:
+        futures = [operation.future for operation in _pending.values()]
+    else:
+        directory = path.abspath(directory)
+        prefix = path.join(directory, '')
+        futures = [operation.future for filepath, operation in _pending.items()
+                   if filepath == directory or filepath.startswith(prefix)]
+    if futures:
+        with perf.timed('file flush'):
+            await asyncio.wait(futures)
@@ -0,0 +1,142 @@
+"""Metrics in the Prometheus text exposition format, served over HTTP.
+
+Counters and gauges are defined here and updated by the code they measure.
+Latencies come from utils.perf and are exposed as summaries; they start over
+when `!perf reset` is used, which Prometheus treats as a counter reset.
+
+Gauges that describe the current state of something (e.g. the size of each
+game) are filled in by collectors, which are called on every scrape.
+"""
+
+from aiohttp import web
+from typing import Callable, Dict, List, Tuple
+
+from . import l, perf
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(str(v))}"' for k, v in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+class Metric:
+    """A counter or gauge, with one value for each combination of labels."""
+
+    def __init__(self, name: str, kind: str, help: str):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def clear(self) -> None:
+        self.values.clear()
+
+    def render(self, lines: List[str]) -> None:
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        for labels, value in self.values.items():
+            lines.append(f'{self.name}{_format_labels(labels)} {_format_value(value)}')
+
+
+_metrics: List[Metric] = []
+_collectors: List[Callable[[], None]] = []
+
+
+def counter(name: str, help: str) -> Metric:
+    metric = Metric(name, 'counter', help)
+    _metrics.append(metric)
+    return metric
+
+
+def gauge(name: str, help: str) -> Metric:
+    metric = Metric(name, 'gauge', help)
+    _metrics.append(metric)
+    return metric
+
+
+def collector(func: Callable[[], None]) -> Callable[[], None]:
+    """Decorator that registers a function to be called before metrics are
+    rendered, to update gauges.
+    """
+    _collectors.append(func)
+    return func
+
+
+VOTES = counter('quobot_votes_total', "Votes cast, changed or removed.")
+SAVE_BYTES = counter('quobot_save_bytes_total', "Bytes written to data files.")
+UPLOAD_LAG = gauge('quobot_upload_lag_seconds', "Age of the oldest saved change that has not been pushed.")
+LOCK_CONTENDED = counter('quobot_lock_contended_total', "Game lock acquisitions that had to wait for another task.")
+SLOW_CALLBACKS = counter('quobot_slow_callbacks_total', "Event loop callbacks that took longer than the slow callback threshold.")
+GAME_SIZE = gauge('quobot_game_objects', "Number of objects of each kind in each game.")
+
+
+def _render_summary(lines: List[str], name: str, help: str, histograms: Dict[Labels, perf.Histogram]) -> None:
+    lines.append(f'# HELP {name} {help}')
+    lines.append(f'# TYPE {name} summary')
+    for labels, histogram in histograms.items():
+        for q in (0.5, 0.95, 0.99):
+            quantile_labels = labels + (('quantile', str(q)),)
+            lines.append(f'{name}{_format_labels(quantile_labels)} {_format_value(histogram.percentile(q * 100))}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram.total)}')
+        lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+    for func in _collectors:
+        try:
+            func()
+        except Exception as exc:
+            l.warning(f"Error collecting metrics from {func.__qualname__}: {exc!r}")
+    lines = []
+    for metric in _metrics:
+        metric.render(lines)
+    _render_summary(lines, 'quobot_command_seconds', "Time taken by each command.", {
+        (('command', name),): stats.total for name, stats in perf.commands.items()
+    })
+    _render_summary(lines, 'quobot_section_seconds', "Time spent in instrumented sections (e.g. git subprocesses or waiting for a game lock).", {
+        (('section', name),): histogram for name, histogram in perf.sections.items()
+    })
+    _render_summary(lines, 'quobot_discord_request_seconds', "Time taken by Discord REST requests, by route.", {
+        (('route', route),): histogram for route, histogram in perf.routes.items()
+    })
+    lines.append('')
+    return '\n'.join(lines)
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(body=render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+
+async def start(port: int, host: str = '127.0.0.1') -> web.AppRunner:
+    """Serve metrics at http://<host>:<port>/metrics and return the
+    aiohttp.web.AppRunner, which can be used to stop the server.
+    """
+    app = web.Application()
+    app.router.add_get('/metrics', _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    l.info(f"Serving metrics at http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,239 @@
+"""In-memory latency instrumentation.
+
+Each command is timed as a whole (see `command()`), and time spent in
+instrumented sections (see `timed()`) is both recorded globally and attributed
+to the command that the current task is running. Sections currently
+instrumented:
+
+- 'lock wait' -- waiting to acquire a game lock (for reading or writing)
+- 'lock hold' -- holding a game lock for writing
+- 'lock read' -- holding a game lock for reading
+- 'save' -- Game.save()
+- 'git' -- each git subprocess
+- 'file flush' -- waiting for file writes to finish (e.g. before running git)
+- 'discord' -- each Discord REST request
+- 'user wait' -- waiting for a user to respond (see `untimed()`), which is
+  not counted in the total time of commands
+
+Sections can overlap; for example, a git subprocess is usually run while the
+game lock is held. Discord REST requests are also recorded by route.
+"""
+
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import asyncio
+import time
+import weakref
+
+
+# Number of recent samples kept per histogram
+SAMPLES = 1000
+
+# Section for time spent waiting for users, which is left out of the total
+# time of commands
+USER_WAIT = 'user wait'
+
+
+class Histogram:
+    """Distribution of durations, in seconds.
+
+    `count` and `total` cover every sample ever added, but percentiles are
+    computed from only the most recent `SAMPLES` samples.
+    """
+
+    __slots__ = ('count', 'total', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=SAMPLES)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Return the `p`th percentile (0 to 100) of recent samples, using the
+        nearest-rank method.
+        """
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        rank = max(1, -(-len(samples) * p // 100))
+        return samples[int(rank) - 1]
+
+
+class CommandStats:
+    """Timings for one command.
+
+    Attributes:
+    - total -- Histogram of the total time of each invocation
+    - sections -- dictionary mapping section names to Histograms of the time
+      spent in that section per invocation, for invocations that entered it
+    """
+
+    __slots__ = ('total', 'sections')
+
+    def __init__(self):
+        self.total = Histogram()
+        self.sections: Dict[str, Histogram] = {}
+
+    def add(self, seconds: float, sections: Counter) -> None:
+        self.total.add(seconds)
+        for name, section_seconds in sections.items():
+            if name not in self.sections:
+                self.sections[name] = Histogram()
+            self.sections[name].add(section_seconds)
+
+
+commands: Dict[str, CommandStats] = {}
+sections: Dict[str, Histogram] = {}
+# Map method and path (e.g. 'GET /channels/{channel_id}') to request times
+routes: Dict[str, Histogram] = {}
+started = time.time()
+
+# Map each task to a Counter of seconds it has spent in each section
+_task_sections = weakref.WeakKeyDictionary()
+
+
+try:
+    _current_task = asyncio.current_task
+except AttributeError:  # Python 3.6
+    _current_task = asyncio.Task.current_task
+
+
+def current_task() -> Optional[asyncio.Task]:
+    """Return the running task, or None if there isn't one."""
+    try:
+        return _current_task()
+    except RuntimeError:  # No running event loop
+        return None
+
+
+def reset() -> None:
+    """Forget all timings."""
+    global started
+    commands.clear()
+    sections.clear()
+    routes.clear()
+    started = time.time()
+
+
+def record(section: str, seconds: float) -> None:
+    """Record time spent in a section."""
+    if section not in sections:
+        sections[section] = Histogram()
+    sections[section].add(seconds)
+    task = current_task()
+    if task is not None:
+        if task not in _task_sections:
+            _task_sections[task] = Counter()
+        _task_sections[task][section] += seconds
+
+
+def task_sections() -> Counter:
+    """Return a Counter of seconds spent in each section by the current task
+    so far. Subtract an earlier result to get the time spent in between.
+    """
+    task = current_task()
+    if task is None or task not in _task_sections:
+        return Counter()
+    return Counter(_task_sections[task])
+
+
+@contextmanager
+def timed(section: str):
+    """Context manager that records the time spent inside it as a section."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(section, time.perf_counter() - start)
+
+
+def untimed():
+    """Context manager for waiting for a user to respond (e.g. to confirm an
+    action). The time spent inside it is recorded as the 'user wait' section
+    and left out of the total time of the command being run.
+    """
+    return timed(USER_WAIT)
+
+
+class Invocation:
+    """One invocation of a command.
+
+    Attributes:
+    - name -- name of the command, which can be changed before the invocation
+      finishes (e.g. once a subcommand has been resolved)
+    - sections -- Counter of seconds spent in each section, once the
+      invocation has finished
+    """
+
+    __slots__ = ('name', 'sections')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.sections = Counter()
+
+
+@contextmanager
+def command(name: str):
+    """Context manager that records the time spent inside it (except in
+    `untimed()` sections) as an invocation of a command, including a breakdown
+    of the sections entered by the current task, and yields the Invocation.
+    """
+    invocation = Invocation(name)
+    before = task_sections()
+    start = time.perf_counter()
+    try:
+        yield invocation
+    finally:
+        invocation.sections = task_sections() - before
+        elapsed = time.perf_counter() - start - invocation.sections[USER_WAIT]
+        if invocation.name not in commands:
+            commands[invocation.name] = CommandStats()
+        commands[invocation.name].add(elapsed, invocation.sections)
+
+
+def instrument_http(http) -> None:
+    """Time every REST request made by a discord.py HTTPClient."""
+    request = http.request
+
+    async def timed_request(route, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await request(route, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            record('discord', elapsed)
+            key = f'{route.method} {route.path}'
+            if key not in routes:
+                routes[key] = Histogram()
+            routes[key].add(elapsed)
+
+    http.request = timed_request
+
+
+def slowest_commands(count: int, percentile: float = 95) -> List[str]:
+    """Return the names of the `count` commands with the highest latency at a
+    given percentile.
+    """
+    return sorted(commands, key=lambda name: commands[name].total.percentile(percentile), reverse=True)[:count]
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds < 1:
+        return f'{seconds * 1000:.0f}\N{THIN SPACE}ms'
+    return f'{seconds:.2f}\N{THIN SPACE}s'
+
+
+def format_histogram(histogram: Histogram) -> str:
+    return ' \N{MIDDLE DOT} '.join(
+        f"p{p} **{format_seconds(histogram.percentile(p))}**" for p in (50, 95, 99)
+    )
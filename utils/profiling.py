@@ -0,0 +1,381 @@
+"""Profiling that can be started and stopped while the bot is running.
+
+Two kinds of profiler are available (see `profile()`):
+
+- 'cprofile' -- deterministic profiling with cProfile, which records every
+  function call on the event loop's thread. Accurate call counts, but it slows
+  the bot down noticeably while it runs.
+- 'sample' -- samples the stack of the main thread (which runs the event loop)
+  every few milliseconds using a timer signal. Much cheaper, but only
+  statistically accurate, and not available on Windows.
+
+Results are written to `data/profiles/` (a pstats file for cProfile, which can
+be opened with e.g. snakeviz, and collapsed stacks for sampling, which can be
+opened with e.g. speedscope or flamegraph.pl).
+
+This module also has a slow callback detector (see `watch_loop()`), which logs
+any callback that blocks the event loop for longer than a threshold.
+"""
+
+from collections import Counter, deque
+from datetime import datetime
+from os import makedirs, path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import abc
+import asyncio
+import cProfile
+import pstats
+import selectors
+import signal
+import time
+
+from . import l, metrics
+
+
+PROFILES_DIR = path.join(path.dirname(path.dirname(path.realpath(__file__))), 'data', 'profiles')
+
+# Longest time for which a profile can be recorded, in seconds
+MAX_SECONDS = 600
+
+# Time between samples taken by SamplingProfiler, in seconds
+SAMPLE_INTERVAL = 0.005
+
+# Functions in these directories and files (including this one, for the slow
+# callback detector) are left out of summaries (but not files), because they
+# only show the event loop waiting for or dispatching work.
+_LOOP_DIRS = (path.dirname(asyncio.__file__),)
+_LOOP_FILES = (selectors.__file__, __file__)
+
+
+def _is_loop_file(filename: str) -> bool:
+    return filename in _LOOP_FILES or path.dirname(filename) in _LOOP_DIRS
+
+
+class FunctionStats(NamedTuple):
+    """Time spent in one function while profiling.
+
+    Attributes:
+    - name -- string such as 'nomic/proposal.py:120(set_vote)'
+    - cumulative -- seconds spent in the function, including calls it made
+    - own -- seconds spent in the function itself
+    - calls -- number of calls, or None if unknown (when sampling)
+    """
+    name: str
+    cumulative: float
+    own: float
+    calls: Optional[int]
+
+
+def _function_name(filename: str, lineno: int, name: str) -> str:
+    if filename == '~':  # Built-in function, as recorded by cProfile
+        return name
+    try:
+        filename = path.relpath(filename)
+    except ValueError:  # Different drive on Windows
+        pass
+    return f'{filename}:{lineno}({name})'
+
+
+class Profiler(abc.ABC):
+    """Base class for profilers of the event loop thread.
+
+    Attributes:
+    - mode -- string; 'cprofile' or 'sample'
+    - started_at -- time.time() value when the profiler was started
+    - duration -- seconds for which the profiler ran, once stopped
+    - extension -- file extension of the profile written by write()
+    """
+
+    mode: str
+    extension: str
+
+    def __init__(self):
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._start = 0.0
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self._start
+
+    @abc.abstractmethod
+    def top(self, count: int) -> List[FunctionStats]:
+        """Return the `count` functions with the most cumulative time, leaving
+        out the event loop's own functions.
+        """
+
+    def write(self, directory: str = PROFILES_DIR) -> str:
+        """Write the profile to a new file in `directory` and return its
+        path.
+        """
+        makedirs(directory, exist_ok=True)
+        timestamp = datetime.utcfromtimestamp(self.started_at).strftime('%Y%m%d-%H%M%S')
+        filepath = path.join(directory, f'{timestamp}-{self.mode}{self.extension}')
+        self._write(filepath)
+        return filepath
+
+    @abc.abstractmethod
+    def _write(self, filepath: str) -> None:
+        ...
+
+
+class DeterministicProfiler(Profiler):
+    """Profiler that records every function call with cProfile."""
+
+    mode = 'cprofile'
+    extension = '.prof'
+
+    def __init__(self):
+        super().__init__()
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        super().start()
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+        super().stop()
+
+    def top(self, count: int) -> List[FunctionStats]:
+        stats = pstats.Stats(self._profile).stats
+        functions = [
+            FunctionStats(_function_name(*func), cumulative, own, calls)
+            for func, (_, calls, own, cumulative, callers) in stats.items()
+            if not _is_loop_file(func[0])
+            # Built-ins called only by the event loop (e.g. to wait for events)
+            and not (func[0] == '~' and callers and all(_is_loop_file(caller[0]) for caller in callers))
+        ]
+        functions.sort(key=lambda f: f.cumulative, reverse=True)
+        return functions[:count]
+
+    def _write(self, filepath: str) -> None:
+        self._profile.dump_stats(filepath)
+
+
+# (filename, first line number, function name)
+Function = Tuple[str, int, str]
+
+
+class SamplingProfiler(Profiler):
+    """Profiler that samples the stack of the main thread from a SIGALRM
+    handler.
+
+    A thread can't be used to take samples, because it would only get to run
+    when the main thread releases the GIL, which it mostly does while waiting
+    for something to do.
+
+    Attributes:
+    - stacks -- Counter of stacks (tuples of Functions, outermost first)
+    - samples -- total number of samples taken
+    - idle -- number of samples taken while the event loop was waiting for
+      something to do (or running its own code)
+    """
+
+    mode = 'sample'
+    extension = '.txt'
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._previous_handler = None
+
+    def start(self) -> None:
+        super().start()
+        self._previous_handler = signal.signal(signal.SIGALRM, self._sample)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+
+    def stop(self) -> None:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self._previous_handler)
+        super().stop()
+
+    def _sample(self, signum, frame) -> None:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+        # Leave out everything up to the event loop (e.g. Client.run()) and the
+        # event loop itself, so that stacks start at the callback that it ran.
+        start = next((i for i, func in enumerate(stack) if _is_loop_file(func[0])), 0)
+        while start < len(stack) and _is_loop_file(stack[start][0]):
+            start += 1
+        self.samples += 1
+        if start == len(stack):
+            self.idle += 1
+        else:
+            self.stacks[tuple(stack[start:])] += 1
+
+    @property
+    def seconds_per_sample(self) -> float:
+        return self.duration / self.samples if self.samples else 0.0
+
+    def top(self, count: int) -> List[FunctionStats]:
+        cumulative: Dict[Function, int] = Counter()
+        own: Dict[Function, int] = Counter()
+        for stack, samples in self.stacks.items():
+            for func in set(stack):
+                cumulative[func] += samples
+            own[stack[-1]] += samples
+        functions = sorted(
+            (func for func in cumulative if not _is_loop_file(func[0])),
+            key=lambda func: cumulative[func],
+            reverse=True,
+        )[:count]
+        return [
+            FunctionStats(
+                _function_name(*func),
+                cumulative[func] * self.seconds_per_sample,
+                own[func] * self.seconds_per_sample,
+                None,
+            )
+            for func in functions
+        ]
+
+    def _write(self, filepath: str) -> None:
+        with open(filepath, 'w') as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(';'.join(_function_name(*func) for func in stack) + f' {samples}\n')
+
+
+PROFILERS: Dict[str, Callable[[], Profiler]] = {
+    DeterministicProfiler.mode: DeterministicProfiler,
+}
+if hasattr(signal, 'setitimer'):
+    PROFILERS[SamplingProfiler.mode] = SamplingProfiler
+
+
+class Session:
+    """A profile being recorded.
+
+    Attributes:
+    - profiler -- Profiler
+    - commands_left -- number of commands to finish before stopping, or None
+      if the profile lasts a fixed number of seconds
+    """
+
+    def __init__(self, profiler: Profiler, commands: Optional[int]):
+        self.profiler = profiler
+        self.commands_left = commands
+        self.done = asyncio.get_event_loop().create_future()
+
+    def command_finished(self) -> None:
+        """Record that a command that started during this session has
+        finished.
+        """
+        if self.commands_left is None or self.done.done():
+            return
+        self.commands_left -= 1
+        if self.commands_left <= 0:
+            self.done.set_result(None)
+
+
+# The profile currently being recorded, if any
+current: Optional[Session] = None
+
+
+async def profile(mode: str = DeterministicProfiler.mode, *,
+                  seconds: Optional[float] = None,
+                  commands: Optional[int] = None) -> Profiler:
+    """Profile the event loop for some number of seconds, or until some number
+    of commands that start from now on have finished, and return the stopped
+    Profiler. Either way, stop after MAX_SECONDS.
+
+    Commands are counted by Session.command_finished(), which must be called
+    as each command finishes.
+
+    Raises RuntimeError if a profile is already being recorded.
+    """
+    global current
+    if current is not None:
+        raise RuntimeError("A profile is already being recorded")
+    seconds = min(seconds or MAX_SECONDS, MAX_SECONDS)
+    current = session = Session(PROFILERS[mode](), commands)
+    session.profiler.start()
+    l.info(f"Started {mode} profile")
+    try:
+        await asyncio.wait_for(asyncio.shield(session.done), seconds)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        session.profiler.stop()
+        current = None
+        l.info(f"Stopped {mode} profile after {session.profiler.duration:.1f}s")
+    return session.profiler
+
+
+class SlowCallback(NamedTuple):
+    """A callback that blocked the event loop.
+
+    Attributes:
+    - timestamp -- time.time() value when the callback finished
+    - seconds -- how long the callback took
+    - description -- string describing the callback
+    """
+    timestamp: float
+    seconds: float
+    description: str
+
+
+# Recent callbacks that took longer than the threshold
+slow_callbacks = deque(maxlen=50)
+
+# Seconds a callback may take before it is reported, or None if callbacks are
+# not being watched
+threshold: Optional[float] = None
+
+_original_run = asyncio.events.Handle._run
+
+
+def describe_callback(handle: asyncio.Handle) -> str:
+    """Return a description of the callback of an event loop handle. For steps
+    of a task, this is the task's coroutine and where it is now suspended.
+    """
+    callback = getattr(handle, '_callback', None)
+    task = getattr(callback, '__self__', None)
+    if not isinstance(task, asyncio.Task):
+        return repr(handle)
+    coro = task._coro
+    name = getattr(coro, '__qualname__', repr(coro))
+    # Follow the chain of awaits to the innermost coroutine outside asyncio.
+    frame = None
+    while coro is not None and getattr(coro, 'cr_frame', None) is not None:
+        if not _is_loop_file(coro.cr_frame.f_code.co_filename):
+            frame = coro.cr_frame
+        coro = getattr(coro, 'cr_await', None)
+    if frame is None:
+        return f"task {name}"
+    site = _function_name(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+    return f"task {name}, now suspended at {site}"
+
+
+def _timed_run(handle: asyncio.Handle):
+    start = time.perf_counter()
+    try:
+        return _original_run(handle)
+    finally:
+        elapsed = time.perf_counter() - start
+        if threshold is not None and elapsed > threshold:
+            description = describe_callback(handle)
+            slow_callbacks.append(SlowCallback(time.time(), elapsed, description))
+            metrics.SLOW_CALLBACKS.inc()
+            l.warning(f"Event loop was blocked for {elapsed:.3f}s by {description}")
+
+
+def watch_loop(new_threshold: Optional[float]) -> None:
+    """Log every event loop callback that takes longer than `new_threshold`
+    seconds, or stop watching callbacks if it is None.
+
+    This applies to every event loop in the process.
+    """
+    global threshold
+    threshold = new_threshold
+    asyncio.events.Handle._run = _original_run if threshold is None else _timed_run